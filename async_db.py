@@ -0,0 +1,131 @@
+"""
+Асинхронный доступ к БД для хендлеров бота.
+
+Хендлеры aiogram крутятся в одном event loop, и синхронный psycopg2 в нём
+останавливает обработку апдейтов всех пользователей на время запроса.
+Здесь у каждой функции database.py есть awaitable-двойник: запрос уходит
+в отдельный пул потоков размером с пул соединений, loop продолжает работу.
+
+SQL живёт только в database.py — веб-панель (Flask) вызывает его синхронно,
+бот — через этот модуль:
+
+    import async_db as db
+    user = await db.get_user(user_id)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database as _db
+from config import DB_POOL_MAX
+
+# Потоков не больше, чем соединений: лишний поток всё равно ждал бы пул
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+async def run(fn, *args, **kwargs):
+    """Выполнить синхронную функцию работы с БД вне event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+def _async(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+def shutdown():
+    _executor.shutdown(wait=True)
+
+pool_stats  = _db.pool_stats
+cache_stats = _db.cache_stats
+
+# Чистые проверки по уже загруженной строке users — без запроса
+ban_active     = _db.ban_active
+premium_active = _db.premium_active
+
+# ── Users ──────────────────────────────────────────────────────────────────────
+
+get_user         = _async(_db.get_user)
+get_user_context = _async(_db.get_user_context)
+upsert_user      = _async(_db.upsert_user)
+page_users       = _async(_db.page_users)
+is_banned        = _async(_db.is_banned)
+ban_user         = _async(_db.ban_user)
+unban_user       = _async(_db.unban_user)
+
+# ── Premium ────────────────────────────────────────────────────────────────────
+
+is_premium              = _async(_db.is_premium)
+expire_bans_and_premium = _async(_db.expire_bans_and_premium)
+give_premium            = _async(_db.give_premium)
+add_payment         = _async(_db.add_payment)
+get_recent_payments = _async(_db.get_recent_payments)
+
+# ── Profiles ───────────────────────────────────────────────────────────────────
+
+create_profile            = _async(_db.create_profile)
+add_profile_media         = _async(_db.add_profile_media)
+get_profile_media         = _async(_db.get_profile_media)
+get_profile_media_many    = _async(_db.get_profile_media_many)
+get_active_profile        = _async(_db.get_active_profile)
+delete_active_profile     = _async(_db.delete_active_profile)
+get_last_profile_time     = _async(_db.get_last_profile_time)
+get_candidate_profiles    = _async(_db.get_candidate_profiles)
+get_excluded_user_ids     = _async(_db.get_excluded_user_ids)
+page_profiles_admin       = _async(_db.page_profiles_admin)
+
+# ── Chats ──────────────────────────────────────────────────────────────────────
+
+create_chat         = _async(_db.create_chat)
+get_chat            = _async(_db.get_chat)
+close_chat          = _async(_db.close_chat)
+get_user_chats      = _async(_db.get_user_chats)
+add_message         = _async(_db.add_message)
+add_messages        = _async(_db.add_messages)
+mark_messages_read  = _async(_db.mark_messages_read)
+get_chat_messages   = _async(_db.get_chat_messages)
+page_chats_admin    = _async(_db.page_chats_admin)
+
+# ── Reports ────────────────────────────────────────────────────────────────────
+
+add_report     = _async(_db.add_report)
+get_report     = _async(_db.get_report)
+page_reports   = _async(_db.page_reports)
+resolve_report = _async(_db.resolve_report)
+
+# ── Счётчики админки ──────────────────────────────────────────────────────────
+
+get_admin_counts = _async(_db.get_admin_counts)
+
+# ── Broadcasts ─────────────────────────────────────────────────────────────────
+
+create_broadcast         = _async(_db.create_broadcast)
+get_broadcast            = _async(_db.get_broadcast)
+get_broadcasts           = _async(_db.get_broadcasts)
+get_running_broadcasts   = _async(_db.get_running_broadcasts)
+set_broadcast_status     = _async(_db.set_broadcast_status)
+get_broadcast_recipients = _async(_db.get_broadcast_recipients)
+save_broadcast_progress  = _async(_db.save_broadcast_progress)
+mark_bot_blocked         = _async(_db.mark_bot_blocked)
+
+# ── Deadlines ──────────────────────────────────────────────────────────────────
+
+set_deadline      = _async(_db.set_deadline)
+cancel_deadline   = _async(_db.cancel_deadline)
+get_due_deadlines = _async(_db.get_due_deadlines)
+next_deadline_at  = _async(_db.next_deadline_at)
+delete_deadlines  = _async(_db.delete_deadlines)
+
+# ── Blocks ─────────────────────────────────────────────────────────────────────
+
+block_user = _async(_db.block_user)
+is_blocked = _async(_db.is_blocked)
+
+# ── Мини-игры ─────────────────────────────────────────────────────────────────
+
+create_game             = _async(_db.create_game)
+get_game                = _async(_db.get_game)
+get_active_game_by_chat = _async(_db.get_active_game_by_chat)
+get_active_games        = _async(_db.get_active_games)
+update_game_if          = _async(_db.update_game_if)
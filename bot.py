@@ -3,29 +3,59 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from config import BOT_TOKEN
-from handlers import user, admin, profile, chat, premium, kmn
+from handlers import user, admin, profile, chat, premium, games
 import database as db
+import broadcast
+import deadlines
+import expiry
+import game_engine
+import matching
+import message_log
+from send_scheduler import SendLimitMiddleware
+from context import UserContextMiddleware
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 async def main():
     db.init_db()
-    db.init_kmn_table()
+    db.start_listener()
 
     bot = Bot(token=BOT_TOKEN)
+    # Все send*/copy/forward — через общий планировщик с лимитами Telegram
+    bot.session.middleware(SendLimitMiddleware())
     dp  = Dispatcher(storage=MemoryStorage())
 
-    # Порядок важен: admin/premium/kmn первыми
+    # Пользователь, бан, премиум и анкета — одним запросом на апдейт (ctx в хендлерах)
+    dp.message.outer_middleware(UserContextMiddleware())
+    dp.callback_query.outer_middleware(UserContextMiddleware())
+
+    # Порядок важен: admin/premium/games первыми
     dp.include_router(admin.router)
     dp.include_router(premium.router)
-    dp.include_router(kmn.router)
+    dp.include_router(games.router)
     dp.include_router(profile.router)
     dp.include_router(chat.router)
     dp.include_router(user.router)
 
+    await matching.warm_up()
+    # Активные мини-игры — в память движка до первых ходов
+    await game_engine.warm_up()
+    sweeper = asyncio.create_task(expiry.run())
+    # Таймауты игр из таблицы deadlines, в т.ч. просроченные за время простоя
+    timers  = asyncio.create_task(deadlines.run(bot))
+    message_log.start()
+    # Незавершённые рассылки продолжаются с сохранённого курсора
+    await broadcast.start(bot)
+
     await bot.delete_webhook(drop_pending_updates=True)
     logging.info("🐝 Beem Bot запущен!")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        sweeper.cancel()
+        timers.cancel()
+        await broadcast.stop()
+        await message_log.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
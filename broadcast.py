@@ -0,0 +1,188 @@
+"""
+Рассылки админа: фоновые задания с прогрессом в БД.
+
+Раньше adm_do_broadcast грузил всех пользователей и слал по одному прямо
+в хендлере: на 100k получателей это часы, а рестарт бота рассылку терял.
+Теперь хендлер только создаёт задание (database.create_broadcast), а
+исполнитель в процессе бота:
+
+  - читает получателей страницами по BROADCAST_PAGE в порядке user_id
+    (user_id > cursor_id), всю таблицу в память не грузит;
+  - шлёт страницу в BROADCAST_WORKERS параллельных отправок с приоритетом
+    BULK — темп упирается в лимит send_scheduler, живые чаты не ждут;
+  - после страницы сохраняет курсор и счётчики: после рестарта задание
+    продолжается с места остановки (недосланная страница уйдёт повторно);
+  - 403 помечает users.bot_blocked — такие пользователи дальше пропускаются;
+  - пауза / продолжение / отмена — статус в БД. Его меняют кнопки под
+    сообщением прогресса и веб-панель, событие "broadcast" будит исполнителя.
+
+Исполнитель один на бота: start() в bot.py поднимает задания со статусом running.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+
+import async_db as db
+import database
+import send_scheduler
+from config import BROADCAST_PAGE, BROADCAST_WORKERS, BROADCAST_REPORT_SEC
+from keyboards import broadcast_kb
+
+log = logging.getLogger(__name__)
+
+STATUS_NAMES = {
+    "running":   "▶️ идёт",
+    "paused":    "⏸ на паузе",
+    "cancelled": "⏹ отменена",
+    "done":      "✅ завершена",
+}
+
+def message_text(text: str) -> str:
+    return f"📢 <b>Объявление от Beem:</b>\n\n{text}"
+
+def progress_text(job: Dict) -> str:
+    done  = job["sent"] + job["failed"] + job["blocked"]
+    total = max(job["total"], done)
+    pct   = done * 100 // total if total else 100
+    return (
+        f"📢 <b>Рассылка #{job['id']}</b> — {STATUS_NAMES.get(job['status'], job['status'])}\n\n"
+        f"Обработано: <b>{done}</b> из {total} ({pct}%)\n"
+        f"✅ Доставлено: {job['sent']}\n"
+        f"🚫 Заблокировали бота: {job['blocked']}\n"
+        f"❌ Ошибок: {job['failed']}"
+    )
+
+class BroadcastRunner:
+    def __init__(self, page: int = BROADCAST_PAGE, workers: int = BROADCAST_WORKERS,
+                 report_sec: float = BROADCAST_REPORT_SEC):
+        self._page = page
+        self._workers = workers
+        self._report_sec = report_sec
+        self._bot: Optional[Bot] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._rerun: set = set()
+
+    # ── Жизненный цикл ────────────────────────────────────────────────────────
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        self._loop = asyncio.get_running_loop()
+        for job in await db.get_running_broadcasts():
+            self._spawn(job["id"])
+
+    async def stop(self):
+        """Остановить задания; прогресс последней целой страницы уже в БД."""
+        self._loop = None
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def on_change(self, kind: str, key: int):
+        # Вызывается из потока БД или LISTEN — в loop передаём через threadsafe
+        loop = self._loop
+        if loop is None:
+            return
+        if kind == "broadcast":
+            loop.call_soon_threadsafe(self._spawn, key)
+        elif kind == "reset":
+            asyncio.run_coroutine_threadsafe(self._resume_running(), loop)
+
+    async def _resume_running(self):
+        for job in await db.get_running_broadcasts():
+            self._spawn(job["id"])
+
+    def _spawn(self, job_id: int):
+        if self._loop is None:
+            return
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            # Задание как раз завершается (пауза) — проверить статус ещё раз после него
+            self._rerun.add(job_id)
+            return
+        task = self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+        task.add_done_callback(lambda t: self._finished(job_id))
+
+    def _finished(self, job_id: int):
+        self._tasks.pop(job_id, None)
+        if job_id in self._rerun:
+            self._rerun.discard(job_id)
+            self._spawn(job_id)
+
+    # ── Исполнение ────────────────────────────────────────────────────────────
+
+    async def _run(self, job_id: int):
+        with send_scheduler.priority(send_scheduler.BULK):
+            while True:
+                try:
+                    await self._run_job(job_id)
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Рассылка #%s: ошибка, повтор через 10 с", job_id)
+                    await asyncio.sleep(10)
+
+    async def _run_job(self, job_id: int):
+        job = await db.get_broadcast(job_id)
+        if not job or job["status"] != "running":
+            return
+        log.info("Рассылка #%s: с user_id > %s", job_id, job["cursor_id"])
+        reported = time.monotonic()
+        while job["status"] == "running":
+            ids = await db.get_broadcast_recipients(job["cursor_id"], self._page)
+            sent, failed, blocked = await self._send_page(job["text"], ids)
+            job = await db.save_broadcast_progress(
+                job_id, ids[-1] if ids else job["cursor_id"], sent, failed, blocked,
+                finished=len(ids) < self._page,
+            )
+            if job["status"] != "running" or time.monotonic() - reported >= self._report_sec:
+                await self._report(job)
+                reported = time.monotonic()
+        log.info("Рассылка #%s: %s, доставлено %s", job_id, job["status"], job["sent"])
+
+    async def _send_page(self, text: str, ids) -> tuple:
+        sem  = asyncio.Semaphore(self._workers)
+        body = message_text(text)
+
+        async def send(user_id: int) -> str:
+            async with sem:
+                try:
+                    await self._bot.send_message(user_id, body, parse_mode="HTML")
+                    return "sent"
+                except TelegramForbiddenError:
+                    return "blocked"
+                except TelegramAPIError:
+                    return "failed"
+
+        results = await asyncio.gather(*(send(u) for u in ids))
+        blocked = [u for u, r in zip(ids, results) if r == "blocked"]
+        await db.mark_bot_blocked(blocked)
+        return results.count("sent"), results.count("failed"), len(blocked)
+
+    async def _report(self, job: Dict):
+        if not job.get("progress_chat"):
+            return
+        try:
+            await self._bot.edit_message_text(
+                progress_text(job), chat_id=job["progress_chat"], message_id=job["progress_msg"],
+                parse_mode="HTML", reply_markup=broadcast_kb(job["id"], job["status"]),
+            )
+        except TelegramBadRequest:
+            pass   # текст не изменился или сообщение удалено
+
+    def stats(self) -> Dict:
+        return {"running": sorted(j for j, t in self._tasks.items() if not t.done())}
+
+runner = BroadcastRunner()
+database.on_change(runner.on_change)
+
+start = runner.start
+stop  = runner.stop
+stats = runner.stats
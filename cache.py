@@ -0,0 +1,89 @@
+"""
+Кеш в памяти процесса: LRU с ограничением размера и TTL на запись.
+
+Потокобезопасен — им пользуются и хендлеры бота (через пул потоков
+async_db), и веб-панель. Хранит и отрицательные ответы (None), поэтому
+«нет такой записи» тоже не ходит в БД до инвалидации или TTL.
+
+    users = TTLCache(maxsize=10000, ttl=60)
+    row = users.get(user_id, loader)   # loader(user_id) при промахе
+    users.pop(user_id)                 # после записи
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._maxsize = maxsize
+        self._ttl = ttl
+        # Поколение растёт при каждой инвалидации: загрузка, начатая до неё,
+        # не должна положить в кеш устаревшее значение
+        self._gen = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                return default
+            return item[1]
+
+    def get(self, key: Hashable, loader: Callable[[Hashable], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            gen = self._gen
+        value = loader(key)
+        with self._lock:
+            if gen == self._gen:
+                self._store(key, value, now)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def _store(self, key: Hashable, value: Any, now: float):
+        self._data[key] = (now + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._gen += 1
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._gen += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data), "max": self._maxsize, "ttl": self._ttl,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
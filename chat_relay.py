@@ -0,0 +1,75 @@
+"""
+Пересылка сообщений анонимного чата собеседнику.
+
+Одна дорога для всех типов: медиа копируются через copyMessage (файл
+не перезаливается и не собирается заново из file_id/подписи), запись
+в журнал и отправка идут параллельно.
+
+Что сохранять в messages для каждого типа, описывает реестр CONTENT_TYPES
+по message.content_type. Новый тип — одна строка register(...):
+
+    register("dice", "dice", content=lambda m: m.dice.emoji)
+
+send — если тип нужно отправлять не копией (текст уходит с префиксом 💬).
+Отправка идёт с приоритетом HIGH в send_scheduler.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.types import Message
+
+import message_log
+import send_scheduler
+
+@dataclass(frozen=True)
+class ContentType:
+    msg_type: str
+    content:  Callable[[Message], str]
+    file_id:  Callable[[Message], Optional[str]]
+    send:     Optional[Callable[[Bot, Message, int], Awaitable]] = None
+
+CONTENT_TYPES: Dict[str, ContentType] = {}
+
+def register(content_type: str, msg_type: str,
+             content: Callable[[Message], str] = lambda m: "",
+             file_id: Callable[[Message], Optional[str]] = lambda m: None,
+             send: Optional[Callable[[Bot, Message, int], Awaitable]] = None):
+    CONTENT_TYPES[content_type] = ContentType(msg_type, content, file_id, send)
+
+def _send_text(bot: Bot, message: Message, partner_id: int):
+    return bot.send_message(partner_id, f"💬 {message.text}")
+
+register("text",       "text",       content=lambda m: m.text, send=_send_text)
+register("photo",      "photo",      content=lambda m: m.caption or "",
+         file_id=lambda m: m.photo[-1].file_id)
+register("video",      "video",      content=lambda m: m.caption or "",
+         file_id=lambda m: m.video.file_id)
+register("voice",      "voice",      content=lambda m: "🎤", file_id=lambda m: m.voice.file_id)
+register("video_note", "video_note", content=lambda m: "⭕", file_id=lambda m: m.video_note.file_id)
+register("sticker",    "sticker",    content=lambda m: "🎭", file_id=lambda m: m.sticker.file_id)
+register("animation",  "animation",  content=lambda m: "🎞", file_id=lambda m: m.animation.file_id)
+register("document",   "document",   content=lambda m: m.caption or "📄",
+         file_id=lambda m: m.document.file_id)
+register("audio",      "audio",      content=lambda m: "🎵", file_id=lambda m: m.audio.file_id)
+
+async def forward(bot: Bot, message: Message, chat_id: int, partner_id: int) -> bool:
+    """Переслать сообщение собеседнику и записать в журнал чата.
+    False — тип не поддерживается (ничего не отправлено)."""
+    kind = CONTENT_TYPES.get(message.content_type)
+    if kind is None:
+        return False
+    if kind.send:
+        send = kind.send(bot, message, partner_id)
+    else:
+        send = bot.copy_message(partner_id, message.chat.id, message.message_id)
+    # Пересылка в живом чате обгоняет ответы меню и рассылки
+    with send_scheduler.priority(send_scheduler.HIGH):
+        await asyncio.gather(
+            message_log.add(chat_id, message.from_user.id, kind.content(message),
+                            kind.msg_type, kind.file_id(message)),
+            send,
+        )
+    return True
@@ -1,12 +1,61 @@
 import os
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")  # веб-панель: getFile и файлы
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "123456789").split(",")))
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 ADMIN_SECRET = os.getenv("ADMIN_SECRET", "beem_super_secret_key_2024")
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))  # строк на странице веб-панели
 
 PROFILE_COOLDOWN = 300  # 5 минут
 
+# ── База данных ───────────────────────────────────────────────────────────────
+# Пул на процесс: бот и веб-панель держат свои пулы, сумма DB_POOL_MAX
+# должна оставаться ниже max_connections у Postgres.
+DB_POOL_MIN          = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX          = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT      = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # сек ожидания свободного соединения
+DB_POOL_MAX_IDLE     = float(os.getenv("DB_POOL_MAX_IDLE", "300"))    # закрыть, если простаивает дольше
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_CHECK_AFTER  = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))  # SELECT 1 перед выдачей после простоя
+
+# Изменения между процессами (бот ↔ веб-панель) — через LISTEN/NOTIFY
+DB_EVENTS_CHANNEL = "beem_changes"
+
+# Кеш строк users в памяти процесса; TTL — страховка, основное — инвалидация
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL  = float(os.getenv("USER_CACHE_TTL", "60"))
+# Кеш строк chats для relay (участники, closed)
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "10000"))
+CHAT_CACHE_TTL  = float(os.getenv("CHAT_CACHE_TTL", "300"))
+# Счётчики админки (панель, /api/stats, /admin) — общий ответ на все вкладки
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "10"))
+
+# Как часто снимать истёкшие баны и Premium (expiry.py)
+EXPIRY_SWEEP_SEC = float(os.getenv("EXPIRY_SWEEP_SEC", "60"))
+
+# Таймауты игр хранятся в таблице deadlines (deadlines.py)
+DEADLINE_BATCH    = 100   # сроков за один проход
+DEADLINE_POLL_SEC = 5.0   # максимум сна между проверками
+
+# Журнал сообщений чатов пишется пачками в фоне (message_log.py)
+MESSAGE_LOG_BATCH     = int(os.getenv("MESSAGE_LOG_BATCH", "200"))        # строк в одном INSERT
+MESSAGE_LOG_FLUSH_SEC = float(os.getenv("MESSAGE_LOG_FLUSH_SEC", "0.5"))  # не держать сообщение дольше
+MESSAGE_LOG_MAX_QUEUE = int(os.getenv("MESSAGE_LOG_MAX_QUEUE", "10000"))  # дальше relay ждёт записи
+MESSAGE_LOG_RETRIES   = 5
+
+# ── Лимиты Telegram на отправку (send_scheduler.py) ──────────────────────────
+SEND_GLOBAL_RATE    = float(os.getenv("SEND_GLOBAL_RATE", "25"))   # сообщений/с на бота (лимит ~30)
+SEND_PER_CHAT_RATE  = float(os.getenv("SEND_PER_CHAT_RATE", "1"))  # сообщений/с в один чат
+SEND_PER_CHAT_BURST = 3       # сколько можно отправить в чат подряд без паузы
+SEND_MAX_QUEUE      = 5000    # ожидающих отправок, дальше отправитель ждёт места
+SEND_MAX_RETRIES    = 3       # повторов после RetryAfter
+
+# ── Рассылки (broadcast.py) ──────────────────────────────────────────────────
+BROADCAST_PAGE       = 500    # получателей на страницу; после страницы сохраняется прогресс
+BROADCAST_WORKERS    = 30     # одновременных отправок; темп всё равно задаёт send_scheduler
+BROADCAST_REPORT_SEC = 5      # как часто обновлять сообщение с прогрессом у админа
+
 INTERESTS = [
     ("🎮 Игры",        "games"),
     ("💋 Флирт",       "flirt"),
@@ -20,8 +69,6 @@ INTERESTS = [
     ("🏋️ Спорт",      "sport"),
 ]
 
-INTERESTS_DISPLAY = {key: name for name, key in INTERESTS}
-
 BAN_DURATIONS = {
     "1h":      ("1 час",    3600),
     "24h":     ("24 часа",  86400),
@@ -33,6 +80,17 @@ BAN_DURATIONS = {
 PROFILES_LIMIT_FREE    = 2
 PROFILES_LIMIT_PREMIUM = 5
 
+# ── Подбор анкет (matching.py) ───────────────────────────────────────────────
+MATCHING_REBUILD_SEC  = 300   # полная перестройка индекса (страховка от изменений из веб-панели)
+MATCHING_EXCLUDE_TTL  = 300   # кеш «кого не показывать» на зрителя
+MATCHING_AGE_BUCKET   = 5     # ширина возрастной корзины, лет
+
+# ── Лента анкет (feed.py) ────────────────────────────────────────────────────
+FEED_SEEN_MAX  = 1000         # сколько последних показанных анкет помнить на зрителя
+FEED_SEEN_TTL  = 3 * 86400    # забыть просмотры зрителя, который столько не листал
+FEED_MAX_AGE   = 300          # перетасовать ленту заново, если она старше
+FEED_PREFETCH  = 10           # дозаполнять ленту в фоне, когда в ней осталось меньше
+
 # ── Premium тарифы ────────────────────────────────────────────────────────────
 PREMIUM_PLANS = {
     "week": {
@@ -58,5 +116,29 @@ PREMIUM_PLANS = {
     },
 }
 
+# ── Запуск (main.py) ──────────────────────────────────────────────────────────
+# Веб-панель — gunicorn (gunicorn_conf.py): воркеры-процессы × потоки.
+# У каждого воркера свой пул БД — WEB_WORKERS × DB_POOL_MAX в сумме с ботом
+# должно оставаться ниже max_connections.
+WEB_WORKERS          = int(os.getenv("WEB_WORKERS", "2"))
+WEB_THREADS          = int(os.getenv("WEB_THREADS", "8"))
+WEB_KEEPALIVE        = int(os.getenv("WEB_KEEPALIVE", "5"))          # сек держать keep-alive соединение
+WEB_TIMEOUT          = int(os.getenv("WEB_TIMEOUT", "60"))           # зависший воркер перезапускается
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "20"))  # дописать запросы при остановке
+# Упавший процесс перезапускается с паузой 1, 2, 4… до SUPERVISOR_MAX_BACKOFF сек;
+# проработал SUPERVISOR_STABLE_SEC — пауза снова с 1 сек
+SUPERVISOR_MAX_BACKOFF = 60
+SUPERVISOR_STABLE_SEC  = 60
+
+# Медиа в веб-панели (/media/<file_id>) кешируются на диске (media_cache.py)
+MEDIA_CACHE_DIR    = os.getenv("MEDIA_CACHE_DIR", "/tmp/beem_media")
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", "512"))
+MEDIA_MAX_FILE_MB  = 20        # больше Bot API всё равно не отдаёт
+MEDIA_PATH_TTL     = 50 * 60   # file_path от getFile действителен не меньше часа
+MEDIA_MAX_AGE      = 86400     # Cache-Control браузеру: содержимое file_id не меняется
+MEDIA_THUMB_SIZES  = (160, 320)   # превью в списках (/media/<file_id>/thumb/<size>)
+MEDIA_THUMB_WORKERS = int(os.getenv("MEDIA_THUMB_WORKERS", "2"))   # потоков ресайза на воркер
+MEDIA_THUMB_WAIT   = 0.5       # сек ждать превью в запросе, дальше — заглушка и повтор
+
 # ── TON кошелёк ───────────────────────────────────────────────────────────────
 TON_WALLET = "UQDZwUwWPTFJ58IwPQGs0BKXxLTKM_-r6A6sEN8YDfq5HSOY"
@@ -0,0 +1,60 @@
+"""
+Контекст пользователя на один апдейт.
+
+Хендлерам почти всегда нужны одни и те же данные об отправителе: строка
+users, забанен ли он, есть ли Premium, активная анкета. UserContextMiddleware
+достаёт всё это одним запросом (database.get_user_context) до хендлера
+и кладёт в аргумент `ctx`:
+
+    @router.message(F.text == "👥 Анкеты")
+    async def browse_profiles(message: Message, bot: Bot, ctx: UserContext):
+        if ctx.banned: ...
+
+Контекст — снимок на момент прихода апдейта: после upsert_user в том же
+хендлере свежие значения нужно перечитать.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+import async_db as db
+
+@dataclass
+class UserContext:
+    user_id: int
+    user:    Optional[Dict]
+    profile: Optional[Dict]
+    banned:  bool
+    premium: bool
+
+    @property
+    def registered(self) -> bool:
+        return bool(self.user and self.user.get("registered"))
+
+    @classmethod
+    async def load(cls, user_id: int) -> "UserContext":
+        user, profile = await db.get_user_context(user_id)
+        now = time.time()
+        return cls(user_id=user_id, user=user, profile=profile,
+                   banned=db.ban_active(user, now), premium=db.premium_active(user, now))
+
+class UserContextMiddleware(BaseMiddleware):
+    """Outer middleware для message / callback_query: data["ctx"] = UserContext."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is not None:
+            ctx = data["ctx"] = await UserContext.load(from_user.id)
+            if ctx.user and ctx.user.get("bot_blocked"):
+                # Снова пишет боту — значит, разблокировал: вернуть в рассылки
+                await db.upsert_user(from_user.id, bot_blocked=0)
+        return await handler(event, data)
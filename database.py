@@ -1,141 +1,226 @@
 import os
 import time
-import psycopg2
-import psycopg2.extras
-from typing import Optional, List, Dict
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Callable, Iterable
+
+from psycopg2.extras import Json, execute_batch, execute_values
+
+from config import (
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+    DB_POOL_MAX_IDLE, DB_POOL_MAX_LIFETIME, DB_POOL_CHECK_AFTER,
+    DB_EVENTS_CHANNEL, USER_CACHE_SIZE, USER_CACHE_TTL,
+    CHAT_CACHE_SIZE, CHAT_CACHE_TTL, STATS_CACHE_TTL,
+)
+from cache import TTLCache
+from db_pool import ConnectionPool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+log = logging.getLogger(__name__)
+
 # Разрешённые колонки для upsert_user (защита от SQL-инъекций)
 _ALLOWED_USER_COLS = {
-    "username", "name", "age", "gender", "interests",
+    "username", "name", "age", "gender", "interests_mask",
     "search_gender", "search_age_min", "search_age_max",
     "search_media_only", "registered", "banned", "ban_until",
-    "ban_reason", "created_at", "premium", "premium_until",
+    "ban_reason", "created_at", "premium", "premium_until", "bot_blocked",
 }
 
-def get_conn():
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn
+# ── Пул соединений ────────────────────────────────────────────────────────────
 
-def init_db():
-    conn = get_conn()
-    c = conn.cursor()
-
-    # Users
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-        user_id          BIGINT PRIMARY KEY,
-        username         TEXT,
-        name             TEXT,
-        age              INTEGER,
-        gender           TEXT,
-        interests        TEXT,
-        search_gender    TEXT DEFAULT 'any',
-        search_age_min   INTEGER DEFAULT 0,
-        search_age_max   INTEGER DEFAULT 99,
-        search_media_only INTEGER DEFAULT 0,
-        registered       INTEGER DEFAULT 0,
-        banned           INTEGER DEFAULT 0,
-        ban_until        BIGINT,
-        ban_reason       TEXT,
-        created_at       BIGINT DEFAULT 0,
-        premium          INTEGER DEFAULT 0,
-        premium_until    BIGINT
-    )""")
-
-    # Миграции для существующих таблиц (безопасно — IF NOT EXISTS через ALTER)
-    for col, defn in [
-        ("search_age_min",    "INTEGER DEFAULT 0"),
-        ("search_age_max",    "INTEGER DEFAULT 99"),
-        ("search_media_only", "INTEGER DEFAULT 0"),
-        ("premium",           "INTEGER DEFAULT 0"),
-        ("premium_until",     "BIGINT"),
-    ]:
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+
+def get_pool() -> ConnectionPool:
+    """Пул текущего процесса (создаётся лениво, после fork — заново)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ConnectionPool(
+            DATABASE_URL,
+            minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT, max_idle=DB_POOL_MAX_IDLE,
+            max_lifetime=DB_POOL_MAX_LIFETIME, check_after=DB_POOL_CHECK_AFTER,
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+@contextmanager
+def connection():
+    """Соединение из пула: commit при выходе, rollback при ошибке."""
+    with get_pool().connection() as conn:
+        yield conn
+
+def pool_stats() -> Dict:
+    return get_pool().stats()
+
+# ── Уведомления об изменениях ────────────────────────────────────────────────
+# Кеши в памяти (пользователи, подбор анкет и т.п.) подписываются через
+# on_change и получают (kind, key) после коммита: kind — user | profile |
+# block | chat, key — user_id затронутого пользователя; для chat_closed
+# key — id чата, для block_pair — пара (кто, кого), упакованная в одно число,
+# для broadcast — id задания рассылки.
+#
+# Бот и веб-панель — разные процессы. Пишущая функция вызывает _publish
+# в своей транзакции: NOTIFY уходит только вместе с коммитом. start_listener()
+# в каждом процессе слушает канал и отдаёт чужие события тем же подписчикам.
+# После обрыва LISTEN события могли потеряться — подписчики получают
+# ("reset", 0) и сбрасывают всё.
+
+_listeners: List[Callable[[str, int], None]] = []
+_boot_id = uuid.uuid4().hex[:12]
+
+def _origin() -> str:
+    # pid отличает процессы после fork, boot_id — одинаковые pid в разных контейнерах
+    return f"{_boot_id}-{os.getpid()}"
+
+def on_change(fn: Callable[[str, int], None]):
+    _listeners.append(fn)
+    return fn
+
+def _dispatch(kind: str, key: int):
+    for fn in _listeners:
+        try:
+            fn(kind, key)
+        except Exception:
+            log.exception("Ошибка в обработчике изменений %s:%s", kind, key)
+
+def _changed(kind: str, keys: Iterable[int]):
+    for key in keys:
+        _dispatch(kind, key)
+
+def _publish(c, kind: str, keys: Iterable[int]):
+    origin = _origin()
+    for key in keys:
+        c.execute("SELECT pg_notify(%s, %s)", (DB_EVENTS_CHANNEL, f"{origin}|{kind}|{key}"))
+
+_listener_pid: Optional[int] = None
+
+def start_listener():
+    """Слушать изменения из других процессов в фоновом потоке (один на процесс)."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    threading.Thread(target=_listen_loop, name="db-listen", daemon=True).start()
+
+def _listen_loop():
+    import select
+    import psycopg2
+    connected_before = False
+    while True:
+        conn = None
         try:
-            c.execute(f"ALTER TABLE users ADD COLUMN IF NOT EXISTS {col} {defn}")
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {DB_EVENTS_CHANNEL}")
+            if connected_before:
+                _dispatch("reset", 0)
+            connected_before = True
+            me = _origin()
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    conn.cursor().execute("SELECT 1")   # держим соединение живым
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    origin, kind, key = conn.notifies.pop(0).payload.split("|")
+                    if origin != me:
+                        _dispatch(kind, int(key))
         except Exception:
-            conn.rollback()
-
-    # Profiles
-    c.execute("""CREATE TABLE IF NOT EXISTS profiles (
-        id          SERIAL PRIMARY KEY,
-        user_id     BIGINT,
-        description TEXT,
-        created_at  BIGINT,
-        active      INTEGER DEFAULT 1
-    )""")
-
-    # Profile media
-    c.execute("""CREATE TABLE IF NOT EXISTS profile_media (
-        id          SERIAL PRIMARY KEY,
-        profile_id  INTEGER,
-        file_id     TEXT,
-        media_type  TEXT,
-        created_at  BIGINT
-    )""")
-
-    # Chats
-    c.execute("""CREATE TABLE IF NOT EXISTS chats (
-        id          SERIAL PRIMARY KEY,
-        profile_id  INTEGER,
-        sender_id   BIGINT,
-        target_id   BIGINT,
-        created_at  BIGINT,
-        closed      INTEGER DEFAULT 0
-    )""")
-    try:
-        c.execute("ALTER TABLE chats ADD COLUMN IF NOT EXISTS closed INTEGER DEFAULT 0")
-    except Exception:
-        conn.rollback()
-
-    # Messages
-    c.execute("""CREATE TABLE IF NOT EXISTS messages (
-        id          SERIAL PRIMARY KEY,
-        chat_id     INTEGER,
-        sender_id   BIGINT,
-        content     TEXT,
-        msg_type    TEXT DEFAULT 'text',
-        file_id     TEXT,
-        created_at  BIGINT,
-        read        INTEGER DEFAULT 0
-    )""")
-    try:
-        c.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS read INTEGER DEFAULT 0")
-    except Exception:
-        conn.rollback()
-
-    # Reports
-    c.execute("""CREATE TABLE IF NOT EXISTS reports (
-        id          SERIAL PRIMARY KEY,
-        chat_id     INTEGER,
-        reporter_id BIGINT,
-        reported_id BIGINT,
-        reason      TEXT,
-        status      TEXT DEFAULT 'new',
-        created_at  BIGINT
-    )""")
-
-    # Blocks
-    c.execute("""CREATE TABLE IF NOT EXISTS blocks (
-        id          SERIAL PRIMARY KEY,
-        blocker_id  BIGINT,
-        blocked_id  BIGINT,
-        created_at  BIGINT,
-        UNIQUE(blocker_id, blocked_id)
-    )""")
-
-    # Payments
-    c.execute("""CREATE TABLE IF NOT EXISTS payments (
-        id          SERIAL PRIMARY KEY,
-        user_id     BIGINT,
-        plan        TEXT,
-        method      TEXT,
-        amount      TEXT,
-        created_at  BIGINT
-    )""")
-
-    conn.commit()
-    conn.close()
+            log.exception("LISTEN %s оборвался, переподключение", DB_EVENTS_CHANNEL)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            time.sleep(5)
+
+# ── Кеш пользователей ─────────────────────────────────────────────────────────
+# get_user вызывается несколько раз на апдейт (бан, премиум, подпись анкеты…).
+# Строка читается из БД один раз и сбрасывается событием "user".
+
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+@on_change
+def _invalidate_user(kind: str, key: int):
+    if kind == "user":
+        _users.pop(key)
+    elif kind == "reset":
+        _users.clear()
+
+# ── Кеш чатов и блокировок ────────────────────────────────────────────────────
+# relay на каждое сообщение проверяет чат (участники, closed) и блокировку.
+# Чат кешируется по id и сбрасывается событием chat_closed; блокировки
+# держатся в памяти целиком — пары (кто, кого) никогда не удаляются.
+
+_chats = TTLCache(maxsize=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL)
+
+class _BlockSet:
+    """Все пары блокировок процесса: проверка пары — O(1), без запроса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pairs: set = set()
+        self._loaded = False
+
+    @staticmethod
+    def key(blocker_id: int, blocked_id: int) -> int:
+        return (blocker_id << 64) | blocked_id
+
+    def _load(self):
+        with connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT blocker_id, blocked_id FROM blocks")
+            pairs = {self.key(a, b) for a, b in c.fetchall()}
+        with self._lock:
+            # Пары, пришедшие событиями во время загрузки, не теряются
+            self._pairs |= pairs
+            self._loaded = True
+
+    def contains(self, blocker_id: int, blocked_id: int) -> bool:
+        if not self._loaded:
+            self._load()
+        return self.key(blocker_id, blocked_id) in self._pairs
+
+    def add_key(self, key: int):
+        with self._lock:
+            self._pairs.add(key)
+
+    def reset(self):
+        with self._lock:
+            self._pairs = set()
+            self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+_blocks = _BlockSet()
+
+@on_change
+def _invalidate_chat_state(kind: str, key: int):
+    if kind == "chat_closed":
+        _chats.pop(key)
+    elif kind == "block_pair":
+        _blocks.add_key(key)
+    elif kind == "reset":
+        _chats.clear()
+        _blocks.reset()
+
+def cache_stats() -> Dict:
+    return {"users": _users.stats(), "chats": _chats.stats(), "block_pairs": len(_blocks),
+            "admin_counts": _counts.stats()}
+
+def init_db():
+    """Привести схему к последней версии (см. migrations.py).
+    Вся DDL — здесь, при старте; в запросах хендлеров её нет."""
+    from migrations import migrate, latest_version
+    version = migrate()
+    if version < latest_version():
+        raise RuntimeError(f"Схема БД v{version}, код ожидает v{latest_version()}")
+    return version
 
 def _row(cursor, one=True):
     cols = [d[0] for d in cursor.description]
@@ -144,57 +229,137 @@ def _row(cursor, one=True):
         return dict(zip(cols, row)) if row else None
     return [dict(zip(cols, r)) for r in cursor.fetchall()]
 
+# ── Страницы админки ──────────────────────────────────────────────────────────
+# Списки панели и /admin листаются по ключу (created_at, id) от новых
+# к старым: страница — «строки меньше курсора последней показанной»,
+# по индексу (COALESCE(created_at, 0) DESC, id DESC), без OFFSET и без
+# чтения таблицы целиком. Курсор — строка "created_at_id".
+# created_at у старых строк бывает NULL: в ORDER BY DESC такие строки
+# первые, а сравнение с NULL не истинно — страницы повторялись бы или
+# теряли строки. Поэтому ключ — COALESCE(created_at, 0).
+
+def _keyset_page(select: str, where: List[str], params: list, key: tuple,
+                 after: Optional[str], limit: int) -> tuple:
+    """(строки, курсор следующей страницы или None). key — колонки
+    (created_at, id) с алиасом таблицы."""
+    where, params = list(where), list(params)
+    ts_key = f"COALESCE({key[0]}, 0)"
+    if after:
+        ts, last_id = (int(x) for x in after.split("_"))
+        where.append(f"({ts_key}, {key[1]}) < (%s, %s)")
+        params += [ts, last_id]
+    sql = select
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {ts_key} DESC, {key[1]} DESC LIMIT %s"
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params + [limit + 1])
+        rows = _row(c, one=False)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    ts_col, id_col = (k.split(".")[-1] for k in key)
+    return rows, f"{rows[-1][ts_col] or 0}_{rows[-1][id_col]}"
+
+def _user_search(q: str, user_id_col: str) -> tuple:
+    """Условие поиска пользователя: ID целиком или начало имени / @username
+    (индексы idx_users_name_prefix / idx_users_username_prefix)."""
+    q = q.strip().lstrip("@").lower()
+    if q.isdigit():
+        return f"{user_id_col} = %s", [int(q)]
+    like = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return (f"{user_id_col} IN (SELECT user_id FROM users WHERE registered=1 "
+            f"AND (lower(name) LIKE %s OR lower(username) LIKE %s))", [like, like])
+
 # ── Users ──────────────────────────────────────────────────────────────────────
 
+def _load_user(user_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE user_id=%s", (user_id,))
+        return _row(c)
+
 def get_user(user_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE user_id=%s", (user_id,))
-    result = _row(c)
-    conn.close()
-    return result
+    row = _users.get(user_id, _load_user)
+    # Копия: вызывающий код может менять словарь
+    return dict(row) if row else None
+
+def get_user_context(user_id: int) -> tuple:
+    """(пользователь, активная анкета) одним запросом — для UserContextMiddleware."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT to_jsonb(u) AS user, to_jsonb(p) AS profile
+            FROM users u
+            LEFT JOIN profiles p ON p.user_id = u.user_id AND p.active = 1
+            WHERE u.user_id = %s
+            ORDER BY p.id DESC LIMIT 1
+        """, (user_id,))
+        row = c.fetchone()
+        return (row[0], row[1]) if row else (None, None)
 
 def upsert_user(user_id: int, **kwargs):
     # Защита от SQL-инъекций
     bad = set(kwargs) - _ALLOWED_USER_COLS
     if bad:
         raise ValueError(f"Недопустимые колонки: {bad}")
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM users WHERE user_id=%s", (user_id,))
-    existing = c.fetchone()
-    if existing:
-        sets = ", ".join(f"{k}=%s" for k in kwargs)
-        c.execute(f"UPDATE users SET {sets} WHERE user_id=%s",
-                  list(kwargs.values()) + [user_id])
-    else:
-        kwargs["user_id"] = user_id
-        cols = ", ".join(kwargs.keys())
-        qs   = ", ".join(["%s"] * len(kwargs))
-        c.execute(f"INSERT INTO users ({cols}) VALUES ({qs})",
-                  list(kwargs.values()))
-    conn.commit()
-    conn.close()
-
-def get_all_users() -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE registered=1 ORDER BY created_at DESC")
-    result = _row(c, one=False)
-    conn.close()
-    return result
-
-def is_banned(user_id: int) -> bool:
-    user = get_user(user_id)
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT user_id FROM users WHERE user_id=%s", (user_id,))
+        existing = c.fetchone()
+        if existing:
+            sets = ", ".join(f"{k}=%s" for k in kwargs)
+            c.execute(f"UPDATE users SET {sets} WHERE user_id=%s",
+                      list(kwargs.values()) + [user_id])
+        else:
+            kwargs["user_id"] = user_id
+            cols = ", ".join(kwargs.keys())
+            qs   = ", ".join(["%s"] * len(kwargs))
+            c.execute(f"INSERT INTO users ({cols}) VALUES ({qs})",
+                      list(kwargs.values()))
+        _publish(c, "user", [user_id])
+    _changed("user", [user_id])
+
+_BAN_ACTIVE     = "(banned=1 AND (ban_until IS NULL OR ban_until > %s))"
+_PREMIUM_ACTIVE = "(premium=1 AND (premium_until IS NULL OR premium_until > %s))"
+
+def page_users(after: Optional[str] = None, limit: int = 50, q: str = "",
+               status: str = "") -> tuple:
+    """Зарегистрированные пользователи, новые первыми.
+    status: banned | premium | active (не забанен) | "" — все."""
+    where, params = ["registered=1"], []
+    now = int(time.time())
+    if status == "banned":
+        where.append(_BAN_ACTIVE); params.append(now)
+    elif status == "active":
+        where.append("NOT " + _BAN_ACTIVE); params.append(now)
+    elif status == "premium":
+        where.append(_PREMIUM_ACTIVE); params.append(now)
+    if q.strip():
+        cond, args = _user_search(q, "user_id")
+        where.append(cond); params += args
+    return _keyset_page("SELECT * FROM users", where, params,
+                        ("created_at", "user_id"), after, limit)
+
+# Проверки бана и премиума только читают: истёкшие флаги в таблице
+# сбрасывает expire_bans_and_premium (фоновый expiry.py), а до него
+# решает сравнение с ban_until / premium_until.
+
+def ban_active(user: Optional[Dict], now: Optional[float] = None) -> bool:
     if not user or not user.get("banned"):
         return False
-    ban_until = user.get("ban_until")
-    if ban_until is None:
-        return True
-    if time.time() < ban_until:
-        return True
-    upsert_user(user_id, banned=0, ban_until=None, ban_reason=None)
-    return False
+    until = user.get("ban_until")
+    return until is None or (now or time.time()) < until
+
+def premium_active(user: Optional[Dict], now: Optional[float] = None) -> bool:
+    if not user or not user.get("premium"):
+        return False
+    until = user.get("premium_until")
+    return until is None or (now or time.time()) < until
+
+def is_banned(user_id: int) -> bool:
+    return ban_active(get_user(user_id))
 
 def ban_user(user_id: int, duration_key: str, reason: str = ""):
     from config import BAN_DURATIONS
@@ -208,17 +373,29 @@ def unban_user(user_id: int):
 # ── Premium ────────────────────────────────────────────────────────────────────
 
 def is_premium(user_id: int) -> bool:
-    user = get_user(user_id)
-    if not user or not user.get("premium"):
-        return False
-    until = user.get("premium_until")
-    if until is None:
-        return True   # бессрочный
-    if time.time() < until:
-        return True
-    # истёк — сбрасываем
-    upsert_user(user_id, premium=0, premium_until=None)
-    return False
+    return premium_active(get_user(user_id))
+
+def expire_bans_and_premium() -> Dict[str, int]:
+    """Снять истёкшие баны и Premium одним проходом; вернуть, сколько снято."""
+    now = int(time.time())
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE users SET banned=0, ban_until=NULL, ban_reason=NULL
+            WHERE banned=1 AND ban_until IS NOT NULL AND ban_until <= %s
+            RETURNING user_id
+        """, (now,))
+        bans = [r[0] for r in c.fetchall()]
+        c.execute("""
+            UPDATE users SET premium=0, premium_until=NULL
+            WHERE premium=1 AND premium_until IS NOT NULL AND premium_until <= %s
+            RETURNING user_id
+        """, (now,))
+        premium = [r[0] for r in c.fetchall()]
+        changed = set(bans) | set(premium)
+        _publish(c, "user", changed)
+    _changed("user", changed)
+    return {"bans": len(bans), "premium": len(premium)}
 
 def give_premium(user_id: int, days: Optional[int]):
     """days=None — бессрочно"""
@@ -229,234 +406,272 @@ def give_premium(user_id: int, days: Optional[int]):
         upsert_user(user_id, premium=1, premium_until=until)
 
 def add_payment(user_id: int, plan: str, method: str, amount: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO payments (user_id, plan, method, amount, created_at) VALUES (%s,%s,%s,%s,%s)",
-        (user_id, plan, method, amount, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO payments (user_id, plan, method, amount, created_at) VALUES (%s,%s,%s,%s,%s)",
+            (user_id, plan, method, amount, int(time.time()))
+        )
+
+def get_recent_payments(limit: int = 30) -> List[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT p.*, u.name, u.username
+            FROM payments p LEFT JOIN users u ON p.user_id = u.user_id
+            ORDER BY p.created_at DESC LIMIT %s
+        """, (limit,))
+        return _row(c, one=False)
 
 # ── Profiles ───────────────────────────────────────────────────────────────────
 
 def create_profile(user_id: int, description: str) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE profiles SET active=0 WHERE user_id=%s", (user_id,))
-    c.execute(
-        "INSERT INTO profiles (user_id, description, created_at, active) VALUES (%s,%s,%s,1) RETURNING id",
-        (user_id, description, int(time.time()))
-    )
-    pid = c.fetchone()[0]
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE profiles SET active=0 WHERE user_id=%s", (user_id,))
+        c.execute(
+            "INSERT INTO profiles (user_id, description, created_at, active) VALUES (%s,%s,%s,1) RETURNING id",
+            (user_id, description, int(time.time()))
+        )
+        pid = c.fetchone()[0]
+        _publish(c, "profile", [user_id])
+    _changed("profile", [user_id])
     return pid
 
 def add_profile_media(profile_id: int, file_id: str, media_type: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO profile_media (profile_id, file_id, media_type, created_at) VALUES (%s,%s,%s,%s)",
-        (profile_id, file_id, media_type, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO profile_media (profile_id, file_id, media_type, created_at) VALUES (%s,%s,%s,%s)",
+            (profile_id, file_id, media_type, int(time.time()))
+        )
+        owner = None
+        if media_type in ("photo", "video"):
+            c.execute(
+                "UPDATE profiles SET has_visual_media=1 WHERE id=%s RETURNING user_id",
+                (profile_id,)
+            )
+            owner = c.fetchone()
+            if owner:
+                _publish(c, "profile", owner)
+    if owner:
+        _changed("profile", [owner[0]])
 
 def get_profile_media(profile_id: int) -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM profile_media WHERE profile_id=%s ORDER BY id", (profile_id,))
-    result = _row(c, one=False)
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM profile_media WHERE profile_id=%s ORDER BY id", (profile_id,))
+        return _row(c, one=False)
+
+def get_profile_media_many(profile_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Медиа нескольких анкет одним запросом: {profile_id: [медиа по порядку]}."""
+    result: Dict[int, List[Dict]] = {pid: [] for pid in profile_ids}
+    if not result:
+        return result
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT * FROM profile_media WHERE profile_id = ANY(%s) ORDER BY profile_id, id",
+            (list(result),)
+        )
+        for m in _row(c, one=False):
+            result[m["profile_id"]].append(m)
     return result
 
-def profile_has_media(profile_id: int) -> bool:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "SELECT id FROM profile_media WHERE profile_id=%s AND media_type IN ('photo','video') LIMIT 1",
-        (profile_id,)
-    )
-    row = c.fetchone()
-    conn.close()
-    return row is not None
-
 def get_active_profile(user_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM profiles WHERE user_id=%s AND active=1", (user_id,))
-    result = _row(c)
-    conn.close()
-    return result
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM profiles WHERE user_id=%s AND active=1", (user_id,))
+        return _row(c)
 
 def delete_active_profile(user_id: int):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE profiles SET active=0 WHERE user_id=%s AND active=1", (user_id,))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE profiles SET active=0 WHERE user_id=%s AND active=1", (user_id,))
+        _publish(c, "profile", [user_id])
+    _changed("profile", [user_id])
 
 def get_last_profile_time(user_id: int) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT MAX(created_at) as t FROM profiles WHERE user_id=%s", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] or 0 if row else 0
-
-def get_matching_profiles(viewer_id: int, interests: List[str],
-                          limit: int = 2,
-                          search_gender: str = "any",
-                          age_min: int = 0, age_max: int = 99,
-                          media_only: bool = False,
-                          viewer_is_premium: bool = False) -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-
-    # Премиум-анкеты идут первыми (приоритет)
-    c.execute("""
-        SELECT p.*, u.name, u.age, u.gender, u.interests, u.premium
-        FROM profiles p
-        JOIN users u ON p.user_id = u.user_id
-        WHERE p.active=1
-          AND p.user_id != %s
-          AND u.banned = 0
-          AND u.age >= %s AND u.age <= %s
-          AND p.user_id NOT IN (SELECT blocked_id FROM blocks WHERE blocker_id=%s)
-          AND p.user_id NOT IN (SELECT blocker_id FROM blocks WHERE blocked_id=%s)
-          AND p.user_id NOT IN (
-              SELECT CASE WHEN c.sender_id=%s THEN c.target_id ELSE c.sender_id END
-              FROM chats c
-              WHERE (c.sender_id=%s OR c.target_id=%s) AND c.closed=1
-          )
-        ORDER BY u.premium DESC, RANDOM()
-        LIMIT 100
-    """, (viewer_id, age_min, age_max, viewer_id, viewer_id, viewer_id, viewer_id, viewer_id))
-    rows = _row(c, one=False)
-    conn.close()
-
-    results, seen = [], set()
-    for d in rows:
-        if d["user_id"] in seen:
-            continue
-        # Фильтр по полу
-        if search_gender != "any" and d.get("gender") != search_gender:
-            continue
-        # Фильтр по интересам
-        p_interests = set((d.get("interests") or "").split(","))
-        if not (set(interests) & p_interests):
-            continue
-        # Фильтр медиа (только для премиума)
-        if media_only and viewer_is_premium:
-            if not profile_has_media(d["id"]):
-                continue
-        seen.add(d["user_id"])
-        results.append(d)
-        if len(results) >= limit:
-            break
-    return results
-
-def get_active_profiles_admin() -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        SELECT p.*, u.name, u.age, u.gender, u.username, u.premium
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MAX(created_at) as t FROM profiles WHERE user_id=%s", (user_id,))
+        row = c.fetchone()
+        return row[0] or 0 if row else 0
+
+def get_candidate_profiles(user_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Активные анкеты незабаненных пользователей — сырьё для индекса подбора (matching.py).
+    user_ids=None — все, иначе только анкеты указанных пользователей."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT p.id, p.user_id, p.description, p.created_at,
+                   u.name, u.age, u.gender, u.interests_mask, u.premium, u.premium_until,
+                   p.has_visual_media AS has_media
+            FROM profiles p
+            JOIN users u ON p.user_id = u.user_id
+            WHERE p.active=1 AND u.banned=0
+              {"AND p.user_id = ANY(%s)" if user_ids is not None else ""}
+            ORDER BY p.id
+        """, (list(user_ids),) if user_ids is not None else None)
+        return _row(c, one=False)
+
+def get_excluded_user_ids(viewer_id: int) -> set:
+    """Кого не показывать зрителю: блокировки в обе стороны и закрытые чаты."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT blocked_id FROM blocks WHERE blocker_id=%s
+            UNION
+            SELECT blocker_id FROM blocks WHERE blocked_id=%s
+            UNION
+            SELECT CASE WHEN sender_id=%s THEN target_id ELSE sender_id END
+            FROM chats
+            WHERE (sender_id=%s OR target_id=%s) AND closed=1
+        """, (viewer_id, viewer_id, viewer_id, viewer_id, viewer_id))
+        return {r[0] for r in c.fetchall()}
+
+def page_profiles_admin(after: Optional[str] = None, limit: int = 50, q: str = "",
+                        premium: bool = False) -> tuple:
+    """Активные анкеты с данными автора, новые первыми."""
+    where, params = ["p.active=1"], []
+    if premium:
+        where.append("u.premium=1 AND (u.premium_until IS NULL OR u.premium_until > %s)")
+        params.append(int(time.time()))
+    if q.strip():
+        cond, args = _user_search(q, "p.user_id")
+        where.append(cond); params += args
+    return _keyset_page("""
+        SELECT p.*, u.name, u.age, u.gender, u.username, u.premium, u.interests_mask
         FROM profiles p JOIN users u ON p.user_id = u.user_id
-        WHERE p.active=1 ORDER BY p.created_at DESC
-    """)
-    result = _row(c, one=False)
-    conn.close()
-    return result
+    """, where, params, ("p.created_at", "p.id"), after, limit)
 
 # ── Chats ──────────────────────────────────────────────────────────────────────
 
 def create_chat(profile_id: int, sender_id: int, target_id: int) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT id FROM chats WHERE profile_id=%s AND sender_id=%s", (profile_id, sender_id))
-    existing = c.fetchone()
-    if existing:
-        conn.close()
-        return existing[0]
-    c.execute(
-        "INSERT INTO chats (profile_id, sender_id, target_id, created_at, closed) VALUES (%s,%s,%s,%s,0) RETURNING id",
-        (profile_id, sender_id, target_id, int(time.time()))
-    )
-    cid = c.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return cid
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id FROM chats WHERE profile_id=%s AND sender_id=%s", (profile_id, sender_id))
+        existing = c.fetchone()
+        if existing:
+            return existing[0]
+        c.execute(
+            "INSERT INTO chats (profile_id, sender_id, target_id, created_at, closed) VALUES (%s,%s,%s,%s,0) RETURNING *",
+            (profile_id, sender_id, target_id, int(time.time()))
+        )
+        chat = _row(c)
+    # Новый чат сразу в кеше — первое сообщение в relay не пойдёт в БД
+    _chats.set(chat["id"], chat)
+    return chat["id"]
+
+def _load_chat(chat_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM chats WHERE id=%s", (chat_id,))
+        return _row(c)
 
 def get_chat(chat_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM chats WHERE id=%s", (chat_id,))
-    result = _row(c)
-    conn.close()
-    return result
+    row = _chats.get(chat_id, _load_chat)
+    return dict(row) if row else None
 
 def close_chat(chat_id: int):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE chats SET closed=1 WHERE id=%s", (chat_id,))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE chats SET closed=1 WHERE id=%s RETURNING sender_id, target_id", (chat_id,))
+        members = c.fetchone() or ()
+        _publish(c, "chat", members)
+        _publish(c, "chat_closed", [chat_id])
+    _changed("chat_closed", [chat_id])
+    _changed("chat", members)
 
 def get_user_chats(user_id: int) -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        SELECT c.*,
-               (SELECT COUNT(*) FROM messages m
-                WHERE m.chat_id=c.id AND m.sender_id != %s AND m.read=0) as unread
-        FROM chats c
-        WHERE (c.sender_id=%s OR c.target_id=%s)
-          AND c.closed=0
-        ORDER BY c.id DESC
-    """, (user_id, user_id, user_id))
-    result = _row(c, one=False)
-    conn.close()
-    return result
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT c.*,
+                   CASE WHEN c.sender_id=%s THEN c.sender_unread ELSE c.target_unread END as unread
+            FROM chats c
+            WHERE (c.sender_id=%s OR c.target_id=%s)
+              AND c.closed=0
+            ORDER BY c.id DESC
+        """, (user_id, user_id, user_id))
+        return _row(c, one=False)
+
+# Непрочитанные хранятся счётчиком на участника (chats.sender_unread /
+# target_unread): новое сообщение увеличивает счётчик собеседника,
+# открытие чата обнуляет свой. messages.read больше не пишется.
+_BUMP_UNREAD = """
+    UPDATE chats SET
+        sender_unread = sender_unread + CASE WHEN sender_id <> %(sender)s THEN %(n)s ELSE 0 END,
+        target_unread = target_unread + CASE WHEN target_id <> %(sender)s THEN %(n)s ELSE 0 END
+    WHERE id = %(chat)s
+"""
 
 def add_message(chat_id: int, sender_id: int, content: str,
                 msg_type: str = "text", file_id: str = None) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO messages (chat_id, sender_id, content, msg_type, file_id, created_at, read) VALUES (%s,%s,%s,%s,%s,%s,0) RETURNING id",
-        (chat_id, sender_id, content, msg_type, file_id, int(time.time()))
-    )
-    mid = c.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return mid
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO messages (chat_id, sender_id, content, msg_type, file_id, created_at, read) VALUES (%s,%s,%s,%s,%s,%s,0) RETURNING id",
+            (chat_id, sender_id, content, msg_type, file_id, int(time.time()))
+        )
+        msg_id = c.fetchone()[0]
+        c.execute(_BUMP_UNREAD, {"chat": chat_id, "sender": sender_id, "n": 1})
+        return msg_id
+
+def add_messages(rows: List[tuple]) -> int:
+    """Пакетная запись сообщений одним INSERT (для message_log).
+    Строка: (chat_id, sender_id, content, msg_type, file_id, created_at)."""
+    if not rows:
+        return 0
+    counts: Dict[tuple, int] = {}
+    for chat_id, sender_id, *_ in rows:
+        counts[(chat_id, sender_id)] = counts.get((chat_id, sender_id), 0) + 1
+    with connection() as conn:
+        c = conn.cursor()
+        execute_values(
+            c,
+            "INSERT INTO messages (chat_id, sender_id, content, msg_type, file_id, created_at, read) VALUES %s",
+            rows, template="(%s,%s,%s,%s,%s,%s,0)", page_size=len(rows)
+        )
+        # По одному UPDATE на (чат, отправитель), в порядке id — одним обращением к серверу
+        execute_batch(c, _BUMP_UNREAD, [
+            {"chat": chat, "sender": sender, "n": n}
+            for (chat, sender), n in sorted(counts.items())
+        ], page_size=len(counts))
+    return len(rows)
 
 def mark_messages_read(chat_id: int, reader_id: int):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "UPDATE messages SET read=1 WHERE chat_id=%s AND sender_id != %s AND read=0",
-        (chat_id, reader_id)
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE chats SET
+                sender_unread = CASE WHEN sender_id=%s THEN 0 ELSE sender_unread END,
+                target_unread = CASE WHEN target_id=%s THEN 0 ELSE target_unread END
+            WHERE id=%s
+        """, (reader_id, reader_id, chat_id))
 
 def get_chat_messages(chat_id: int, limit: int = 100) -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "SELECT * FROM (SELECT * FROM messages WHERE chat_id=%s ORDER BY created_at DESC LIMIT %s) sub ORDER BY created_at ASC",
-        (chat_id, limit)
-    )
-    result = _row(c, one=False)
-    conn.close()
-    return result
-
-def get_all_chats_admin() -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT * FROM (SELECT * FROM messages WHERE chat_id=%s ORDER BY created_at DESC LIMIT %s) sub ORDER BY created_at ASC",
+            (chat_id, limit)
+        )
+        return _row(c, one=False)
+
+def page_chats_admin(after: Optional[str] = None, limit: int = 50, q: str = "",
+                     status: str = "") -> tuple:
+    """Чаты с именами участников, новые первыми. Подзапросы по messages —
+    только для строк страницы. status: open | closed | "" — все;
+    q — ID или имя любого из участников."""
+    where, params = [], []
+    if status in ("open", "closed"):
+        where.append("c.closed=%s"); params.append(int(status == "closed"))
+    if q.strip():
+        s_cond, s_args = _user_search(q, "c.sender_id")
+        t_cond, t_args = _user_search(q, "c.target_id")
+        where.append(f"({s_cond} OR {t_cond})"); params += s_args + t_args
+    return _keyset_page("""
         SELECT c.*,
                us.name as sender_name, us.username as sender_username,
                ut.name as target_name, ut.username as target_username,
@@ -465,273 +680,280 @@ def get_all_chats_admin() -> List[Dict]:
         FROM chats c
         LEFT JOIN users us ON c.sender_id = us.user_id
         LEFT JOIN users ut ON c.target_id = ut.user_id
-        ORDER BY c.created_at DESC
-    """)
-    result = _row(c, one=False)
-    conn.close()
-    return result
+    """, where, params, ("c.created_at", "c.id"), after, limit)
 
 # ── Reports ────────────────────────────────────────────────────────────────────
 
 def add_report(chat_id: int, reporter_id: int, reported_id: int, reason: str = ""):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO reports (chat_id, reporter_id, reported_id, reason, created_at) VALUES (%s,%s,%s,%s,%s)",
-        (chat_id, reporter_id, reported_id, reason, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
-
-def get_reports(status: str = None) -> List[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO reports (chat_id, reporter_id, reported_id, reason, created_at) VALUES (%s,%s,%s,%s,%s)",
+            (chat_id, reporter_id, reported_id, reason, int(time.time()))
+        )
+    _counts.clear()
+
+_REPORT_SELECT = """
+    SELECT r.*, u.name as reported_name, u.username as reported_username
+    FROM reports r LEFT JOIN users u ON r.reported_id = u.user_id
+"""
+
+def get_report(report_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute(_REPORT_SELECT + " WHERE r.id=%s", (report_id,))
+        return _row(c)
+
+def page_reports(after: Optional[str] = None, limit: int = 50, q: str = "",
+                 status: str = "") -> tuple:
+    """Жалобы, новые первыми. status: new | resolved | "" — все;
+    q — ID или имя того, на кого жалуются."""
+    where, params = [], []
     if status:
+        where.append("r.status=%s"); params.append(status)
+    if q.strip():
+        cond, args = _user_search(q, "r.reported_id")
+        where.append(cond); params += args
+    return _keyset_page(_REPORT_SELECT, where, params, ("r.created_at", "r.id"), after, limit)
+
+def resolve_report(report_id: int):
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE reports SET status='resolved' WHERE id=%s", (report_id,))
+    _counts.clear()
+
+# ── Счётчики админки ──────────────────────────────────────────────────────────
+# Панели нужны только числа, а не строки: раньше ради len() в Python
+# поднимались все users, chats (с двумя подзапросами на чат), анкеты
+# и жалобы. Теперь — один агрегатный запрос по частичным индексам,
+# не чаще раза в STATS_CACHE_TTL на процесс.
+
+_counts = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+
+def _load_admin_counts(_key) -> Dict:
+    with connection() as conn:
+        c = conn.cursor()
         c.execute("""
-            SELECT r.*, u.name as reported_name, u.username as reported_username
-            FROM reports r LEFT JOIN users u ON r.reported_id = u.user_id
-            WHERE r.status=%s ORDER BY r.created_at DESC
-        """, (status,))
-    else:
-        c.execute("""
-            SELECT r.*, u.name as reported_name, u.username as reported_username
-            FROM reports r LEFT JOIN users u ON r.reported_id = u.user_id
-            ORDER BY r.created_at DESC
+            SELECT (SELECT COUNT(*) FROM users WHERE registered=1)       AS users,
+                   (SELECT COUNT(*) FROM chats)                          AS chats,
+                   (SELECT COUNT(*) FROM profiles p JOIN users u ON p.user_id = u.user_id
+                     WHERE p.active=1)                                   AS profiles,
+                   (SELECT COUNT(*) FROM reports WHERE status='new')     AS reports,
+                   (SELECT COUNT(*) FROM messages)                       AS messages
         """)
-    result = _row(c, one=False)
-    conn.close()
-    return result
+        return _row(c)
+
+def get_admin_counts() -> Dict:
+    """users, chats, profiles (активные), reports (новые), messages."""
+    return dict(_counts.get("all", _load_admin_counts))
+
+# ── Broadcasts ─────────────────────────────────────────────────────────────────
+# Задание рассылки идёт по users в порядке user_id: cursor_id — последний
+# обработанный получатель, после каждой страницы он сохраняется вместе
+# со счётчиками. status: running | paused | cancelled | done.
+
+def create_broadcast(admin_id: int, text: str,
+                     progress_chat: Optional[int] = None, progress_msg: Optional[int] = None) -> Dict:
+    now = int(time.time())
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO broadcasts (admin_id, text, total, progress_chat, progress_msg,
+                                    created_at, updated_at)
+            VALUES (%s, %s, (SELECT COUNT(*) FROM users WHERE registered=1 AND bot_blocked=0),
+                    %s, %s, %s, %s)
+            RETURNING *
+        """, (admin_id, text, progress_chat, progress_msg, now, now))
+        job = _row(c)
+        _publish(c, "broadcast", [job["id"]])
+    _changed("broadcast", [job["id"]])
+    return job
+
+def get_broadcast(broadcast_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM broadcasts WHERE id=%s", (broadcast_id,))
+        return _row(c)
+
+def get_broadcasts(limit: int = 20) -> List[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM broadcasts ORDER BY id DESC LIMIT %s", (limit,))
+        return _row(c, one=False)
+
+def get_running_broadcasts() -> List[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM broadcasts WHERE status='running' ORDER BY id")
+        return _row(c, one=False)
+
+_BROADCAST_FROM = {
+    "paused":    ("running",),
+    "running":   ("paused",),
+    "cancelled": ("running", "paused"),
+}
 
-def resolve_report(report_id: int):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE reports SET status='resolved' WHERE id=%s", (report_id,))
-    conn.commit()
-    conn.close()
+def set_broadcast_status(broadcast_id: int, status: str) -> bool:
+    """Пауза / продолжение / отмена. False — задание уже в другом состоянии."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE broadcasts SET status=%s, updated_at=%s,
+                   finished_at = CASE WHEN %s = 'cancelled' THEN %s ELSE finished_at END
+            WHERE id=%s AND status = ANY(%s)
+        """, (status, int(time.time()), status, int(time.time()),
+              broadcast_id, list(_BROADCAST_FROM[status])))
+        changed = c.rowcount > 0
+        if changed:
+            _publish(c, "broadcast", [broadcast_id])
+    if changed:
+        _changed("broadcast", [broadcast_id])
+    return changed
+
+def get_broadcast_recipients(after_id: int, limit: int) -> List[int]:
+    """Следующая страница получателей после after_id (keyset по первичному ключу)."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT user_id FROM users
+            WHERE user_id > %s AND registered=1 AND bot_blocked=0
+            ORDER BY user_id LIMIT %s
+        """, (after_id, limit))
+        return [r[0] for r in c.fetchall()]
+
+def save_broadcast_progress(broadcast_id: int, cursor_id: int, sent: int, failed: int,
+                            blocked: int, finished: bool = False) -> Optional[Dict]:
+    """Сдвинуть курсор и прибавить счётчики страницы. Возвращает задание
+    со статусом из БД — так исполнитель видит паузу или отмену."""
+    now = int(time.time())
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE broadcasts SET
+                cursor_id = %s, sent = sent + %s, failed = failed + %s, blocked = blocked + %s,
+                updated_at = %s,
+                status      = CASE WHEN %s AND status='running' THEN 'done' ELSE status END,
+                finished_at = CASE WHEN %s AND status='running' THEN %s ELSE finished_at END
+            WHERE id=%s
+            RETURNING *
+        """, (cursor_id, sent, failed, blocked, now, finished, finished, now, broadcast_id))
+        return _row(c)
+
+def mark_bot_blocked(user_ids: List[int]):
+    """Пользователи заблокировали бота (403 при отправке)."""
+    if not user_ids:
+        return
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE users SET bot_blocked=1 WHERE user_id = ANY(%s)", (list(user_ids),))
+        _publish(c, "user", user_ids)
+    _changed("user", user_ids)
+
+# ── Deadlines ──────────────────────────────────────────────────────────────────
+# Сроки для deadlines.py: на (kind, key) не больше одного — новый заменяет старый.
+
+def set_deadline(kind: str, key: int, due_at: float, payload: Dict):
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO deadlines (kind, key, due_at, payload) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (kind, key) DO UPDATE SET due_at = EXCLUDED.due_at, payload = EXCLUDED.payload
+        """, (kind, key, due_at, Json(payload)))
+
+def cancel_deadline(kind: str, key: int):
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM deadlines WHERE kind=%s AND key=%s", (kind, key))
+
+def get_due_deadlines(now: float, limit: int) -> List[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM deadlines WHERE due_at <= %s ORDER BY due_at LIMIT %s", (now, limit))
+        return _row(c, one=False)
+
+def next_deadline_at() -> Optional[float]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MIN(due_at) FROM deadlines")
+        return c.fetchone()[0]
+
+def delete_deadlines(rows: List[Dict]):
+    """Удалить отработанные сроки. Срок, переставленный за это время
+    (другой due_at), остаётся."""
+    if not rows:
+        return
+    with connection() as conn:
+        c = conn.cursor()
+        execute_batch(c, "DELETE FROM deadlines WHERE kind=%s AND key=%s AND due_at=%s",
+                      [(r["kind"], r["key"], r["due_at"]) for r in rows])
 
 # ── Blocks ─────────────────────────────────────────────────────────────────────
 
 def block_user(blocker_id: int, blocked_id: int):
-    conn = get_conn()
-    c = conn.cursor()
-    try:
+    with connection() as conn:
+        c = conn.cursor()
         c.execute(
-            "INSERT INTO blocks (blocker_id, blocked_id, created_at) VALUES (%s,%s,%s)",
+            "INSERT INTO blocks (blocker_id, blocked_id, created_at) VALUES (%s,%s,%s) "
+            "ON CONFLICT (blocker_id, blocked_id) DO NOTHING",
             (blocker_id, blocked_id, int(time.time()))
         )
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    conn.close()
+        pair = _BlockSet.key(blocker_id, blocked_id)
+        _publish(c, "block", [blocker_id, blocked_id])
+        _publish(c, "block_pair", [pair])
+    _changed("block_pair", [pair])
+    _changed("block", [blocker_id, blocked_id])
 
 def is_blocked(blocker_id: int, blocked_id: int) -> bool:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT id FROM blocks WHERE blocker_id=%s AND blocked_id=%s", (blocker_id, blocked_id))
-    row = c.fetchone()
-    conn.close()
-    return row is not None
-
-# ── КМН (Игры) ────────────────────────────────────────────────────────────────
-
-def create_rps_game(chat_id: int, initiator_id: int, opponent_id: int,
-                    initiator_stake_type: str, initiator_stake_fid: str,
-                    wins_to: int = 3) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS rps_games (
-            id                   SERIAL PRIMARY KEY,
-            chat_id              INTEGER,
-            initiator_id         BIGINT,
-            opponent_id          BIGINT,
-            initiator_stake_type TEXT,
-            initiator_stake_fid  TEXT,
-            opponent_stake_type  TEXT,
-            opponent_stake_fid   TEXT,
-            wins_to              INTEGER DEFAULT 3,
-            initiator_wins       INTEGER DEFAULT 0,
-            opponent_wins        INTEGER DEFAULT 0,
-            status               TEXT DEFAULT 'waiting_stake',
-            initiator_move       TEXT,
-            opponent_move        TEXT,
-            created_at           BIGINT
-        )
-    """)
-    c.execute("""
-        INSERT INTO rps_games
-            (chat_id, initiator_id, opponent_id,
-             initiator_stake_type, initiator_stake_fid,
-             wins_to, status, created_at)
-        VALUES (%s,%s,%s,%s,%s,%s,'waiting_stake',%s)
-        RETURNING id
-    """, (chat_id, initiator_id, opponent_id,
-          initiator_stake_type, initiator_stake_fid,
-          wins_to, int(time.time())))
-    gid = c.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return gid
-
-def get_rps_game(game_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM rps_games WHERE id=%s", (game_id,))
-    result = _row(c)
-    conn.close()
-    return result
+    return _blocks.contains(blocker_id, blocked_id)
 
-def get_active_rps_by_chat(chat_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        SELECT * FROM rps_games
-        WHERE chat_id=%s AND status NOT IN ('finished','cancelled')
-        ORDER BY id DESC LIMIT 1
-    """, (chat_id,))
-    result = _row(c)
-    conn.close()
-    return result
+# ── Мини-игры (game_engine.py) ───────────────────────────────────────────────
+# Одна таблица на все игры: kind — правила (game_rules.py), state — счёт,
+# ходы и ставки.
 
-def update_rps_game(game_id: int, **kwargs):
-    allowed = {
-        'opponent_stake_type','opponent_stake_fid','status',
-        'initiator_move','opponent_move',
-        'initiator_wins','opponent_wins'
-    }
-    bad = set(kwargs) - allowed
-    if bad:
-        raise ValueError(f"Недопустимые поля: {bad}")
-    conn = get_conn()
-    c = conn.cursor()
-    sets = ", ".join(f"{k}=%s" for k in kwargs)
-    c.execute(f"UPDATE rps_games SET {sets} WHERE id=%s",
-              list(kwargs.values()) + [game_id])
-    conn.commit()
-    conn.close()
-
-def init_rps_table():
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS rps_games (
-            id                   SERIAL PRIMARY KEY,
-            chat_id              INTEGER,
-            initiator_id         BIGINT,
-            opponent_id          BIGINT,
-            initiator_stake_type TEXT,
-            initiator_stake_fid  TEXT,
-            opponent_stake_type  TEXT,
-            opponent_stake_fid   TEXT,
-            wins_to              INTEGER DEFAULT 3,
-            initiator_wins       INTEGER DEFAULT 0,
-            opponent_wins        INTEGER DEFAULT 0,
-            status               TEXT DEFAULT 'waiting_stake',
-            initiator_move       TEXT,
-            opponent_move        TEXT,
-            created_at           BIGINT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-# ── КМН (Камень-Ножницы-Бумага) ───────────────────────────────────────────────
-
-def create_kmn_game(chat_id: int, initiator_id: int, opponent_id: int,
-                    wins_needed: int = 3) -> int:
-    conn = get_conn()
-    c = conn.cursor()
-    # Создаём таблицу если нет
-    c.execute("""CREATE TABLE IF NOT EXISTS kmn_games (
-        id              SERIAL PRIMARY KEY,
-        chat_id         INTEGER NOT NULL,
-        initiator_id    BIGINT NOT NULL,
-        opponent_id     BIGINT NOT NULL,
-        wins_needed     INTEGER DEFAULT 3,
-        initiator_wins  INTEGER DEFAULT 0,
-        opponent_wins   INTEGER DEFAULT 0,
-        status          TEXT DEFAULT 'waiting_stake_initiator',
-        initiator_stake_file_id   TEXT,
-        initiator_stake_type      TEXT,
-        opponent_stake_file_id    TEXT,
-        opponent_stake_type       TEXT,
-        current_round   INTEGER DEFAULT 1,
-        initiator_move  TEXT,
-        opponent_move   TEXT,
-        created_at      BIGINT,
-        updated_at      BIGINT
-    )""")
-    c.execute("""
-        INSERT INTO kmn_games
-            (chat_id, initiator_id, opponent_id, wins_needed, created_at, updated_at)
-        VALUES (%s,%s,%s,%s,%s,%s) RETURNING id
-    """, (chat_id, initiator_id, opponent_id, wins_needed,
-          int(time.time()), int(time.time())))
-    gid = c.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return gid
-
-def get_kmn_game(game_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM kmn_games WHERE id=%s", (game_id,))
-    result = _row(c)
-    conn.close()
-    return result
-
-def get_active_kmn_by_chat(chat_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        SELECT * FROM kmn_games
-        WHERE chat_id=%s AND status NOT IN ('finished','cancelled')
-        ORDER BY id DESC LIMIT 1
-    """, (chat_id,))
-    result = _row(c)
-    conn.close()
-    return result
-
-def update_kmn_game(game_id: int, **kwargs):
-    allowed = {
-        'status', 'initiator_wins', 'opponent_wins',
-        'initiator_stake_file_id', 'initiator_stake_type',
-        'opponent_stake_file_id', 'opponent_stake_type',
-        'current_round', 'initiator_move', 'opponent_move', 'updated_at'
-    }
-    bad = set(kwargs) - allowed
-    if bad:
-        raise ValueError(f"Недопустимые колонки kmn: {bad}")
-    kwargs['updated_at'] = int(time.time())
-    conn = get_conn()
-    c = conn.cursor()
-    sets = ", ".join(f"{k}=%s" for k in kwargs)
-    c.execute(f"UPDATE kmn_games SET {sets} WHERE id=%s",
-              list(kwargs.values()) + [game_id])
-    conn.commit()
-    conn.close()
-
-def init_kmn_table():
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS kmn_games (
-        id              SERIAL PRIMARY KEY,
-        chat_id         INTEGER NOT NULL,
-        initiator_id    BIGINT NOT NULL,
-        opponent_id     BIGINT NOT NULL,
-        wins_needed     INTEGER DEFAULT 3,
-        initiator_wins  INTEGER DEFAULT 0,
-        opponent_wins   INTEGER DEFAULT 0,
-        status          TEXT DEFAULT 'waiting_stake_initiator',
-        initiator_stake_file_id   TEXT,
-        initiator_stake_type      TEXT,
-        opponent_stake_file_id    TEXT,
-        opponent_stake_type       TEXT,
-        current_round   INTEGER DEFAULT 1,
-        initiator_move  TEXT,
-        opponent_move   TEXT,
-        created_at      BIGINT,
-        updated_at      BIGINT
-    )""")
-    conn.commit()
-    conn.close()
+def create_game(kind: str, chat_id: int, initiator_id: int, opponent_id: int,
+                status: str, state: Dict) -> Dict:
+    now = int(time.time())
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO games
+                (kind, chat_id, initiator_id, opponent_id, status, state, created_at, updated_at)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s) RETURNING *
+        """, (kind, chat_id, initiator_id, opponent_id, status, Json(state), now, now))
+        return _row(c)
+
+def get_game(game_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM games WHERE id=%s", (game_id,))
+        return _row(c)
+
+def get_active_game_by_chat(chat_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT * FROM games
+            WHERE chat_id=%s AND status NOT IN ('finished','cancelled')
+            ORDER BY id DESC LIMIT 1
+        """, (chat_id,))
+        return _row(c)
+
+def get_active_games() -> List[Dict]:
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM games WHERE status NOT IN ('finished','cancelled')")
+        return _row(c, one=False)
+
+def update_game_if(game_id: int, statuses: Iterable[str], current_round: int,
+                   status: str, next_round: int, state: Dict) -> Optional[Dict]:
+    """Compare-and-set: записать статус, раунд и state, только если игра всё
+    ещё в одном из statuses и на раунде current_round. None — состояние уже другое."""
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE games SET status=%s, current_round=%s, state=%s, updated_at=%s
+            WHERE id=%s AND status = ANY(%s) AND current_round=%s
+            RETURNING *
+        """, (status, next_round, Json(state), int(time.time()),
+              game_id, list(statuses), current_round))
+        return _row(c)
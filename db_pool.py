@@ -0,0 +1,233 @@
+"""
+Пул соединений PostgreSQL.
+
+Один пул на процесс (бот и веб-панель работают в разных процессах).
+Соединения выдаются через контекстный менеджер connection():
+коммит при успешном выходе, откат при исключении, возврат в пул всегда.
+
+Умеет:
+  - держать от min до max соединений;
+  - ждать свободное соединение не дольше timeout, иначе PoolTimeout;
+  - проверять соединение (SELECT 1), если оно долго простаивало;
+  - закрывать соединения, простоявшие дольше max_idle или прожившие дольше max_lifetime;
+  - считать метрики (выдачи, ожидания, таймауты, пик занятых).
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+log = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+class _Slot:
+    __slots__ = ("conn", "created_at", "released_at")
+
+    def __init__(self, conn):
+        self.conn        = conn
+        self.created_at  = time.monotonic()
+        self.released_at = self.created_at
+
+class ConnectionPool:
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 10.0, max_idle: float = 300.0,
+                 max_lifetime: float = 3600.0, check_after: float = 30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Неверные размеры пула: min={minconn}, max={maxconn}")
+        self.dsn          = dsn
+        self.minconn      = minconn
+        self.maxconn      = maxconn
+        self.timeout      = timeout
+        self.max_idle     = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after  = check_after
+
+        self._cond   = threading.Condition()
+        self._idle: List[_Slot] = []
+        self._used: Dict[int, _Slot] = {}
+        self._opening = 0
+        self._closed  = False
+        self._stats = {
+            "checkouts": 0,   # выдано соединений
+            "waits":     0,   # сколько раз пришлось ждать (пул исчерпан)
+            "timeouts":  0,   # сколько раз не дождались
+            "created":   0,
+            "recycled":  0,   # закрыты по max_idle / max_lifetime
+            "broken":    0,   # выброшены как нерабочие
+            "peak_used": 0,
+        }
+
+        for _ in range(minconn):
+            slot = self._open()
+            with self._cond:
+                self._idle.append(slot)
+
+    # ── Внутреннее ─────────────────────────────────────────────────────────────
+
+    def _size(self) -> int:
+        return len(self._idle) + len(self._used) + self._opening
+
+    def _open(self) -> _Slot:
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._stats["created"] += 1
+        return _Slot(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, slot: _Slot, now: float) -> bool:
+        if now - slot.created_at > self.max_lifetime:
+            return True
+        return now - slot.released_at > self.max_idle and self._size() > self.minconn
+
+    def _healthy(self, slot: _Slot, now: float) -> bool:
+        conn = slot.conn
+        if conn.closed:
+            return False
+        if now - slot.released_at < self.check_after:
+            return True
+        try:
+            c = conn.cursor()
+            c.execute("SELECT 1")
+            c.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # ── Выдача / возврат ───────────────────────────────────────────────────────
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout  = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited   = False
+
+        while True:
+            slot = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Пул закрыт")
+                    now = time.monotonic()
+                    # Выбрасываем устаревшие из простаивающих
+                    while self._idle and self._expired(self._idle[0], now):
+                        old = self._idle.pop(0)
+                        self._stats["recycled"] += 1
+                        self._close_quietly(old.conn)
+                    if self._idle:
+                        slot = self._idle.pop()   # LIFO — самое «тёплое»
+                        if now - slot.created_at > self.max_lifetime:
+                            self._stats["recycled"] += 1
+                            self._close_quietly(slot.conn)
+                            slot = None
+                            continue
+                        break
+                    if self._size() < self.maxconn:
+                        self._opening += 1
+                        break
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        log.warning("Пул БД исчерпан: %s занято, ждали %.1f с",
+                                    len(self._used), timeout)
+                        raise PoolTimeout(f"Нет свободного соединения за {timeout} с")
+                    self._cond.wait(remaining)
+
+            if slot is None:
+                try:
+                    slot = self._open()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if slot is None:
+                            self._cond.notify()
+            elif not self._healthy(slot, time.monotonic()):
+                with self._cond:
+                    self._stats["broken"] += 1
+                    self._cond.notify()
+                self._close_quietly(slot.conn)
+                continue
+
+            with self._cond:
+                self._used[id(slot.conn)] = slot
+                self._stats["checkouts"] += 1
+                self._stats["peak_used"] = max(self._stats["peak_used"], len(self._used))
+            return slot.conn
+
+    def putconn(self, conn, broken: bool = False):
+        with self._cond:
+            slot = self._used.pop(id(conn), None)
+        if slot is None:
+            self._close_quietly(conn)
+            return
+
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                broken = True
+        if broken or conn.closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats["broken"] += 1
+                self._cond.notify()
+            return
+
+        slot.released_at = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append(slot)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn   = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    # ── Служебное ──────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._stats,
+                        size=self._size(), idle=len(self._idle), used=len(self._used),
+                        min=self.minconn, max=self.maxconn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for slot in idle:
+            self._close_quietly(slot.conn)
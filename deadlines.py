@@ -0,0 +1,109 @@
+"""
+Таймауты игр: сроки в таблице deadlines и один цикл, который их исполняет.
+
+Раньше на каждую ставку, вызов и ход КМН создавалась задача с
+asyncio.sleep(60): тысячи спящих задач, каждая потом перечитывала игру,
+никто их не отменял, а после рестарта они пропадали и игры зависали.
+
+Теперь хендлер ставит срок:
+
+    await deadlines.schedule("game", game_id, 60, stage="move", round=2)
+
+  - на (kind, key) один срок: новый заменяет старый, cancel() снимает;
+  - run() берёт наступившие сроки пачкой (DEADLINE_BATCH, индекс по due_at),
+    вызывает обработчик вида и удаляет срок; просроченные за время
+    простоя отрабатывают сразу после старта;
+  - обработчик регистрируется в модуле игры и сам проверяет, что игра
+    всё ещё в ожидаемом состоянии (срок мог пережить смену состояния):
+
+    @deadlines.handler("game")
+    async def _on_deadline(bot, game_id, payload): ...
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+
+import async_db as db
+from config import DEADLINE_BATCH, DEADLINE_POLL_SEC
+
+log = logging.getLogger(__name__)
+
+Handler = Callable[[Bot, int, Dict], Awaitable[None]]
+
+_handlers: Dict[str, Handler] = {}
+_bot: Optional[Bot] = None
+_wakeup: Optional[asyncio.Event] = None
+_next_due: float = 0.0
+
+_stats = {"fired": 0, "errors": 0, "unknown": 0, "max_lag_ms": 0}
+
+def handler(kind: str):
+    def register(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+async def schedule(kind: str, key: int, delay: float, **payload):
+    """Поставить (или переставить) срок через delay секунд."""
+    global _next_due
+    due = time.time() + delay
+    await db.set_deadline(kind, key, due, payload)
+    if _wakeup is not None and due < _next_due:
+        _next_due = due
+        _wakeup.set()
+
+async def cancel(kind: str, key: int):
+    await db.cancel_deadline(kind, key)
+
+def stats() -> Dict:
+    return dict(_stats, kinds=sorted(_handlers))
+
+async def _fire(row: Dict):
+    fn = _handlers.get(row["kind"])
+    if fn is None:
+        _stats["unknown"] += 1
+        log.warning("Нет обработчика срока %s:%s", row["kind"], row["key"])
+        return
+    try:
+        await fn(_bot, row["key"], row["payload"])
+        _stats["fired"] += 1
+    except Exception:
+        _stats["errors"] += 1
+        log.exception("Ошибка в обработчике срока %s:%s", row["kind"], row["key"])
+
+async def run_once() -> int:
+    now = time.time()
+    due = await db.get_due_deadlines(now, DEADLINE_BATCH)
+    if due:
+        _stats["max_lag_ms"] = max(_stats["max_lag_ms"], int((now - due[0]["due_at"]) * 1000))
+        await asyncio.gather(*(_fire(r) for r in due))
+        await db.delete_deadlines(due)
+    return len(due)
+
+async def run(bot: Bot):
+    """Фоновый цикл: asyncio.create_task(deadlines.run(bot))."""
+    global _bot, _wakeup, _next_due
+    _bot = bot
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            if await run_once() >= DEADLINE_BATCH:
+                continue   # возможно, наступили ещё
+            nxt = await db.next_deadline_at()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Ошибка при обработке сроков")
+            nxt = None
+        # Спим до ближайшего срока, но не дольше DEADLINE_POLL_SEC
+        now = time.time()
+        _next_due = nxt if nxt is not None else now + DEADLINE_POLL_SEC
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), max(0.0, min(_next_due - now, DEADLINE_POLL_SEC)))
+        except asyncio.TimeoutError:
+            pass
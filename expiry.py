@@ -0,0 +1,53 @@
+"""
+Фоновое снятие истёкших банов и Premium.
+
+Раньше is_banned / is_premium сбрасывали флаги прямо при чтении
+(SELECT + UPDATE в хендлере). Теперь чтения только сравнивают сроки,
+а раз в EXPIRY_SWEEP_SEC бот одним проходом снимает всё истёкшее
+(database.expire_bans_and_premium) — с инвалидацией кешей через
+обычные события "user".
+
+Запускается в процессе бота: asyncio.create_task(expiry.run()).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import async_db as db
+from config import EXPIRY_SWEEP_SEC
+
+log = logging.getLogger(__name__)
+
+_stats = {
+    "runs": 0, "errors": 0,
+    "bans_expired": 0, "premium_expired": 0,
+    "last_run": None, "last_ms": None,
+}
+
+def stats() -> Dict:
+    return dict(_stats, interval=EXPIRY_SWEEP_SEC)
+
+async def sweep_once() -> Dict[str, int]:
+    started = time.monotonic()
+    expired = await db.expire_bans_and_premium()
+    _stats["runs"] += 1
+    _stats["bans_expired"] += expired["bans"]
+    _stats["premium_expired"] += expired["premium"]
+    _stats["last_run"] = int(time.time())
+    _stats["last_ms"] = int((time.monotonic() - started) * 1000)
+    if expired["bans"] or expired["premium"]:
+        log.info("Истекли: баны %s, Premium %s", expired["bans"], expired["premium"])
+    return expired
+
+async def run(interval: float = EXPIRY_SWEEP_SEC):
+    while True:
+        try:
+            await sweep_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _stats["errors"] += 1
+            log.exception("Ошибка при снятии истёкших банов/Premium")
+        await asyncio.sleep(interval)
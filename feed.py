@@ -0,0 +1,226 @@
+"""
+Лента анкет зрителя для «👥 Анкеты».
+
+Вместо случайной выборки на каждое нажатие у зрителя есть лента —
+заранее перетасованный список кандидатов из индекса (matching.py)
+и курсор по нему:
+  - next_profiles(viewer, n) снимает n анкет с начала ленты — O(n),
+    без перебора индекса;
+  - показанные анкеты попадают в SeenStore и не возвращаются, пока
+    зритель не пролистает всех подходящих (тогда начинается новый круг);
+  - когда лента почти кончилась или устарела (FEED_MAX_AGE), она
+    перестраивается в фоне, пока пользователь смотрит текущие анкеты.
+
+Порядок ленты детерминирован: сортировка по id и перемешивание
+генератором с зерном (зритель, круг), сначала 👑 Premium, потом остальные.
+Смена фильтров или интересов пересобирает ленту сразу.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import async_db as adb
+import matching
+from config import FEED_SEEN_MAX, FEED_SEEN_TTL, FEED_MAX_AGE, FEED_PREFETCH
+
+log = logging.getLogger(__name__)
+
+# ── Просмотренные ─────────────────────────────────────────────────────────────
+
+class SeenStore:
+    """Последние FEED_SEEN_MAX показанных анкет на зрителя: кольцо для порядка
+    вытеснения + множество для проверки. Зритель, не листавший FEED_SEEN_TTL,
+    забывается целиком."""
+
+    def __init__(self, maxlen: int = FEED_SEEN_MAX, ttl: float = FEED_SEEN_TTL):
+        self._lock = threading.Lock()
+        self._maxlen = maxlen
+        self._ttl = ttl
+        self._data: Dict[int, Tuple[float, Deque[int], Set[int]]] = {}
+
+    def _entry(self, viewer_id: int, now: float) -> Tuple[float, Deque[int], Set[int]]:
+        e = self._data.get(viewer_id)
+        if e is None or now - e[0] > self._ttl:
+            e = (now, deque(), set())
+        else:
+            e = (now, e[1], e[2])
+        self._data[viewer_id] = e
+        return e
+
+    def mark(self, viewer_id: int, profile_ids: List[int]):
+        now = time.monotonic()
+        with self._lock:
+            _, ring, ids = self._entry(viewer_id, now)
+            for pid in profile_ids:
+                if pid in ids:
+                    continue
+                if len(ring) >= self._maxlen:
+                    ids.discard(ring.popleft())
+                ring.append(pid)
+                ids.add(pid)
+
+    def get(self, viewer_id: int) -> Set[int]:
+        now = time.monotonic()
+        with self._lock:
+            e = self._data.get(viewer_id)
+            if e is None or now - e[0] > self._ttl:
+                return set()
+            return set(e[2])
+
+    def reset(self, viewer_id: int):
+        with self._lock:
+            self._data.pop(viewer_id, None)
+
+    def prune(self):
+        now = time.monotonic()
+        with self._lock:
+            self._data = {k: v for k, v in self._data.items() if now - v[0] <= self._ttl}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# ── Лента ─────────────────────────────────────────────────────────────────────
+
+class _Feed:
+    __slots__ = ("key", "queue", "built_at", "round")
+
+    def __init__(self):
+        self.key: Optional[Tuple] = None
+        self.queue: Deque[int] = deque()
+        self.built_at = 0.0
+        self.round = 0
+
+class FeedStore:
+    def __init__(self, index: matching.CandidateIndex, seen: SeenStore):
+        self._index = index
+        self._seen = seen
+        self._lock = threading.Lock()
+        self._feeds: Dict[int, _Feed] = {}
+
+    def _feed(self, viewer_id: int) -> _Feed:
+        with self._lock:
+            feed = self._feeds.get(viewer_id)
+            if feed is None:
+                if len(self._feeds) > 10000:
+                    self._prune()
+                feed = self._feeds[viewer_id] = _Feed()
+            return feed
+
+    def _prune(self):
+        # Вызывается под self._lock
+        now = time.monotonic()
+        self._feeds = {k: f for k, f in self._feeds.items() if now - f.built_at <= FEED_SEEN_TTL}
+        self._seen.prune()
+
+    def refill(self, viewer_id: int, excluded: Set[int], key: Tuple):
+        """Перетасовать ленту: все подходящие кандидаты, кроме уже просмотренных.
+        Если непросмотренных не осталось — начать новый круг."""
+        interests_mask, search_gender, age_min, age_max, media_only = key
+        feed = self._feed(viewer_id)
+        seen = self._seen.get(viewer_id)
+        rnd = feed.round
+        for _ in range(2):
+            premium, regular = self._index.candidates(
+                viewer_id, excluded, interests_mask, search_gender=search_gender,
+                age_min=age_min, age_max=age_max, media_only=media_only
+            )
+            ordered: List[int] = []
+            rng = random.Random(f"{viewer_id}:{rnd}")
+            for tier in (premium, regular):
+                rows = sorted((r for r in tier if r["id"] not in seen), key=lambda r: r["id"])
+                rng.shuffle(rows)
+                ordered += [r["user_id"] for r in rows]
+            if ordered or not seen or not (premium or regular):
+                break
+            # Всё подходящее уже показано — новый круг
+            self._seen.reset(viewer_id)
+            seen = set()
+            rnd += 1
+        with self._lock:
+            feed.key = key
+            feed.queue = deque(ordered)
+            feed.built_at = time.monotonic()
+            feed.round = rnd
+
+    def needs_refill(self, viewer_id: int, key: Tuple, n: int = 0) -> bool:
+        feed = self._feed(viewer_id)
+        return (feed.key != key
+                or len(feed.queue) < max(n, 1)
+                or time.monotonic() - feed.built_at > FEED_MAX_AGE)
+
+    def take(self, viewer_id: int, n: int, excluded: Set[int], key: Tuple,
+             skip: Set[int] = frozenset()) -> List[Dict]:
+        """Снять до n анкет с начала ленты, пропуская ставших неактуальными.
+        skip — id анкет, уже отданных в этом же показе (на стыке кругов)."""
+        feed = self._feed(viewer_id)
+        seen = self._seen.get(viewer_id)
+        out: List[Dict] = []
+        deferred: List[int] = []
+        with self._lock:
+            if feed.key != key:
+                return out
+            while feed.queue and len(out) < n:
+                uid = feed.queue.popleft()
+                row = self._index.get(uid)
+                if row is None or uid in excluded or row["id"] in seen:
+                    continue
+                if row["id"] in skip:
+                    deferred.append(uid)
+                    continue
+                out.append(dict(row))
+            feed.queue.extend(deferred)
+        self._seen.mark(viewer_id, [r["id"] for r in out])
+        return out
+
+    def queued(self, viewer_id: int) -> int:
+        with self._lock:
+            feed = self._feeds.get(viewer_id)
+            return len(feed.queue) if feed else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"feeds": len(self._feeds), "seen_viewers": len(self._seen)}
+
+seen  = SeenStore()
+feeds = FeedStore(matching.index, seen)
+
+_background: Set[asyncio.Task] = set()
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def _refill_later(viewer_id: int, excluded: Set[int], key: Tuple):
+    try:
+        await adb.run(feeds.refill, viewer_id, excluded, key)
+    except Exception:
+        log.exception("Фоновое заполнение ленты %s", viewer_id)
+
+async def next_profiles(viewer_id: int, n: int, interests_mask: int,
+                        search_gender: str = "any", age_min: int = 0, age_max: int = 99,
+                        media_only: bool = False) -> List[Dict]:
+    """Следующие n анкет ленты: записи с полями анкеты (id, description, has_media)
+    и пользователя (user_id, name, age, gender, interests_mask, premium)."""
+    key = (interests_mask or 0, search_gender, age_min, age_max, bool(media_only))
+    if matching.index.needs_refresh():
+        await adb.run(matching.index.refresh)
+    excluded = await adb.run(matching.index.excluded, viewer_id)
+
+    if feeds.needs_refill(viewer_id, key, n):
+        await adb.run(feeds.refill, viewer_id, excluded, key)
+    profiles = feeds.take(viewer_id, n, excluded, key)
+    if len(profiles) < n:
+        # В ленте были неактуальные записи — дозаполнить и добрать
+        await adb.run(feeds.refill, viewer_id, excluded, key)
+        profiles += feeds.take(viewer_id, n - len(profiles), excluded, key,
+                               skip={p["id"] for p in profiles})
+
+    if feeds.queued(viewer_id) < max(FEED_PREFETCH, n):
+        _spawn(_refill_later(viewer_id, excluded, key))
+    return profiles
@@ -0,0 +1,243 @@
+"""
+Активные мини-игры в памяти процесса.
+
+Ход раньше стоил четыре запроса (прочитать игру, записать ход, перечитать,
+ещё раз прочитать в _resolve_round), а одновременные ходы обоих игроков
+могли раскрыть раунд дважды. Теперь:
+
+  - активные игры лежат в памяти: warm_up() при старте бота поднимает их
+    из БД, завершённые и отменённые выгружаются;
+  - изменения одной игры идут под её asyncio.Lock;
+  - каждое изменение — один UPDATE ... WHERE status = ANY(...) AND
+    current_round = ... RETURNING * (compare-and-set). Не совпало —
+    переход отклоняется, игра перечитывается из БД;
+  - ход, закрывающий раунд, сразу пишет итог раунда, без записи самого хода.
+
+Игры всех видов живут в одной таблице games: kind выбирает правила
+(game_rules.py), счёт, ходы и ставки — в JSON-колонке state. Игрок 0 —
+инициатор, 1 — соперник; state["wins"], ["moves"], ["stakes"] — пары.
+
+Состояния:
+  waiting_stake_initiator → waiting_stake_opponent → waiting_move_both
+  waiting_move_both → waiting_move_initiator / waiting_move_opponent → (раунд)
+  → waiting_move_both следующего раунда или finished; cancelled — из любого активного.
+"""
+
+import asyncio
+import copy
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import async_db as db
+import game_rules
+from game_rules import Rules
+
+STAKE_STATUSES = ("waiting_stake_initiator", "waiting_stake_opponent")
+MOVE_STATUSES  = ("waiting_move_both", "waiting_move_initiator", "waiting_move_opponent")
+ACTIVE_STATUSES = STAKE_STATUSES + MOVE_STATUSES
+
+# Кто ещё должен походить после хода игрока 0 / 1
+_WAITING_FOR = ("waiting_move_opponent", "waiting_move_initiator")
+
+def rules_of(game: Dict) -> Rules:
+    return game_rules.RULES[game["kind"]]
+
+def player_index(game: Dict, user_id: int) -> Optional[int]:
+    if user_id == game["initiator_id"]:
+        return 0
+    if user_id == game["opponent_id"]:
+        return 1
+    return None
+
+def player_ids(game: Dict) -> Tuple[int, int]:
+    return game["initiator_id"], game["opponent_id"]
+
+@dataclass
+class MoveResult:
+    # invalid | not_player | already | accepted | round | finished | cancelled
+    outcome:  str
+    game:     Optional[Dict] = None
+    round_no: int = 0
+    moves:    Tuple[str, str] = ("", "")   # (инициатор, соперник)
+    winner:   Optional[int] = None         # 0 | 1 | None — ничья
+    timeout:  bool = False                 # раунд закрыт по таймауту
+
+class GameEngine:
+    def __init__(self):
+        self._games: Dict[int, Dict] = {}
+        self._by_chat: Dict[int, int] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    async def warm_up(self):
+        for game in await db.get_active_games():
+            self._keep(game)
+
+    def _keep(self, game: Dict):
+        gid = game["id"]
+        if game["status"] in ACTIVE_STATUSES:
+            self._games[gid] = game
+            self._by_chat[game["chat_id"]] = gid
+            return
+        self._games.pop(gid, None)
+        if self._by_chat.get(game["chat_id"]) == gid:
+            del self._by_chat[game["chat_id"]]
+
+    @asynccontextmanager
+    async def _locked(self, game_id: int):
+        lock = self._locks.get(game_id)
+        if lock is None:
+            lock = self._locks[game_id] = asyncio.Lock()
+        try:
+            async with lock:
+                yield
+        finally:
+            # Игра завершилась и никто не ждёт — лок больше не нужен
+            if game_id not in self._games and not lock.locked() and self._locks.get(game_id) is lock:
+                del self._locks[game_id]
+
+    async def _load(self, game_id: int) -> Optional[Dict]:
+        game = self._games.get(game_id)
+        if game is None:
+            game = await db.get_game(game_id)
+            if game:
+                self._keep(game)
+        return game
+
+    @staticmethod
+    def _copy(game: Optional[Dict]) -> Optional[Dict]:
+        return dict(game, state=copy.deepcopy(game["state"])) if game else None
+
+    # ── Чтение ────────────────────────────────────────────────────────────────
+
+    async def get(self, game_id: int) -> Optional[Dict]:
+        """Игра из памяти (завершённая — из БД). Возвращается копия."""
+        return self._copy(await self._load(game_id))
+
+    def active_by_chat(self, chat_id: int) -> Optional[Dict]:
+        gid = self._by_chat.get(chat_id)
+        return self._copy(self._games[gid]) if gid is not None else None
+
+    # ── Переходы ──────────────────────────────────────────────────────────────
+
+    async def create(self, kind: str, chat_id: int, initiator_id: int, opponent_id: int) -> Dict:
+        state = game_rules.RULES[kind].initial_state()
+        game = await db.create_game(kind, chat_id, initiator_id, opponent_id,
+                                    STAKE_STATUSES[0], state)
+        self._keep(game)
+        return self._copy(game)
+
+    async def transition(self, game_id: int, statuses: Iterable[str],
+                         round_no: Optional[int] = None, *, status: str,
+                         **state) -> Optional[Dict]:
+        """Перевести игру в status, если она в одном из statuses (и на раунде
+        round_no); state — ключи games.state на замену. None — игра уже в другом
+        состоянии."""
+        async with self._locked(game_id):
+            return await self._cas(game_id, tuple(statuses), round_no, status, **state)
+
+    async def set_stake(self, game_id: int, player: int, stake: Dict) -> Optional[Dict]:
+        """Ставка игрока player: инициатора — до вызова, соперника — старт игры."""
+        async with self._locked(game_id):
+            game = await self._load(game_id)
+            if not game:
+                return None
+            stakes = list(game["state"]["stakes"])
+            stakes[player] = stake
+            return await self._cas(game_id, (STAKE_STATUSES[player],), None,
+                                   STAKE_STATUSES[1] if player == 0 else MOVE_STATUSES[0],
+                                   stakes=stakes)
+
+    async def _cas(self, game_id: int, statuses: Tuple[str, ...], round_no: Optional[int],
+                   status: str, next_round: Optional[int] = None, **changes) -> Optional[Dict]:
+        game = await self._load(game_id)
+        if not game or game["status"] not in statuses:
+            return None
+        if round_no is not None and game["current_round"] != round_no:
+            return None
+        state = dict(game["state"], **changes)
+        new = await db.update_game_if(game_id, statuses, game["current_round"], status,
+                                      next_round or game["current_round"], state)
+        if new is None:
+            # В БД состояние другое — память устарела
+            fresh = await db.get_game(game_id)
+            if fresh:
+                self._keep(fresh)
+            return None
+        self._keep(new)
+        return self._copy(new)
+
+    async def _close_round(self, game: Dict, wins: list, moves: Tuple[str, str],
+                           winner: Optional[int], timeout: bool = False) -> MoveResult:
+        """Записать итог раунда: следующий раунд или конец игры."""
+        round_no = game["current_round"]
+        expect = (game["id"], (game["status"],), round_no)
+        if max(wins) >= game["state"]["wins_needed"]:
+            outcome = "finished"
+            new = await self._cas(*expect, "finished", wins=wins)
+        else:
+            outcome = "round"
+            new = await self._cas(*expect, MOVE_STATUSES[0], next_round=round_no + 1,
+                                  wins=wins, moves=[None, None])
+        if new is None:
+            return MoveResult("invalid")
+        return MoveResult(outcome, new, round_no, moves, winner, timeout)
+
+    async def move(self, game_id: int, user_id: int, move: str) -> MoveResult:
+        async with self._locked(game_id):
+            game = await self._load(game_id)
+            if not game or game["status"] not in MOVE_STATUSES:
+                return MoveResult("invalid")
+            rules = rules_of(game)
+            if move not in rules.moves:
+                return MoveResult("invalid")
+            me = player_index(game, user_id)
+            if me is None:
+                return MoveResult("not_player")
+            moves = list(game["state"]["moves"])
+            if moves[me]:
+                return MoveResult("already", self._copy(game))
+
+            moves[me] = move
+            if not moves[1 - me]:
+                new = await self._cas(game_id, MOVE_STATUSES, None, _WAITING_FOR[me], moves=moves)
+                return MoveResult("accepted", new) if new else MoveResult("invalid")
+
+            # Второй ход раунда — сразу итог
+            winner = rules.round_winner(*moves)
+            wins = list(game["state"]["wins"])
+            if winner is not None:
+                wins[winner] += 1
+            return await self._close_round(game, wins, tuple(moves), winner)
+
+    async def timeout_move(self, game_id: int, status: str, round_no: int) -> MoveResult:
+        """Срок хода вышел, а игра всё ещё в status на раунде round_no.
+        Никто не походил — cancelled; один — поражение по правилам игры
+        (timeout_forfeits: вся игра или только раунд)."""
+        async with self._locked(game_id):
+            game = await self._load(game_id)
+            if (not game or game["status"] != status or status not in MOVE_STATUSES
+                    or game["current_round"] != round_no):
+                return MoveResult("invalid")
+            moves = tuple(game["state"]["moves"])
+            missing = [i for i in (0, 1) if not moves[i]]
+            if not missing:
+                return MoveResult("invalid")
+            if len(missing) == 2:
+                new = await self._cas(game_id, (status,), round_no, "cancelled")
+                return MoveResult("cancelled", new, round_no) if new else MoveResult("invalid")
+
+            winner = 1 - missing[0]
+            wins = list(game["state"]["wins"])
+            if rules_of(game).timeout_forfeits == "game":
+                wins[winner] = game["state"]["wins_needed"]
+            else:
+                wins[winner] += 1
+            return await self._close_round(game, wins, moves, winner, timeout=True)
+
+    def stats(self) -> Dict:
+        return {"active": len(self._games), "locks": len(self._locks)}
+
+engine = GameEngine()
+
+warm_up = engine.warm_up
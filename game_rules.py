@@ -0,0 +1,65 @@
+"""
+Правила мини-игр в чате.
+
+Все игры идут по одной схеме (handlers/games.py + game_engine.py):
+ставки медиа → раунды ходов → победитель получает ставку проигравшего.
+Чем игры отличаются, описывает Rules: какие есть ходы, кто выиграл раунд,
+до скольких побед и чем грозит пропущенный ход. Новая игра — подкласс
+Rules и одна строка register(...):
+
+    register(Dice("dice", "Кости"))
+
+callback_data игры начинаются с её kind ("dice:move:…"), счёт, ходы
+и ставки лежат в games.state — новых таблиц и хендлеров не нужно.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+class Rules(ABC):
+    kind:  str = ""
+    title: str = ""
+    moves: Dict[str, str] = {}          # ход → эмодзи на кнопке
+    wins_needed: int = 3
+    # Не походил вовремя: "game" — проиграл игру, "round" — только раунд
+    timeout_forfeits: str = "game"
+
+    @abstractmethod
+    def round_winner(self, m1: str, m2: str) -> Optional[int]:
+        """Победитель раунда: 0 — инициатор, 1 — соперник, None — ничья."""
+
+    def initial_state(self) -> Dict:
+        return {
+            "wins_needed": self.wins_needed,
+            "wins":   [0, 0],
+            "moves":  [None, None],
+            "stakes": [None, None],   # {"type": photo|video|voice, "file_id": ...}
+        }
+
+class RockPaperScissors(Rules):
+    moves = {"rock": "✊", "scissors": "✌️", "paper": "🖐"}
+    _beats = {"rock": "scissors", "scissors": "paper", "paper": "rock"}
+
+    def __init__(self, kind: str, title: str, timeout_forfeits: str = "game"):
+        self.kind = kind
+        self.title = title
+        self.timeout_forfeits = timeout_forfeits
+
+    def round_winner(self, m1: str, m2: str) -> Optional[int]:
+        if m1 == m2:
+            return None
+        return 0 if self._beats[m1] == m2 else 1
+
+RULES: Dict[str, Rules] = {}
+
+def register(rules: Rules) -> Rules:
+    RULES[rules.kind] = rules
+    return rules
+
+def get(kind: str) -> Optional[Rules]:
+    return RULES.get(kind)
+
+# КМН из меню чата: пропустил ход — проиграл игру
+register(RockPaperScissors("kmn", "КМН"))
+# Вариант бывшего handlers/rps.py: за пропущенный ход — только раунд
+register(RockPaperScissors("rps", "КМН", timeout_forfeits="round"))
@@ -0,0 +1,34 @@
+"""
+Настройки gunicorn для веб-панели (web:app).
+
+    gunicorn -c gunicorn_conf.py web:app
+
+main.py запускает именно так. Воркеры gthread: процессы × потоки, так что
+медленный запрос (прокси медиа, большой чат) не держит остальные.
+Приложение грузится в каждом воркере (без preload): пул БД и слушатель
+изменений у каждого процесса свои.
+"""
+
+import os
+
+from config import (
+    WEB_WORKERS, WEB_THREADS, WEB_KEEPALIVE, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT,
+)
+
+bind             = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class     = "gthread"
+workers          = WEB_WORKERS
+threads          = WEB_THREADS
+keepalive        = WEB_KEEPALIVE
+timeout          = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+# Воркер перезапускается после стольких запросов — страховка от утечек
+max_requests        = 2000
+max_requests_jitter = 200
+accesslog = "-"
+errorlog  = "-"
+
+def post_worker_init(worker):
+    # Кеши users/chats в воркере сбрасываются по событиям бота
+    import database
+    database.start_listener()
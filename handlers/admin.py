@@ -1,13 +1,16 @@
 import time
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-import database as db
-from config import ADMIN_IDS, BAN_DURATIONS, INTERESTS_DISPLAY
-from keyboards import admin_ban_kb
+import async_db as db
+import broadcast
+import interests
+from config import ADMIN_IDS, BAN_DURATIONS
+from keyboards import admin_ban_kb, broadcast_kb
 
 router = Router()
 
@@ -30,18 +33,15 @@ def _admin_menu_kb(reports_count: int) -> InlineKeyboardMarkup:
     ])
 
 async def _show_admin_menu(target, edit: bool = False):
-    users    = db.get_all_users()
-    chats    = db.get_all_chats_admin()
-    profiles = db.get_active_profiles_admin()
-    reports  = db.get_reports("new")
+    counts = await db.get_admin_counts()
     text = (
         f"🔐 <b>Beem Admin</b>\n\n"
-        f"👥 Пользователей: <b>{len(users)}</b>\n"
-        f"📋 Активных анкет: <b>{len(profiles)}</b>\n"
-        f"💬 Чатов: <b>{len(chats)}</b>\n"
-        f"⚠️ Новых жалоб: <b>{len(reports)}</b>"
+        f"👥 Пользователей: <b>{counts['users']}</b>\n"
+        f"📋 Активных анкет: <b>{counts['profiles']}</b>\n"
+        f"💬 Чатов: <b>{counts['chats']}</b>\n"
+        f"⚠️ Новых жалоб: <b>{counts['reports']}</b>"
     )
-    kb = _admin_menu_kb(len(reports))
+    kb = _admin_menu_kb(counts['reports'])
     if edit:
         await target.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
     else:
@@ -62,24 +62,40 @@ async def adm_back_menu(callback: CallbackQuery):
     await _show_admin_menu(callback, edit=True)
     await callback.answer()
 
+def _page_nav(section: str, after: str, cursor: str) -> list:
+    """Ряд «в начало / дальше» под страницей списка adm:<section>[:курсор]."""
+    nav = []
+    if after:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data=f"adm:{section}"))
+    if cursor:
+        nav.append(InlineKeyboardButton(text="Дальше ▶️", callback_data=f"adm:{section}:{cursor}"))
+    return [nav] if nav else []
+
+def _page_after(data: str) -> str:
+    parts = data.split(":")
+    return parts[2] if len(parts) > 2 else None
+
 # ── Пользователи ──────────────────────────────────────────────────────────────
 
-@router.callback_query(F.data == "adm:users")
+@router.callback_query(F.data.startswith("adm:users"))
 async def adm_users(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
-    users = db.get_all_users()
+    after = _page_after(callback.data)
+    users, cursor = await db.page_users(after, 20)
+    total = (await db.get_admin_counts())["users"]
     rows  = []
-    for u in users[:20]:
-        ban_icon  = "🔒 " if u.get("banned") else ""
-        prem_icon = "👑 " if db.is_premium(u["user_id"]) else ""
+    for u in users:
+        ban_icon  = "🔒 " if db.ban_active(u) else ""
+        prem_icon = "👑 " if db.premium_active(u) else ""
         rows.append([InlineKeyboardButton(
             text=f"{ban_icon}{prem_icon}{u['name']}, {u['age']}л | @{u.get('username') or '—'}",
             callback_data=f"adm:user:{u['user_id']}"
         )])
+    rows += _page_nav("users", after, cursor)
     rows.append([InlineKeyboardButton(text="◀️ Назад", callback_data="adm:menu")])
     await callback.message.edit_text(
-        f"👥 <b>Пользователи ({len(users)})</b>",
+        f"👥 <b>Пользователи ({total})</b>",
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
     )
@@ -90,13 +106,13 @@ async def adm_user_detail(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
     user_id = int(callback.data.split(":")[2])
-    u = db.get_user(user_id)
+    u = await db.get_user(user_id)
     if not u:
         await callback.answer("Не найден", show_alert=True)
         return
-    interests  = ", ".join(INTERESTS_DISPLAY.get(i, i) for i in (u.get("interests") or "").split(",") if i)
-    ban_status = "🔒 Заблокирован" if u.get("banned") else "✅ Активен"
-    prem_status = "👑 Premium" if db.is_premium(user_id) else "Нет"
+    interests_txt = interests.display(u.get("interests_mask"))
+    ban_status = "🔒 Заблокирован" if db.ban_active(u) else "✅ Активен"
+    prem_status = "👑 Premium" if db.premium_active(u) else "Нет"
     ban_until  = ""
     if u.get("ban_until"):
         t = time.strftime("%d.%m.%Y %H:%M", time.localtime(u["ban_until"]))
@@ -112,7 +128,7 @@ async def adm_user_detail(callback: CallbackQuery):
         f"@{u.get('username') or '—'}\n"
         f"Возраст: {u.get('age')}\n"
         f"Пол: {GENDER_MAP.get(u.get('gender'), '—')}\n"
-        f"Интересы: {interests}\n"
+        f"Интересы: {interests_txt}\n"
         f"Статус: {ban_status}{ban_until}\n"
         f"Premium: {prem_status}{prem_until}\n"
         f"Причина бана: {u.get('ban_reason') or '—'}"
@@ -129,8 +145,8 @@ async def adm_ban(callback: CallbackQuery, bot: Bot):
     _, user_id, duration = callback.data.split(":")
     user_id = int(user_id)
     label   = BAN_DURATIONS[duration][0]
-    db.ban_user(user_id, duration, reason="Нарушение правил")
-    db.delete_active_profile(user_id)
+    await db.ban_user(user_id, duration, reason="Нарушение правил")
+    await db.delete_active_profile(user_id)
     try:
         await bot.send_message(user_id, f"🚫 Ты заблокирован на {label}.")
     except:
@@ -143,7 +159,7 @@ async def adm_unban(callback: CallbackQuery, bot: Bot):
     if not adm(callback.from_user.id):
         return
     user_id = int(callback.data.split(":")[1])
-    db.unban_user(user_id)
+    await db.unban_user(user_id)
     try:
         await bot.send_message(user_id, "✅ Ты разблокирован!")
     except:
@@ -153,21 +169,24 @@ async def adm_unban(callback: CallbackQuery, bot: Bot):
 
 # ── Анкеты ────────────────────────────────────────────────────────────────────
 
-@router.callback_query(F.data == "adm:profiles")
+@router.callback_query(F.data.startswith("adm:profiles"))
 async def adm_profiles(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
-    profiles = db.get_active_profiles_admin()
+    after = _page_after(callback.data)
+    profiles, cursor = await db.page_profiles_admin(after, 15)
+    total = (await db.get_admin_counts())["profiles"]
     rows     = []
-    for p in profiles[:15]:
+    for p in profiles:
         prem = "👑 " if p.get("premium") else ""
         rows.append([InlineKeyboardButton(
             text=f"{prem}{p['name']}, {p['age']}л — {(p['description'] or '')[:25]}...",
             callback_data=f"adm:user:{p['user_id']}"
         )])
+    rows += _page_nav("profiles", after, cursor)
     rows.append([InlineKeyboardButton(text="◀️ Назад", callback_data="adm:menu")])
     await callback.message.edit_text(
-        f"📋 <b>Активные анкеты ({len(profiles)})</b>",
+        f"📋 <b>Активные анкеты ({total})</b>",
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
     )
@@ -175,13 +194,15 @@ async def adm_profiles(callback: CallbackQuery):
 
 # ── Чаты ─────────────────────────────────────────────────────────────────────
 
-@router.callback_query(F.data == "adm:chats")
+@router.callback_query(F.data.startswith("adm:chats"))
 async def adm_chats(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
-    chats = db.get_all_chats_admin()
+    after = _page_after(callback.data)
+    chats, cursor = await db.page_chats_admin(after, 20)
+    total = (await db.get_admin_counts())["chats"]
     rows  = []
-    for c in chats[:20]:
+    for c in chats:
         sn     = c.get("sender_name") or f"ID:{c['sender_id']}"
         tn     = c.get("target_name") or f"ID:{c['target_id']}"
         closed = " 🔒" if c.get("closed") else ""
@@ -189,9 +210,10 @@ async def adm_chats(callback: CallbackQuery):
             text=f"#{c['id']} {sn} → {tn} ({c.get('msg_count', 0)} сооб.){closed}",
             callback_data=f"adm:chat:{c['id']}"
         )])
+    rows += _page_nav("chats", after, cursor)
     rows.append([InlineKeyboardButton(text="◀️ Назад", callback_data="adm:menu")])
     await callback.message.edit_text(
-        f"💬 <b>Чаты ({len(chats)})</b>",
+        f"💬 <b>Чаты ({total})</b>",
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
     )
@@ -202,14 +224,14 @@ async def adm_chat_detail(callback: CallbackQuery, bot: Bot):
     if not adm(callback.from_user.id):
         return
     chat_id = int(callback.data.split(":")[2])
-    chat    = db.get_chat(chat_id)
+    chat    = await db.get_chat(chat_id)
     if not chat:
         await callback.answer("Не найден", show_alert=True)
         return
 
-    messages = db.get_chat_messages(chat_id, limit=50)
-    sender   = db.get_user(chat["sender_id"])
-    target   = db.get_user(chat["target_id"])
+    messages = await db.get_chat_messages(chat_id, limit=50)
+    sender   = await db.get_user(chat["sender_id"])
+    target   = await db.get_user(chat["target_id"])
     sn = sender["name"] if sender else f"ID:{chat['sender_id']}"
     tn = target["name"] if target else f"ID:{chat['target_id']}"
 
@@ -260,11 +282,12 @@ async def adm_chat_detail(callback: CallbackQuery, bot: Bot):
 
 # ── Жалобы ────────────────────────────────────────────────────────────────────
 
-@router.callback_query(F.data == "adm:reports")
+@router.callback_query(F.data.startswith("adm:reports"))
 async def adm_reports(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
-    reports = db.get_reports("new")
+    after = _page_after(callback.data)
+    reports, cursor = await db.page_reports(after, 15, status="new")
     if not reports:
         await callback.message.edit_text(
             "✅ Новых жалоб нет!",
@@ -275,15 +298,17 @@ async def adm_reports(callback: CallbackQuery):
         await callback.answer()
         return
     rows = []
-    for r in reports[:15]:
+    for r in reports:
         name = r.get("reported_name") or f"ID:{r['reported_id']}"
         rows.append([InlineKeyboardButton(
             text=f"⚠️ На {name} | {r.get('reason', '—')}",
             callback_data=f"adm:report:{r['id']}"
         )])
+    rows += _page_nav("reports", after, cursor)
     rows.append([InlineKeyboardButton(text="◀️ Назад", callback_data="adm:menu")])
+    total = (await db.get_admin_counts())["reports"]
     await callback.message.edit_text(
-        f"⚠️ <b>Жалобы ({len(reports)})</b>",
+        f"⚠️ <b>Жалобы ({total})</b>",
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
     )
@@ -294,8 +319,7 @@ async def adm_report_detail(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
     report_id = int(callback.data.split(":")[2])
-    reports   = db.get_reports()
-    r = next((x for x in reports if x["id"] == report_id), None)
+    r = await db.get_report(report_id)
     if not r:
         await callback.answer("Не найдено", show_alert=True)
         return
@@ -320,7 +344,7 @@ async def adm_resolve_report(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
     report_id = int(callback.data.split(":")[2])
-    db.resolve_report(report_id)
+    await db.resolve_report(report_id)
     await callback.answer("✅ Жалоба закрыта", show_alert=True)
     await callback.message.edit_text("✅ Жалоба закрыта.")
 
@@ -330,16 +354,7 @@ async def adm_resolve_report(callback: CallbackQuery):
 async def adm_payments(callback: CallbackQuery):
     if not adm(callback.from_user.id):
         return
-    conn = db.get_conn()
-    c    = conn.cursor()
-    c.execute("""
-        SELECT p.*, u.name, u.username
-        FROM payments p LEFT JOIN users u ON p.user_id = u.user_id
-        ORDER BY p.created_at DESC LIMIT 30
-    """)
-    cols = [d[0] for d in c.description]
-    rows_data = [dict(zip(cols, r)) for r in c.fetchall()]
-    conn.close()
+    rows_data = await db.get_recent_payments(30)
 
     if not rows_data:
         await callback.message.edit_text(
@@ -372,25 +387,52 @@ async def adm_payments(callback: CallbackQuery):
 async def adm_broadcast_start(callback: CallbackQuery, state: FSMContext):
     if not adm(callback.from_user.id):
         return
-    await callback.message.answer("📢 Напиши текст рассылки:")
+    active = [b for b in await db.get_broadcasts(10) if b["status"] in ("running", "paused")]
+    text = "📢 Напиши текст рассылки:"
+    kb = None
+    if active:
+        text = "Активные рассылки:\n" + "\n".join(
+            f"#{b['id']} — {broadcast.STATUS_NAMES[b['status']]}" for b in active
+        ) + "\n\n" + text
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"📊 Рассылка #{b['id']}", callback_data=f"bc:refresh:{b['id']}")]
+            for b in active
+        ])
+    await callback.message.answer(text, reply_markup=kb)
     await state.set_state(AdminFSM.broadcast)
     await callback.answer()
 
 @router.message(AdminFSM.broadcast)
-async def adm_do_broadcast(message: Message, state: FSMContext, bot: Bot):
+async def adm_do_broadcast(message: Message, state: FSMContext):
     if not adm(message.from_user.id):
         return
     await state.clear()
-    users  = db.get_all_users()
-    sent   = failed = 0
-    for u in users:
-        try:
-            await bot.send_message(
-                u["user_id"],
-                f"📢 <b>Объявление от Beem:</b>\n\n{message.text}",
-                parse_mode="HTML"
-            )
-            sent += 1
-        except:
-            failed += 1
-    await message.answer(f"📢 Рассылка завершена:\n✅ Доставлено: {sent}\n❌ Ошибок: {failed}")
+    # Отправляет фоновый исполнитель (broadcast.py), здесь — только задание
+    progress = await message.answer("📢 Запускаю рассылку…")
+    job = await db.create_broadcast(message.from_user.id, message.text,
+                                    progress.chat.id, progress.message_id)
+    await progress.edit_text(broadcast.progress_text(job), parse_mode="HTML",
+                             reply_markup=broadcast_kb(job["id"], job["status"]))
+
+_BROADCAST_ACTIONS = {"pause": "paused", "resume": "running", "cancel": "cancelled"}
+
+@router.callback_query(F.data.startswith("bc:"))
+async def adm_broadcast_control(callback: CallbackQuery):
+    if not adm(callback.from_user.id):
+        return
+    _, action, bid = callback.data.split(":")
+    bid = int(bid)
+    note = None
+    if action in _BROADCAST_ACTIONS:
+        if not await db.set_broadcast_status(bid, _BROADCAST_ACTIONS[action]):
+            note = "Рассылка уже не в этом состоянии"
+    job = await db.get_broadcast(bid)
+    if not job:
+        await callback.answer("Рассылка не найдена", show_alert=True)
+        return
+    try:
+        await callback.message.edit_text(broadcast.progress_text(job), parse_mode="HTML",
+                                         reply_markup=broadcast_kb(job["id"], job["status"]))
+    except TelegramBadRequest:
+        pass   # прогресс не изменился
+    await callback.answer(note)
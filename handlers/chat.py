@@ -4,7 +4,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramForbiddenError
 
-import database as db
+import async_db as db
+import chat_relay
+from context import UserContext
 from keyboards import chat_menu_kb, main_kb, my_chats_kb, report_reason_kb
 
 router = Router()
@@ -15,7 +17,7 @@ class ChatFSM(StatesGroup):
 # ── Открыть чат по анкете ─────────────────────────────────────────────────────
 
 @router.callback_query(F.data.startswith("openchat:"))
-async def open_chat(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def open_chat(callback: CallbackQuery, state: FSMContext, bot: Bot, ctx: UserContext):
     _, profile_id, target_id = callback.data.split(":")
     profile_id, target_id = int(profile_id), int(target_id)
     sender_id = callback.from_user.id
@@ -23,16 +25,16 @@ async def open_chat(callback: CallbackQuery, state: FSMContext, bot: Bot):
     if sender_id == target_id:
         await callback.answer("Это твоя анкета!", show_alert=True)
         return
-    if db.is_blocked(target_id, sender_id):
+    if await db.is_blocked(target_id, sender_id):
         await callback.answer("Ты заблокирован этим пользователем.", show_alert=True)
         return
 
-    profile = db.get_active_profile(target_id)
+    profile = await db.get_active_profile(target_id)
     if not profile or profile["id"] != profile_id:
         await callback.answer("Анкета уже неактивна.", show_alert=True)
         return
 
-    chat_id = db.create_chat(profile_id, sender_id, target_id)
+    chat_id = await db.create_chat(profile_id, sender_id, target_id)
     await state.update_data(active_chat=chat_id, chat_partner=target_id)
     await state.set_state(ChatFSM.active)
 
@@ -47,9 +49,8 @@ async def open_chat(callback: CallbackQuery, state: FSMContext, bot: Bot):
     await callback.answer()
 
     # Уведомление получателю — показываем данные ОТПРАВИТЕЛЯ
-    sender_user   = db.get_user(sender_id)
-    sender_prem   = db.is_premium(sender_id)
-    badge         = "👑 " if sender_prem else ""
+    sender_user   = ctx.user
+    badge         = "👑 " if ctx.premium else ""
     sender_name   = sender_user["name"] if sender_user else "Кто-то"
     sender_age    = f", {sender_user['age']} лет" if sender_user else ""
     gender_map    = {"male": "👦 Парень", "female": "👧 Девушка", "other": "⚧"}
@@ -71,7 +72,7 @@ async def open_chat(callback: CallbackQuery, state: FSMContext, bot: Bot):
 @router.callback_query(F.data.startswith("openchatid:"))
 async def open_chat_by_id(callback: CallbackQuery, state: FSMContext):
     chat_id = int(callback.data.split(":")[1])
-    chat    = db.get_chat(chat_id)
+    chat    = await db.get_chat(chat_id)
     if not chat or callback.from_user.id not in (chat["sender_id"], chat["target_id"]):
         await callback.answer("Нет доступа", show_alert=True)
         return
@@ -84,10 +85,10 @@ async def open_chat_by_id(callback: CallbackQuery, state: FSMContext):
     await state.set_state(ChatFSM.active)
 
     # Отмечаем сообщения прочитанными
-    db.mark_messages_read(chat_id, callback.from_user.id)
+    await db.mark_messages_read(chat_id, callback.from_user.id)
 
     # Показываем историю (последние 10)
-    messages = db.get_chat_messages(chat_id, limit=20)
+    messages = await db.get_chat_messages(chat_id, limit=20)
     if messages:
         await callback.message.answer(f"💬 <b>Чат #{chat_id} — последние сообщения:</b>", parse_mode="HTML")
         for m in messages[-10:]:
@@ -106,15 +107,15 @@ async def open_chat_by_id(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("closechat:"))
 async def close_chat_forever(callback: CallbackQuery, state: FSMContext):
     chat_id = int(callback.data.split(":")[1])
-    chat    = db.get_chat(chat_id)
+    chat    = await db.get_chat(chat_id)
     if not chat or callback.from_user.id not in (chat["sender_id"], chat["target_id"]):
         await callback.answer("Нет доступа", show_alert=True)
         return
 
     # Закрываем чат и блокируем собеседника
-    db.close_chat(chat_id)
+    await db.close_chat(chat_id)
     partner = chat["sender_id"] if callback.from_user.id == chat["target_id"] else chat["target_id"]
-    db.block_user(callback.from_user.id, partner)
+    await db.block_user(callback.from_user.id, partner)
 
     # Если был в активном чате — выходим
     data = await state.get_data()
@@ -124,7 +125,7 @@ async def close_chat_forever(callback: CallbackQuery, state: FSMContext):
     await callback.answer("Чат закрыт навсегда.", show_alert=True)
 
     # Обновляем список чатов
-    chats = db.get_user_chats(callback.from_user.id)
+    chats = await db.get_user_chats(callback.from_user.id)
     if chats:
         try:
             await callback.message.edit_reply_markup(
@@ -142,7 +143,7 @@ async def close_chat_forever(callback: CallbackQuery, state: FSMContext):
 
 @router.message(F.text == "💬 Мои чаты")
 async def my_chats(message: Message):
-    chats = db.get_user_chats(message.from_user.id)
+    chats = await db.get_user_chats(message.from_user.id)
     if not chats:
         await message.answer("У тебя пока нет активных чатов.")
         return
@@ -155,19 +156,18 @@ async def my_chats(message: Message):
 # ── Заблокировать и закрыть ───────────────────────────────────────────────────
 
 @router.message(ChatFSM.active, F.text == "🚫 Заблокировать и закрыть")
-async def block_and_close(message: Message, state: FSMContext):
+async def block_and_close(message: Message, state: FSMContext, ctx: UserContext):
     data       = await state.get_data()
     chat_id    = data.get("active_chat")
     partner_id = data.get("chat_partner")
     if chat_id:
-        db.close_chat(chat_id)
+        await db.close_chat(chat_id)
     if partner_id:
-        db.block_user(message.from_user.id, partner_id)
+        await db.block_user(message.from_user.id, partner_id)
     await state.clear()
-    profile = db.get_active_profile(message.from_user.id)
     await message.answer(
         "🚫 Пользователь заблокирован, чат закрыт навсегда.",
-        reply_markup=main_kb(bool(profile))
+        reply_markup=main_kb(bool(ctx.profile))
     )
 
 # ── Жалоба ────────────────────────────────────────────────────────────────────
@@ -214,15 +214,14 @@ async def kmn_cancel_start(callback: CallbackQuery):
 # ── Выйти из чата (тоже выше relay) ──────────────────────────────────────────
 
 @router.message(ChatFSM.active, F.text == "🔚 Выйти из чата")
-async def exit_chat_active(message: Message, state: FSMContext):
+async def exit_chat_active(message: Message, state: FSMContext, ctx: UserContext):
     await state.clear()
-    profile = db.get_active_profile(message.from_user.id)
-    await message.answer("👋 Вышел из чата.", reply_markup=main_kb(bool(profile)))
+    await message.answer("👋 Вышел из чата.", reply_markup=main_kb(bool(ctx.profile)))
 
 # ── Пересылка сообщений ───────────────────────────────────────────────────────
 
 @router.message(ChatFSM.active)
-async def relay(message: Message, state: FSMContext, bot: Bot):
+async def relay(message: Message, state: FSMContext, bot: Bot, ctx: UserContext):
     data       = await state.get_data()
     chat_id    = data.get("active_chat")
     partner_id = data.get("chat_partner")
@@ -230,68 +229,20 @@ async def relay(message: Message, state: FSMContext, bot: Bot):
         await state.clear()
         return
 
-    chat = db.get_chat(chat_id)
+    chat = await db.get_chat(chat_id)
     if chat and chat.get("closed"):
         await state.clear()
-        profile = db.get_active_profile(message.from_user.id)
-        await message.answer("Этот чат был закрыт.", reply_markup=main_kb(bool(profile)))
+        await message.answer("Этот чат был закрыт.", reply_markup=main_kb(bool(ctx.profile)))
         return
 
-    if db.is_blocked(partner_id, message.from_user.id):
+    if await db.is_blocked(partner_id, message.from_user.id):
         await message.answer("🚫 Собеседник заблокировал тебя.")
         await state.clear()
         return
 
-    sender_id = message.from_user.id
-
     try:
-        if message.text:
-            db.add_message(chat_id, sender_id, message.text, "text")
-            await bot.send_message(partner_id, f"💬 {message.text}")
-
-        elif message.photo:
-            fid = message.photo[-1].file_id
-            db.add_message(chat_id, sender_id, message.caption or "", "photo", fid)
-            await bot.send_photo(partner_id, fid, caption=message.caption)
-
-        elif message.video:
-            fid = message.video.file_id
-            db.add_message(chat_id, sender_id, message.caption or "", "video", fid)
-            await bot.send_video(partner_id, fid, caption=message.caption)
-
-        elif message.voice:
-            fid = message.voice.file_id
-            db.add_message(chat_id, sender_id, "🎤", "voice", fid)
-            await bot.send_voice(partner_id, fid)
-
-        elif message.video_note:
-            fid = message.video_note.file_id
-            db.add_message(chat_id, sender_id, "⭕", "video_note", fid)
-            await bot.send_video_note(partner_id, fid)
-
-        elif message.sticker:
-            fid = message.sticker.file_id
-            db.add_message(chat_id, sender_id, "🎭", "sticker", fid)
-            await bot.send_sticker(partner_id, fid)
-
-        elif message.animation:
-            fid = message.animation.file_id
-            db.add_message(chat_id, sender_id, "🎞", "animation", fid)
-            await bot.send_animation(partner_id, fid, caption=message.caption)
-
-        elif message.document:
-            fid = message.document.file_id
-            db.add_message(chat_id, sender_id, message.caption or "📄", "document", fid)
-            await bot.send_document(partner_id, fid, caption=message.caption)
-
-        elif message.audio:
-            fid = message.audio.file_id
-            db.add_message(chat_id, sender_id, "🎵", "audio", fid)
-            await bot.send_audio(partner_id, fid)
-
-        else:
+        if not await chat_relay.forward(bot, message, chat_id, partner_id):
             await message.answer("⚠️ Этот тип сообщений не поддерживается.")
-
     except TelegramForbiddenError:
         await message.answer("❌ Собеседник заблокировал бота.")
         await state.clear()
@@ -302,12 +253,12 @@ async def relay(message: Message, state: FSMContext, bot: Bot):
 async def report_reason(callback: CallbackQuery):
     _, chat_id, reason = callback.data.split(":")
     chat_id = int(chat_id)
-    chat    = db.get_chat(chat_id)
+    chat    = await db.get_chat(chat_id)
     if not chat:
         await callback.answer("Чат не найден", show_alert=True)
         return
     reported_id = chat["sender_id"] if callback.from_user.id == chat["target_id"] else chat["target_id"]
-    db.add_report(chat_id, callback.from_user.id, reported_id, reason)
+    await db.add_report(chat_id, callback.from_user.id, reported_id, reason)
     await callback.message.edit_text("✅ Жалоба отправлена. Спасибо!")
     await callback.answer()
 
@@ -315,23 +266,3 @@ async def report_reason(callback: CallbackQuery):
 async def cancel_report(callback: CallbackQuery):
     await callback.message.delete()
     await callback.answer()
-
-# ── КМН из меню чата ──────────────────────────────────────────────────────────
-
-@router.message(ChatFSM.active, F.text == "🎮 КМН")
-async def kmn_from_menu(message: Message, state: FSMContext):
-    data    = await state.get_data()
-    chat_id = data.get("active_chat")
-    if not chat_id:
-        await message.answer("Нет активного чата.")
-        return
-    from keyboards import chat_kmn_kb
-    await message.answer(
-        "🎮 <b>Камень-ножницы-бумага</b>\n\n"
-        "Сыграй с собеседником на ставку!\n"
-        "Проигравший автоматически отправляет своё медиа победителю.\n\n"
-        "Игра до <b>3 побед</b> (лучший из 5 раундов).\n"
-        "На каждый ход — <b>60 секунд</b>, иначе засчитывается поражение.",
-        parse_mode="HTML",
-        reply_markup=chat_kmn_kb(chat_id)
-    )
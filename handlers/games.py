@@ -0,0 +1,354 @@
+"""
+Мини-игры со ставками в чате (КМН и другие из game_rules.py).
+
+Статусы игры:
+  waiting_stake_initiator  — ждём ставку от инициатора
+  waiting_stake_opponent   — ждём ставку от соперника (и принятие вызова)
+  waiting_move_both        — оба ещё не сделали ход
+  waiting_move_initiator   — инициатор не сделал ход (соперник уже сделал)
+  waiting_move_opponent    — соперник не сделал ход (инициатор уже сделал)
+  finished                 — игра окончена
+  cancelled                — отменена (таймаут / отказ)
+
+Один роутер на все игры: callback_data «<kind>:<действие>:…», где kind —
+правила из game_rules.RULES. Таймаут у игры один — срок "game" в deadlines.py;
+каждый шаг переставляет его, конец игры снимает. Состояние игры и переходы —
+game_engine.py. Сообщения идут обычным bot.send_* — лимиты Telegram
+соблюдает send_scheduler.
+"""
+
+from aiogram import Router, F, Bot
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.exceptions import TelegramAPIError
+
+import async_db as db
+import deadlines
+import game_rules
+from game_engine import engine, rules_of, player_ids, MoveResult, STAKE_STATUSES
+
+router = Router()
+
+TIMEOUT_SEC = 60  # таймаут на каждый ход / принятие вызова
+PLAYER_NAME = ("первый", "второй")
+
+def _action(name: str):
+    """callback_data «<kind>:<name>:…» любой зарегистрированной игры."""
+    def check(data: str) -> bool:
+        parts = data.split(":")
+        return len(parts) > 2 and parts[1] == name and parts[0] in game_rules.RULES
+    return F.data.func(check)
+
+def move_kb(game: dict) -> InlineKeyboardMarkup:
+    rules = rules_of(game)
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=emoji, callback_data=f"{rules.kind}:move:{game['id']}:{move}")
+        for move, emoji in rules.moves.items()
+    ]])
+
+def accept_kb(game: dict) -> InlineKeyboardMarkup:
+    kind, game_id = game["kind"], game["id"]
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="✅ Принять вызов", callback_data=f"{kind}:accept:{game_id}"),
+        InlineKeyboardButton(text="❌ Отказать",      callback_data=f"{kind}:decline:{game_id}"),
+    ]])
+
+class GameFSM(StatesGroup):
+    waiting_stake = State()   # ждём медиа-ставку
+
+# ── Отправка ──────────────────────────────────────────────────────────────────
+
+async def _notify(bot: Bot, user_ids, text: str, **kwargs):
+    """Сообщение игрокам; кто заблокировал бота — пропускается."""
+    for uid in user_ids:
+        try:
+            await bot.send_message(uid, text, parse_mode="HTML", **kwargs)
+        except TelegramAPIError:
+            pass
+
+async def _send_stake(bot: Bot, user_id: int, stake: dict):
+    """Отправить ставку проигравшего победителю."""
+    send = {"photo": bot.send_photo, "video": bot.send_video,
+            "voice": bot.send_voice}.get((stake or {}).get("type"))
+    if send is None:
+        return
+    try:
+        await send(user_id, stake["file_id"])
+    except TelegramAPIError:
+        pass
+
+def _stake_of(message: Message):
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id}
+    if message.video:
+        return {"type": "video", "file_id": message.video.file_id}
+    if message.voice:
+        return {"type": "voice", "file_id": message.voice.file_id}
+    return None
+
+# ── Запуск игры из чата ───────────────────────────────────────────────────────
+
+@router.callback_query(_action("start"))
+async def game_start(callback: CallbackQuery, state: FSMContext):
+    kind, _, chat_id = callback.data.split(":")[:3]
+    chat_id = int(chat_id)
+    chat    = await db.get_chat(chat_id)
+    if not chat or chat.get("closed"):
+        await callback.answer("Чат недоступен.", show_alert=True)
+        return
+
+    user_id = callback.from_user.id
+    if user_id not in (chat["sender_id"], chat["target_id"]):
+        await callback.answer("Нет доступа.", show_alert=True)
+        return
+
+    # Проверяем нет ли уже активной игры
+    if engine.active_by_chat(chat_id):
+        await callback.answer("В этом чате уже идёт игра!", show_alert=True)
+        return
+
+    opponent_id = chat["target_id"] if user_id == chat["sender_id"] else chat["sender_id"]
+    game        = await engine.create(kind, chat_id, user_id, opponent_id)
+
+    # Сохраняем в FSM что ждём ставку
+    await state.update_data(game_id=game["id"], game_player=0)
+    await state.set_state(GameFSM.waiting_stake)
+
+    await callback.message.answer(
+        f"🎮 <b>{rules_of(game).title} со ставкой!</b>\n\n"
+        "Сначала загрузи свою ставку — фото, видео или голосовое.\n"
+        "Соперник увидит её только если <b>победит</b>.\n\n"
+        f"⏳ У тебя <b>{TIMEOUT_SEC} секунд</b>.",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+    # Таймаут на загрузку ставки инициатором
+    await deadlines.schedule("game", game["id"], TIMEOUT_SEC, stage="stake_initiator")
+
+# ── Получение ставки ──────────────────────────────────────────────────────────
+
+@router.message(GameFSM.waiting_stake)
+async def game_receive_stake(message: Message, state: FSMContext, bot: Bot):
+    data    = await state.get_data()
+    game_id = data.get("game_id")
+    player  = data.get("game_player")  # 0 — инициатор, 1 — соперник
+    if not game_id:
+        return
+
+    game = await engine.get(game_id)
+    if not game or game["status"] != STAKE_STATUSES[player]:
+        await state.set_state(None)
+        return
+
+    stake = _stake_of(message)
+    if stake is None:
+        await message.answer("⚠️ Отправь фото, видео или голосовое как ставку.")
+        return
+
+    game = await engine.set_stake(game_id, player, stake)
+    await state.set_state(None)
+    if not game:
+        return
+
+    if player == 1:
+        await message.answer("✅ Ставка принята! Игра начинается!")
+        # Стартуем первый раунд для обоих
+        await _send_round(bot, game)
+        return
+
+    await message.answer(
+        "✅ Ставка принята! Ожидаем соперника...\n\n"
+        f"Ему отправлен вызов — у него {TIMEOUT_SEC} секунд чтобы принять и загрузить ставку."
+    )
+    await deadlines.schedule("game", game_id, TIMEOUT_SEC, stage="accept")
+    try:
+        await bot.send_message(
+            game["opponent_id"],
+            f"⚔️ <b>Тебя вызвали на {rules_of(game).title}!</b>\n\n"
+            f"Ставка: любое медиа\n"
+            f"До побед: {game['state']['wins_needed']}\n\n"
+            f"⏳ Есть <b>{TIMEOUT_SEC} секунд</b> чтобы принять или отказаться.",
+            parse_mode="HTML",
+            reply_markup=accept_kb(game)
+        )
+    except TelegramAPIError:
+        await engine.transition(game_id, (STAKE_STATUSES[1],), status="cancelled")
+        await deadlines.cancel("game", game_id)
+        await message.answer("❌ Соперник недоступен. Игра отменена.")
+
+# ── Принять / отклонить вызов ─────────────────────────────────────────────────
+
+@router.callback_query(_action("accept"))
+async def game_accept(callback: CallbackQuery, state: FSMContext):
+    game_id = int(callback.data.split(":")[2])
+    game    = await engine.get(game_id)
+    if not game or game["status"] != STAKE_STATUSES[1]:
+        await callback.answer("Вызов уже недействителен.", show_alert=True)
+        return
+    if callback.from_user.id != game["opponent_id"]:
+        await callback.answer("Это не твой вызов.", show_alert=True)
+        return
+
+    await state.update_data(game_id=game_id, game_player=1)
+    await state.set_state(GameFSM.waiting_stake)
+
+    await callback.message.edit_text(
+        "✅ Вызов принят!\n\n"
+        "Теперь загрузи свою ставку — фото, видео или голосовое.\n"
+        f"⏳ У тебя <b>{TIMEOUT_SEC} секунд</b>.",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+    # Срок на принятие вызова заменяется сроком на ставку
+    await deadlines.schedule("game", game_id, TIMEOUT_SEC, stage="stake_opponent")
+
+@router.callback_query(_action("decline"))
+async def game_decline(callback: CallbackQuery, bot: Bot):
+    game_id = int(callback.data.split(":")[2])
+    game    = await engine.get(game_id)
+    if not game:
+        await callback.answer()
+        return
+    if callback.from_user.id != game["opponent_id"]:
+        await callback.answer("Это не твой вызов.", show_alert=True)
+        return
+
+    if not await engine.transition(game_id, (STAKE_STATUSES[1],), status="cancelled"):
+        await callback.answer("Вызов уже недействителен.", show_alert=True)
+        return
+    await deadlines.cancel("game", game_id)
+    await callback.message.edit_text("❌ Ты отказался от игры.")
+    await callback.answer()
+    await _notify(bot, [game["initiator_id"]], f"😔 Соперник отказался от {rules_of(game).title}.")
+
+# ── Ход игрока ────────────────────────────────────────────────────────────────
+
+@router.callback_query(_action("move"))
+async def game_move(callback: CallbackQuery, bot: Bot):
+    parts   = callback.data.split(":")
+    game_id = int(parts[2])
+    move    = parts[3]
+
+    # Проверка, запись хода и итог раунда — одним переходом под локом игры
+    result = await engine.move(game_id, callback.from_user.id, move)
+    if result.outcome == "invalid":
+        await callback.answer("Игра не активна.", show_alert=True)
+        return
+    if result.outcome == "not_player":
+        await callback.answer("Это не твоя игра.", show_alert=True)
+        return
+    if result.outcome == "already":
+        await callback.answer("Ты уже сделал ход — ждём соперника.", show_alert=True)
+        return
+
+    emoji = rules_of(result.game).moves[move]
+    await callback.message.edit_text(f"⏳ Ход принят: {emoji}\nЖдём соперника...")
+    await callback.answer(f"Ты выбрал {emoji}")
+
+    # Если оба походили — раскрываем
+    if result.outcome in ("round", "finished"):
+        await _announce_round(bot, result)
+
+# ── Итог раунда ───────────────────────────────────────────────────────────────
+
+async def _announce_round(bot: Bot, result: MoveResult):
+    """Разослать итог раунда, уже записанный движком."""
+    game  = result.game
+    rnd   = result.round_no
+    emoji = rules_of(game).moves
+
+    if result.timeout:
+        loser = PLAYER_NAME[1 - result.winner].capitalize()
+        result_text = f"⏰ Раунд {rnd}: {loser} игрок не сделал ход вовремя."
+    else:
+        m1, m2 = (emoji[m] for m in result.moves)
+        if result.winner is None:
+            result_text = f"🤝 Раунд {rnd}: {m1} vs {m2} — <b>ничья!</b>"
+        else:
+            result_text = (f"🎯 Раунд {rnd}: {m1} vs {m2} — "
+                           f"побеждает <b>{PLAYER_NAME[result.winner]} игрок!</b>")
+
+    i_wins, o_wins = game["state"]["wins"]
+    score_text = f"\n📊 Счёт: {i_wins} : {o_wins}"
+
+    if result.outcome == "finished":
+        await _finish_game(bot, game, result.winner, result_text + score_text)
+        return
+
+    # Продолжаем
+    new_round = game["current_round"]
+    await _notify(bot, player_ids(game),
+                  result_text + score_text + f"\n\n🎯 Раунд {new_round} — делай ход!",
+                  reply_markup=move_kb(game))
+
+    # Таймаут на новый раунд
+    await deadlines.schedule("game", game["id"], TIMEOUT_SEC, stage="move", round=new_round)
+
+async def _finish_game(bot: Bot, game: dict, winner: int, round_text: str):
+    """Сообщения о конце игры и ставка победителю; статус finished уже записан."""
+    title     = rules_of(game).title
+    winner_id = player_ids(game)[winner]
+    loser_id  = player_ids(game)[1 - winner]
+
+    await deadlines.cancel("game", game["id"])
+
+    final_score = "Итог: {} : {}".format(*game["state"]["wins"])
+
+    await _notify(bot, [winner_id],
+                  f"🏆 <b>Ты победил в {title}!</b>\n\n{round_text}\n{final_score}\n\n"
+                  f"Вот ставка соперника 👇")
+    await _send_stake(bot, winner_id, game["state"]["stakes"][1 - winner])
+    await _notify(bot, [loser_id],
+                  f"😔 <b>Ты проиграл в {title}.</b>\n\n{round_text}\n{final_score}\n\n"
+                  f"Твоя ставка отправлена победителю.")
+
+async def _send_round(bot: Bot, game: dict):
+    await _notify(bot, player_ids(game),
+                  f"⚔️ <b>{rules_of(game).title} началась!</b>\n\n"
+                  f"До {game['state']['wins_needed']} побед. Счёт: 0 : 0\n\n"
+                  f"🎯 Раунд 1 — делай ход! ⏳ {TIMEOUT_SEC} сек",
+                  reply_markup=move_kb(game))
+
+    await deadlines.schedule("game", game["id"], TIMEOUT_SEC, stage="move", round=game["current_round"])
+
+# ── Таймауты ──────────────────────────────────────────────────────────────────
+
+@deadlines.handler("game")
+async def _on_deadline(bot: Bot, game_id: int, payload: dict):
+    game = await engine.get(game_id)
+    if not game:
+        return
+    stage = payload.get("stage")
+    if stage == "stake_initiator":
+        await _timeout_stake(bot, game, 0)
+    elif stage == "stake_opponent":
+        await _timeout_stake(bot, game, 1)
+    elif stage == "accept":
+        await _timeout_accept(bot, game)
+    elif stage == "move" and payload.get("round") == game["current_round"]:
+        await _timeout_move(bot, game)
+
+async def _timeout_stake(bot: Bot, game: dict, player: int):
+    if not await engine.transition(game["id"], (STAKE_STATUSES[player],), status="cancelled"):
+        return  # уже прогрессировала
+    ids = player_ids(game)
+    await _notify(bot, [ids[player]],
+                  "⏰ Время вышло! Ты не загрузил ставку. Игра отменена, тебе засчитано поражение.")
+    await _notify(bot, [ids[1 - player]],
+                  "⏰ Соперник не загрузил ставку вовремя. Игра отменена, тебе засчитана победа.")
+
+async def _timeout_accept(bot: Bot, game: dict):
+    if not await engine.transition(game["id"], (STAKE_STATUSES[1],), status="cancelled"):
+        return
+    await _notify(bot, [game["opponent_id"]], "⏰ Время на принятие вызова вышло. Игра отменена.")
+    await _notify(bot, [game["initiator_id"]], "⏰ Соперник не принял вызов вовремя. Игра отменена.")
+
+async def _timeout_move(bot: Bot, game: dict):
+    # Переход — только если с момента снимка никто не походил
+    result = await engine.timeout_move(game["id"], game["status"], game["current_round"])
+    if result.outcome == "cancelled":
+        await _notify(bot, player_ids(game), "⏰ Оба игрока не сделали ход. Игра отменена.")
+    elif result.outcome in ("round", "finished"):
+        await _announce_round(bot, result)
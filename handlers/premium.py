@@ -6,18 +6,16 @@ from aiogram.types import (
 )
 from aiogram.filters import Command
 
-import database as db
+import async_db as db
+from context import UserContext
 from config import PREMIUM_PLANS, TON_WALLET, ADMIN_IDS
 from keyboards import main_kb, premium_plans_kb, premium_pay_kb
 
 router = Router()
 
-def _prem_status_text(user_id: int) -> str:
-    user = db.get_user(user_id)
-    if not user:
-        return ""
-    if db.is_premium(user_id):
-        until = user.get("premium_until")
+def _prem_status_text(ctx: UserContext) -> str:
+    if ctx.premium:
+        until = ctx.user.get("premium_until")
         if until is None:
             exp = "♾️ Бессрочно"
         else:
@@ -28,8 +26,8 @@ def _prem_status_text(user_id: int) -> str:
 # ── Страница Premium ──────────────────────────────────────────────────────────
 
 @router.message(F.text == "👑 Premium")
-async def premium_page(message: Message):
-    status = _prem_status_text(message.from_user.id)
+async def premium_page(message: Message, ctx: UserContext):
+    status = _prem_status_text(ctx)
     await message.answer(
         f"{status}"
         f"<b>👑 Beem Premium</b>\n\n"
@@ -63,8 +61,8 @@ async def prem_choose(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "prem:back")
-async def prem_back(callback: CallbackQuery):
-    status = _prem_status_text(callback.from_user.id)
+async def prem_back(callback: CallbackQuery, ctx: UserContext):
+    status = _prem_status_text(ctx)
     await callback.message.edit_text(
         f"{status}"
         f"<b>👑 Beem Premium</b>\n\n"
@@ -106,7 +104,7 @@ async def pre_checkout(pre_checkout_query: PreCheckoutQuery):
     await pre_checkout_query.answer(ok=True)
 
 @router.message(F.successful_payment)
-async def successful_payment(message: Message):
+async def successful_payment(message: Message, ctx: UserContext):
     payload  = message.successful_payment.invoice_payload  # "premium:week"
     parts    = payload.split(":")
     if len(parts) != 2 or parts[0] != "premium":
@@ -117,26 +115,25 @@ async def successful_payment(message: Message):
 
     p    = PREMIUM_PLANS[plan_key]
     days = p["days"]
-    db.give_premium(message.from_user.id, days)
-    db.add_payment(message.from_user.id, plan_key, "stars", str(p["stars"]))
+    await db.give_premium(message.from_user.id, days)
+    await db.add_payment(message.from_user.id, plan_key, "stars", str(p["stars"]))
 
     if days is None:
         exp_txt = "♾️ Бессрочно"
     else:
         exp_txt = f"до {time.strftime('%d.%m.%Y', time.localtime(time.time() + days * 86400))}"
 
-    profile = db.get_active_profile(message.from_user.id)
     await message.answer(
         f"🎉 <b>👑 Premium активирован!</b>\n\n"
         f"Тариф: {p['label']}\n"
         f"Действует: {exp_txt}\n\n"
         f"Теперь тебе доступны все возможности Premium!",
         parse_mode="HTML",
-        reply_markup=main_kb(bool(profile))
+        reply_markup=main_kb(bool(ctx.profile))
     )
 
     # Уведомить всех админов
-    user = db.get_user(message.from_user.id)
+    user = ctx.user
     for admin_id in ADMIN_IDS:
         try:
             await message.bot.send_message(
@@ -176,10 +173,10 @@ async def prem_pay_ton(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("prem:ton_notify:"))
-async def ton_notify_admin(callback: CallbackQuery, bot: Bot):
+async def ton_notify_admin(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     plan_key = callback.data.split(":")[2]
     p        = PREMIUM_PLANS.get(plan_key, {})
-    user     = db.get_user(callback.from_user.id)
+    user     = ctx.user
 
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     for admin_id in ADMIN_IDS:
@@ -232,10 +229,10 @@ async def cmd_give_premium(message: Message):
 
     p    = PREMIUM_PLANS[plan_key]
     days = p["days"]
-    db.give_premium(target_id, days)
-    db.add_payment(target_id, plan_key, "manual", "0")
+    await db.give_premium(target_id, days)
+    await db.add_payment(target_id, plan_key, "manual", "0")
 
-    target = db.get_user(target_id)
+    target = await db.get_user(target_id)
     await message.answer(
         f"✅ Premium выдан!\n"
         f"👤 {target['name'] if target else target_id}\n"
@@ -243,7 +240,7 @@ async def cmd_give_premium(message: Message):
     )
 
     try:
-        profile = db.get_active_profile(target_id)
+        profile = await db.get_active_profile(target_id)
         exp_txt = "♾️ Бессрочно" if days is None else f"до {time.strftime('%d.%m.%Y', time.localtime(time.time() + days * 86400))}"
         await message.bot.send_message(
             target_id,
@@ -274,14 +271,14 @@ async def adm_giveprem_plan(callback: CallbackQuery, bot: Bot):
 
     p    = PREMIUM_PLANS[plan_key]
     days = p["days"]
-    db.give_premium(target_id, days)
-    db.add_payment(target_id, plan_key, "ton", str(p["ton"]))
+    await db.give_premium(target_id, days)
+    await db.add_payment(target_id, plan_key, "ton", str(p["ton"]))
 
     await callback.message.edit_text(f"✅ Premium ({p['label']}) выдан пользователю {target_id}")
     await callback.answer("✅ Выдано!")
 
     try:
-        profile = db.get_active_profile(target_id)
+        profile = await db.get_active_profile(target_id)
         exp_txt = "♾️ Бессрочно" if days is None else f"до {time.strftime('%d.%m.%Y', time.localtime(time.time() + days * 86400))}"
         await bot.send_message(
             target_id,
@@ -5,8 +5,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
-import database as db
-from config import PROFILE_COOLDOWN, INTERESTS_DISPLAY, PROFILES_LIMIT_FREE, PROFILES_LIMIT_PREMIUM
+import async_db as db
+import feed
+import interests
+from context import UserContext
+from config import PROFILE_COOLDOWN, PROFILES_LIMIT_FREE, PROFILES_LIMIT_PREMIUM
 from keyboards import main_kb, profile_view_kb, confirm_delete_profile_kb, filters_kb, filter_gender_kb
 
 router = Router()
@@ -20,18 +23,18 @@ class FilterFSM(StatesGroup):
     age_range = State()
 
 def profile_caption(user: dict, profile: dict) -> str:
-    is_prem = db.is_premium(user["user_id"])
-    badge   = "👑 " if is_prem else ""
-    interests = [INTERESTS_DISPLAY.get(i, i) for i in (user.get("interests") or "").split(",") if i]
+    badge = "👑 " if db.premium_active(user) else ""
     return (
         f"{badge}<b>{user['name']}</b>, {user['age']} лет  {GENDER_MAP.get(user.get('gender'), '')}\n"
-        f"🎯 {' '.join(interests)}\n\n"
+        f"🎯 {' '.join(interests.names(user.get('interests_mask')))}\n\n"
         f"📝 {profile['description']}"
     )
 
 async def send_profile(bot: Bot, chat_id: int, user: dict, profile: dict,
-                       show_actions: bool = True):
-    media_list = db.get_profile_media(profile["id"])
+                       show_actions: bool = True, media_list: list = None):
+    """media_list — медиа, уже загруженные get_profile_media_many; иначе запрос."""
+    if media_list is None:
+        media_list = await db.get_profile_media(profile["id"])
     caption    = profile_caption(user, profile)
     kb = profile_view_kb(profile["id"], user["user_id"]) if show_actions else None
 
@@ -76,18 +79,17 @@ async def send_profile(bot: Bot, chat_id: int, user: dict, profile: dict,
 # ── Добавить анкету ────────────────────────────────────────────────────────────
 
 @router.message(F.text == "➕ Добавить анкету")
-async def add_profile_start(message: Message, state: FSMContext):
-    user = db.get_user(message.from_user.id)
-    if not user or not user.get("registered"):
+async def add_profile_start(message: Message, state: FSMContext, ctx: UserContext):
+    if not ctx.registered:
         await message.answer("Сначала зарегистрируйся: /start")
         return
-    if db.is_banned(message.from_user.id):
+    if ctx.banned:
         await message.answer("🚫 Ты заблокирован.")
         return
 
     # Кулдаун только для бесплатных
-    if not db.is_premium(message.from_user.id):
-        elapsed = time.time() - db.get_last_profile_time(message.from_user.id)
+    if not ctx.premium:
+        elapsed = time.time() - await db.get_last_profile_time(message.from_user.id)
         if elapsed < PROFILE_COOLDOWN:
             rem  = int(PROFILE_COOLDOWN - elapsed)
             m, s = divmod(rem, 60)
@@ -101,7 +103,7 @@ async def add_profile_start(message: Message, state: FSMContext):
     await state.update_data(description="", media=[])
     await state.set_state(ProfileFSM.collecting)
 
-    is_prem = db.is_premium(message.from_user.id)
+    is_prem = ctx.premium
     media_hint = (
         "Можно отправить фото, видео, голосовые."
         if is_prem else
@@ -127,9 +129,9 @@ async def publish_profile(message: Message, state: FSMContext, bot: Bot):
         await message.answer("Анкета пустая! Добавь хотя бы текст или голосовое.")
         return
 
-    pid = db.create_profile(message.from_user.id, desc or "Загляни в мою анкету 👀")
+    pid = await db.create_profile(message.from_user.id, desc or "Загляни в мою анкету 👀")
     for m in media:
-        db.add_profile_media(pid, m["file_id"], m["type"])
+        await db.add_profile_media(pid, m["file_id"], m["type"])
 
     await state.clear()
     await message.answer(
@@ -138,11 +140,11 @@ async def publish_profile(message: Message, state: FSMContext, bot: Bot):
     )
 
 @router.message(ProfileFSM.collecting)
-async def collect_profile_content(message: Message, state: FSMContext):
+async def collect_profile_content(message: Message, state: FSMContext, ctx: UserContext):
     data  = await state.get_data()
     media = data.get("media", [])
     desc  = data.get("description", "")
-    is_prem = db.is_premium(message.from_user.id)
+    is_prem = ctx.premium
 
     if message.text:
         desc = (desc + "\n" + message.text).strip()[:500]
@@ -172,9 +174,8 @@ async def collect_profile_content(message: Message, state: FSMContext):
 # ── Моя анкета / Удалить ──────────────────────────────────────────────────────
 
 @router.message(F.text == "📝 Моя анкета")
-async def my_profile(message: Message, bot: Bot):
-    user    = db.get_user(message.from_user.id)
-    profile = db.get_active_profile(message.from_user.id)
+async def my_profile(message: Message, bot: Bot, ctx: UserContext):
+    user, profile = ctx.user, ctx.profile
     if not profile:
         await message.answer("У тебя нет активной анкеты.", reply_markup=main_kb(False))
         return
@@ -199,7 +200,7 @@ async def del_profile_ask(callback: CallbackQuery):
 
 @router.callback_query(F.data == "delprofile:yes")
 async def del_profile_confirm(callback: CallbackQuery):
-    db.delete_active_profile(callback.from_user.id)
+    await db.delete_active_profile(callback.from_user.id)
     await callback.message.edit_text("🗑 Анкета удалена.")
     await callback.message.answer("Главное меню:", reply_markup=main_kb(False))
     await callback.answer()
@@ -212,18 +213,18 @@ async def del_profile_cancel(callback: CallbackQuery):
 # ── Просмотр анкет ─────────────────────────────────────────────────────────────
 
 @router.message(F.text == "👥 Анкеты")
-async def browse_profiles(message: Message, bot: Bot):
-    if db.is_banned(message.from_user.id):
+async def browse_profiles(message: Message, bot: Bot, ctx: UserContext):
+    if ctx.banned:
         await message.answer("🚫 Ты заблокирован.")
         return
-    user = db.get_user(message.from_user.id)
-    if not user or not user.get("registered"):
+    if not ctx.registered:
         await message.answer("Сначала зарегистрируйся: /start")
         return
 
-    is_prem    = db.is_premium(message.from_user.id)
+    user       = ctx.user
+    is_prem    = ctx.premium
     limit      = PROFILES_LIMIT_PREMIUM if is_prem else PROFILES_LIMIT_FREE
-    interests  = [i for i in (user.get("interests") or "").split(",") if i]
+    mask       = user.get("interests_mask") or 0
 
     # Фильтры — только для премиума
     sg         = user.get("search_gender", "any") if is_prem else "any"
@@ -231,20 +232,21 @@ async def browse_profiles(message: Message, bot: Bot):
     age_max    = user.get("search_age_max", 99) if is_prem else 99
     media_only = bool(user.get("search_media_only", 0)) if is_prem else False
 
-    profiles = db.get_matching_profiles(
-        message.from_user.id, interests, limit=limit,
+    profiles = await feed.next_profiles(
+        message.from_user.id, limit, mask,
         search_gender=sg, age_min=age_min, age_max=age_max,
-        media_only=media_only, viewer_is_premium=is_prem
+        media_only=media_only
     )
     if not profiles:
         await message.answer("😔 Пока нет подходящих анкет. Попробуй позже или измени интересы!")
         return
 
+    # Запись кандидата уже содержит поля пользователя — отдельный get_user не нужен,
+    # медиа всех показанных анкет — одним запросом
+    media = await db.get_profile_media_many([p["id"] for p in profiles])
     for p in profiles:
-        p_user = db.get_user(p["user_id"])
-        if not p_user:
-            continue
-        await send_profile(bot, message.chat.id, p_user, p, show_actions=True)
+        await send_profile(bot, message.chat.id, p, p, show_actions=True,
+                           media_list=media[p["id"]])
 
     # Кнопка фильтров для премиума после показа анкет
     if is_prem:
@@ -267,11 +269,11 @@ async def browse_profiles(message: Message, bot: Bot):
 # ── Фильтры (Premium) ─────────────────────────────────────────────────────────
 
 @router.callback_query(F.data == "open_filters")
-async def open_filters(callback: CallbackQuery):
-    if not db.is_premium(callback.from_user.id):
+async def open_filters(callback: CallbackQuery, ctx: UserContext):
+    if not ctx.premium:
         await callback.answer("🔒 Фильтры доступны только с 👑 Premium", show_alert=True)
         return
-    user = db.get_user(callback.from_user.id)
+    user = ctx.user
     await callback.message.edit_text(
         "🔍 <b>Фильтры поиска</b>\n\nНастрой кого хочешь видеть:",
         parse_mode="HTML",
@@ -293,10 +295,10 @@ async def filter_gender(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("fgender:"))
-async def set_filter_gender(callback: CallbackQuery):
+async def set_filter_gender(callback: CallbackQuery, ctx: UserContext):
     val  = callback.data.split(":")[1]
-    user = db.get_user(callback.from_user.id)
-    db.upsert_user(callback.from_user.id, search_gender=val)
+    user = ctx.user
+    await db.upsert_user(callback.from_user.id, search_gender=val)
     await callback.message.edit_text(
         "🔍 <b>Фильтры поиска</b>\n\nНастрой кого хочешь видеть:",
         parse_mode="HTML",
@@ -319,7 +321,7 @@ async def filter_age_prompt(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(FilterFSM.age_range)
-async def filter_age_input(message: Message, state: FSMContext):
+async def filter_age_input(message: Message, state: FSMContext, ctx: UserContext):
     try:
         parts = message.text.strip().split("-")
         age_min = int(parts[0].strip())
@@ -328,21 +330,19 @@ async def filter_age_input(message: Message, state: FSMContext):
     except:
         await message.answer("Неверный формат. Пример: 18-30")
         return
-    db.upsert_user(message.from_user.id, search_age_min=age_min, search_age_max=age_max)
+    await db.upsert_user(message.from_user.id, search_age_min=age_min, search_age_max=age_max)
     await state.clear()
-    user = db.get_user(message.from_user.id)
     await message.answer(
         f"✅ Возраст: {age_min}–{age_max}\n\nФильтры обновлены!",
-        reply_markup=main_kb(bool(db.get_active_profile(message.from_user.id)))
+        reply_markup=main_kb(bool(ctx.profile))
     )
 
 @router.callback_query(F.data == "filter:media_only")
-async def filter_media_only(callback: CallbackQuery):
-    user     = db.get_user(callback.from_user.id)
+async def filter_media_only(callback: CallbackQuery, ctx: UserContext):
+    user     = ctx.user
     cur      = bool(user.get("search_media_only", 0))
     new_val  = 0 if cur else 1
-    db.upsert_user(callback.from_user.id, search_media_only=new_val)
-    user = db.get_user(callback.from_user.id)
+    await db.upsert_user(callback.from_user.id, search_media_only=new_val)
     await callback.message.edit_reply_markup(
         reply_markup=filters_kb(
             user.get("search_gender", "any"),
@@ -4,18 +4,17 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import CommandStart
 
-import database as db
-from config import INTERESTS_DISPLAY
+import async_db as db
+import interests
+from context import UserContext
 from keyboards import main_kb, gender_kb, interests_kb, settings_kb
 
 router = Router()
 
 GENDER_MAP = {"male": "👦 Парень", "female": "👧 Девушка", "other": "⚧ Другое"}
 
-def fmt_interests(interests_str: str) -> str:
-    if not interests_str:
-        return "—"
-    return ", ".join(INTERESTS_DISPLAY.get(i, i) for i in interests_str.split(",") if i)
+def fmt_interests(mask: int) -> str:
+    return interests.display(mask)
 
 # ── FSM ────────────────────────────────────────────────────────────────────────
 
@@ -34,20 +33,17 @@ class Sett(StatesGroup):
 # ── /start ─────────────────────────────────────────────────────────────────────
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, ctx: UserContext):
     await state.clear()
-    if db.is_banned(message.from_user.id):
-        user = db.get_user(message.from_user.id)
-        reason = user.get("ban_reason") or "нарушение правил"
+    if ctx.banned:
+        reason = ctx.user.get("ban_reason") or "нарушение правил"
         await message.answer(f"🚫 Ты заблокирован.\nПричина: {reason}")
         return
-    user = db.get_user(message.from_user.id)
-    if user and user.get("registered"):
-        profile = db.get_active_profile(message.from_user.id)
+    if ctx.registered:
         await message.answer(
             "👋 С возвращением в <b>Beem</b>!\n\nВыбери действие:",
             parse_mode="HTML",
-            reply_markup=main_kb(has_profile=bool(profile))
+            reply_markup=main_kb(has_profile=bool(ctx.profile))
         )
     else:
         await message.answer(
@@ -102,11 +98,11 @@ async def reg_interests(callback: CallbackQuery, state: FSMContext):
         if not selected:
             await callback.answer("Выбери хотя бы один интерес!", show_alert=True)
             return
-        db.upsert_user(
+        await db.upsert_user(
             callback.from_user.id,
             username=callback.from_user.username or "",
             name=data["name"], age=data["age"],
-            gender=data["gender"], interests=",".join(selected),
+            gender=data["gender"], interests_mask=interests.to_mask(selected),
             registered=1, created_at=__import__("time").time()
         )
         await state.clear()
@@ -114,7 +110,7 @@ async def reg_interests(callback: CallbackQuery, state: FSMContext):
             f"✅ Профиль создан!\n\n"
             f"👤 <b>{data['name']}</b>, {data['age']} лет\n"
             f"Пол: {GENDER_MAP.get(data['gender'])}\n"
-            f"Интересы: {fmt_interests(','.join(selected))}",
+            f"Интересы: {fmt_interests(interests.to_mask(selected))}",
             parse_mode="HTML"
         )
         await callback.message.answer(
@@ -133,25 +129,25 @@ async def reg_interests(callback: CallbackQuery, state: FSMContext):
 # ── Настройки ──────────────────────────────────────────────────────────────────
 
 @router.message(F.text == "⚙️ Настройки")
-async def cmd_settings(message: Message):
-    user = db.get_user(message.from_user.id)
-    if not user or not user.get("registered"):
+async def cmd_settings(message: Message, ctx: UserContext):
+    if not ctx.registered:
         await message.answer("Сначала пройди регистрацию: /start")
         return
-    interests = fmt_interests(user.get("interests", ""))
+    user = ctx.user
+    interests_txt = fmt_interests(user.get("interests_mask"))
     await message.answer(
         f"⚙️ <b>Твой профиль</b>\n\n"
         f"👤 Имя: {user['name']}\n"
         f"🎂 Возраст: {user['age']}\n"
         f"⚧ Пол: {GENDER_MAP.get(user.get('gender'), '—')}\n"
-        f"🎯 Интересы: {interests}\n\n"
+        f"🎯 Интересы: {interests_txt}\n\n"
         f"Что хочешь изменить?",
         parse_mode="HTML",
         reply_markup=settings_kb()
     )
 
 @router.callback_query(F.data.startswith("set:"))
-async def settings_action(callback: CallbackQuery, state: FSMContext):
+async def settings_action(callback: CallbackQuery, state: FSMContext, ctx: UserContext):
     action = callback.data.split(":")[1]
     if action == "name":
         await callback.message.answer("Введи новое имя:")
@@ -163,52 +159,48 @@ async def settings_action(callback: CallbackQuery, state: FSMContext):
         await callback.message.answer("Выбери пол:", reply_markup=gender_kb("setgender"))
         await state.set_state(Sett.gender)
     elif action == "interests":
-        user = db.get_user(callback.from_user.id)
-        sel  = user.get("interests", "").split(",") if user.get("interests") else []
+        sel  = interests.to_keys(ctx.user.get("interests_mask"))
         await state.update_data(interests=sel)
         await callback.message.answer("Выбери интересы:", reply_markup=interests_kb(sel))
         await state.set_state(Sett.interests)
     await callback.answer()
 
 @router.message(Sett.name)
-async def sett_name(message: Message, state: FSMContext):
+async def sett_name(message: Message, state: FSMContext, ctx: UserContext):
     name = message.text.strip()[:30]
     if len(name) < 2:
         await message.answer("Слишком коротко:")
         return
-    db.upsert_user(message.from_user.id, name=name)
+    await db.upsert_user(message.from_user.id, name=name)
     await state.clear()
-    profile = db.get_active_profile(message.from_user.id)
     await message.answer(
         f"✅ Имя изменено: <b>{name}</b>",
         parse_mode="HTML",
-        reply_markup=main_kb(bool(profile))
+        reply_markup=main_kb(bool(ctx.profile))
     )
 
 @router.message(Sett.age)
-async def sett_age(message: Message, state: FSMContext):
+async def sett_age(message: Message, state: FSMContext, ctx: UserContext):
     try:
         age = int(message.text.strip())
         assert 13 <= age <= 99
     except:
         await message.answer("Введи возраст (13–99):")
         return
-    db.upsert_user(message.from_user.id, age=age)
+    await db.upsert_user(message.from_user.id, age=age)
     await state.clear()
-    profile = db.get_active_profile(message.from_user.id)
-    await message.answer(f"✅ Возраст изменён: {age}", reply_markup=main_kb(bool(profile)))
+    await message.answer(f"✅ Возраст изменён: {age}", reply_markup=main_kb(bool(ctx.profile)))
 
 @router.callback_query(Sett.gender, F.data.startswith("setgender:"))
-async def sett_gender(callback: CallbackQuery, state: FSMContext):
+async def sett_gender(callback: CallbackQuery, state: FSMContext, ctx: UserContext):
     gender = callback.data.split(":")[1]
-    db.upsert_user(callback.from_user.id, gender=gender)
+    await db.upsert_user(callback.from_user.id, gender=gender)
     await state.clear()
-    profile = db.get_active_profile(callback.from_user.id)
-    await callback.message.answer("✅ Пол обновлён!", reply_markup=main_kb(bool(profile)))
+    await callback.message.answer("✅ Пол обновлён!", reply_markup=main_kb(bool(ctx.profile)))
     await callback.answer()
 
 @router.callback_query(Sett.interests, F.data.startswith("interest:"))
-async def sett_interests(callback: CallbackQuery, state: FSMContext):
+async def sett_interests(callback: CallbackQuery, state: FSMContext, ctx: UserContext):
     key      = callback.data.split(":")[1]
     data     = await state.get_data()
     selected = data.get("interests", [])
@@ -216,10 +208,9 @@ async def sett_interests(callback: CallbackQuery, state: FSMContext):
         if not selected:
             await callback.answer("Выбери хотя бы один!", show_alert=True)
             return
-        db.upsert_user(callback.from_user.id, interests=",".join(selected))
+        await db.upsert_user(callback.from_user.id, interests_mask=interests.to_mask(selected))
         await state.clear()
-        profile = db.get_active_profile(callback.from_user.id)
-        await callback.message.answer("✅ Интересы обновлены!", reply_markup=main_kb(bool(profile)))
+        await callback.message.answer("✅ Интересы обновлены!", reply_markup=main_kb(bool(ctx.profile)))
     else:
         if key in selected:
             selected.remove(key)
@@ -0,0 +1,40 @@
+"""
+Интересы как битовая маска (users.interests_mask).
+
+Бит интереса — его позиция в config.INTERESTS, поэтому новые интересы
+добавляются только в конец списка, а существующие не переставляются.
+Пересечение интересов — это `mask_a & mask_b`, без разбора строк.
+
+Подписи для всех возможных масок считаются один раз при импорте:
+интересов немного (2^10 = 1024 комбинации).
+"""
+
+from typing import Iterable, List, Tuple
+
+from config import INTERESTS
+
+BITS = {key: 1 << i for i, (_, key) in enumerate(INTERESTS)}
+ALL  = (1 << len(INTERESTS)) - 1
+
+def to_mask(keys: Iterable[str]) -> int:
+    mask = 0
+    for k in keys:
+        mask |= BITS.get(k, 0)
+    return mask
+
+_KEYS:  List[Tuple[str, ...]] = [
+    tuple(key for _, key in INTERESTS if m & BITS[key]) for m in range(ALL + 1)
+]
+_NAMES: List[Tuple[str, ...]] = [
+    tuple(name for name, key in INTERESTS if m & BITS[key]) for m in range(ALL + 1)
+]
+
+def to_keys(mask: int) -> List[str]:
+    return list(_KEYS[(mask or 0) & ALL])
+
+def names(mask: int) -> Tuple[str, ...]:
+    return _NAMES[(mask or 0) & ALL]
+
+def display(mask: int, sep: str = ", ") -> str:
+    n = names(mask)
+    return sep.join(n) if n else "—"
@@ -146,6 +146,19 @@ def admin_ban_kb(user_id: int) -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="👑 Выдать Premium", callback_data=f"adm:giveprem:{user_id}")],
     ])
 
+# ── Admin рассылка ────────────────────────────────────────────────────────────
+
+def broadcast_kb(broadcast_id: int, status: str) -> InlineKeyboardMarkup:
+    rows = []
+    if status == "running":
+        rows.append([InlineKeyboardButton(text="⏸ Пауза",    callback_data=f"bc:pause:{broadcast_id}"),
+                     InlineKeyboardButton(text="⏹ Отменить", callback_data=f"bc:cancel:{broadcast_id}")])
+    elif status == "paused":
+        rows.append([InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"bc:resume:{broadcast_id}"),
+                     InlineKeyboardButton(text="⏹ Отменить",    callback_data=f"bc:cancel:{broadcast_id}")])
+    rows.append([InlineKeyboardButton(text="🔄 Обновить", callback_data=f"bc:refresh:{broadcast_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 # ── Premium ───────────────────────────────────────────────────────────────────
 
 def premium_plans_kb() -> InlineKeyboardMarkup:
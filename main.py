@@ -1,23 +1,111 @@
-import threading
+"""
+Запуск сервиса: миграции, затем веб-панель и бот — дочерними процессами.
+
+  - веб-панель — gunicorn с gunicorn_conf.py (воркеры, потоки, keep-alive,
+    плавная остановка), а не dev-сервер Flask в потоке;
+  - бот — python bot.py;
+  - упавший процесс перезапускается с паузой 1, 2, 4… сек
+    (до SUPERVISOR_MAX_BACKOFF), после SUPERVISOR_STABLE_SEC работы пауза
+    снова минимальная;
+  - SIGTERM / SIGINT передаются детям; кто не завершился за
+    WEB_GRACEFUL_TIMEOUT (+5 сек), получает SIGKILL.
+"""
+
 import logging
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
 import database as db
+from config import SUPERVISOR_MAX_BACKOFF, SUPERVISOR_STABLE_SEC, WEB_GRACEFUL_TIMEOUT
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("supervisor")
 
-# Init DB
-db.init_db()
-logging.info("✅ База данных инициализирована")
+class Child:
+    def __init__(self, name: str, argv: List[str]):
+        self.name = name
+        self.argv = argv
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+        self.restarts = 0
 
-# Run web panel in background thread
-def start_web():
-    from web import run_web
-    run_web()
+    def start(self):
+        self.proc = subprocess.Popen(self.argv)
+        self.started = time.monotonic()
+        log.info("▶️ %s запущен (pid %s)", self.name, self.proc.pid)
 
-t = threading.Thread(target=start_web, daemon=True)
-t.start()
-logging.info("✅ Веб-панель запущена на порту 5000")
+    def check(self, now: float):
+        """Упал — запланировать перезапуск; срок подошёл — перезапустить."""
+        if self.proc is None:
+            if now >= self.restart_at:
+                self.restarts += 1
+                self.start()
+            return
+        code = self.proc.poll()
+        if code is None:
+            return
+        uptime = now - self.started
+        if uptime >= SUPERVISOR_STABLE_SEC:
+            self.backoff = 1.0
+        log.error("💥 %s завершился с кодом %s через %.0f с, перезапуск через %.0f с",
+                  self.name, code, uptime, self.backoff)
+        self.proc = None
+        self.restart_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, SUPERVISOR_MAX_BACKOFF)
 
-# Run bot (blocking)
-logging.info("✅ Запуск бота...")
-import subprocess
-subprocess.run(["python", "bot.py"])
+    def terminate(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+
+    def wait(self, deadline: float):
+        if self.proc is None:
+            return
+        try:
+            self.proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            log.warning("%s не остановился вовремя — kill", self.name)
+            self.proc.kill()
+            self.proc.wait()
+
+def main():
+    # Миграции — один раз до старта детей
+    db.init_db()
+    log.info("✅ База данных инициализирована")
+    # Дальше супервизору БД не нужна, у детей свои пулы
+    db.get_pool().closeall()
+
+    children = [
+        Child("web", [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "web:app"]),
+        Child("bot", [sys.executable, "bot.py"]),
+    ]
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for child in children:
+        child.start()
+    while not stopping:
+        now = time.monotonic()
+        for child in children:
+            child.check(now)
+        time.sleep(0.5)
+
+    log.info("⏹ Остановка: %s", ", ".join(c.name for c in children))
+    for child in children:
+        child.terminate()
+    deadline = time.monotonic() + WEB_GRACEFUL_TIMEOUT + 5
+    for child in children:
+        child.wait(deadline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Подбор анкет для «👥 Анкеты».
+
+Вместо запроса с ORDER BY RANDOM() по всем активным анкетам бот держит
+в памяти индекс кандидатов:
+  - корзины (пол, возраст // MATCHING_AGE_BUCKET) → user_id;
+  - запись кандидата: анкета + поля пользователя + есть ли фото/видео.
+
+Запрос зрителя — объединение подходящих корзин, совпадение интересов
+одним `interests_mask & маска_зрителя`, отсев исключённых; результат
+делится на 👑 Premium и остальных. Порядок показа и «уже видел» — в feed.py.
+
+Актуальность:
+  - database.on_change помечает пользователя «грязным», при следующем
+    подборе грязные перечитываются одним запросом;
+  - «кого не показывать» (блоки, закрытые чаты) кешируется на зрителя
+    и сбрасывается событиями block/chat;
+  - изменения из веб-панели приходят тем же путём через LISTEN/NOTIFY
+    (database.start_listener), после обрыва — полной перестройкой;
+  - раз в MATCHING_REBUILD_SEC индекс строится заново — страховка
+    от пропущенных событий.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import async_db as adb
+import database as db
+from config import MATCHING_REBUILD_SEC, MATCHING_EXCLUDE_TTL, MATCHING_AGE_BUCKET
+
+log = logging.getLogger(__name__)
+
+def _bucket(age: int) -> int:
+    return (age or 0) // MATCHING_AGE_BUCKET
+
+class CandidateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user: Dict[int, Dict] = {}
+        self._buckets: Dict[Tuple[str, int], Set[int]] = {}
+        self._dirty: Set[int] = set()
+        self._excluded: Dict[int, Tuple[float, Set[int]]] = {}
+        self._built_at = 0.0
+
+    # ── Наполнение ────────────────────────────────────────────────────────────
+
+    def _remove(self, user_id: int):
+        row = self._by_user.pop(user_id, None)
+        if not row:
+            return
+        key = (row.get("gender"), _bucket(row.get("age")))
+        ids = self._buckets.get(key)
+        if ids is not None:
+            ids.discard(user_id)
+            if not ids:
+                del self._buckets[key]
+
+    def _add(self, row: Dict):
+        uid = row["user_id"]
+        self._remove(uid)
+        self._by_user[uid] = row
+        self._buckets.setdefault((row.get("gender"), _bucket(row.get("age"))), set()).add(uid)
+
+    def rebuild(self):
+        # События во время чтения останутся в _dirty и догрузятся следующим refresh
+        with self._lock:
+            self._dirty.clear()
+        rows = db.get_candidate_profiles()
+        with self._lock:
+            self._by_user.clear()
+            self._buckets.clear()
+            for r in rows:
+                self._add(r)
+            self._built_at = time.monotonic()
+        log.info("Индекс анкет перестроен: %s кандидатов", len(rows))
+
+    def refresh(self):
+        """Перестроить, если устарел, иначе перечитать только грязных."""
+        if time.monotonic() - self._built_at > MATCHING_REBUILD_SEC:
+            self.rebuild()
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        rows = db.get_candidate_profiles(list(dirty))
+        with self._lock:
+            for uid in dirty:
+                self._remove(uid)
+            for r in rows:
+                self._add(r)
+
+    def needs_refresh(self) -> bool:
+        return bool(self._dirty) or time.monotonic() - self._built_at > MATCHING_REBUILD_SEC
+
+    # ── Инвалидация ───────────────────────────────────────────────────────────
+
+    def on_change(self, kind: str, user_id: int):
+        with self._lock:
+            if kind in ("user", "profile"):
+                self._dirty.add(user_id)
+            elif kind in ("block", "chat"):
+                self._excluded.pop(user_id, None)
+            elif kind == "reset":
+                self._built_at = 0.0
+                self._excluded.clear()
+
+    def excluded(self, viewer_id: int) -> Set[int]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._excluded.get(viewer_id)
+        if cached and now - cached[0] < MATCHING_EXCLUDE_TTL:
+            return cached[1]
+        ids = db.get_excluded_user_ids(viewer_id)
+        with self._lock:
+            if len(self._excluded) > 10000:
+                self._excluded = {k: v for k, v in self._excluded.items()
+                                  if now - v[0] < MATCHING_EXCLUDE_TTL}
+            self._excluded[viewer_id] = (now, ids)
+        return ids
+
+    # ── Подбор ────────────────────────────────────────────────────────────────
+
+    def candidates(self, viewer_id: int, excluded: Set[int], interests_mask: int,
+                   search_gender: str = "any", age_min: int = 0, age_max: int = 99,
+                   media_only: bool = False) -> Tuple[List[Dict], List[Dict]]:
+        """Все подходящие кандидаты, разбитые на (premium, остальные)."""
+        now = time.time()
+        with self._lock:
+            genders = ({g for g, _ in self._buckets} if search_gender == "any"
+                       else {search_gender})
+            buckets = [self._buckets.get((g, b), ())
+                       for g in genders
+                       for b in range(_bucket(age_min), _bucket(age_max) + 1)]
+
+            premium, regular = [], []
+            for uid in (u for ids in buckets for u in ids):
+                if uid == viewer_id or uid in excluded:
+                    continue
+                row = self._by_user[uid]
+                if not row.get("interests_mask", 0) & interests_mask:
+                    continue
+                if not (age_min <= (row.get("age") or 0) <= age_max):
+                    continue
+                if media_only and not row.get("has_media"):
+                    continue
+                (premium if db.premium_active(row, now) else regular).append(row)
+        return premium, regular
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            return self._by_user.get(user_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"candidates": len(self._by_user), "dirty": len(self._dirty),
+                    "excluded_cached": len(self._excluded),
+                    "age_sec": int(time.monotonic() - self._built_at)}
+
+index = CandidateIndex()
+db.on_change(index.on_change)
+
+async def warm_up():
+    """Построить индекс при старте, чтобы первый «👥 Анкеты» не ждал."""
+    await adb.run(index.rebuild)
@@ -0,0 +1,393 @@
+"""
+Дисковый кеш медиа для /media/<file_id> веб-панели.
+
+Раньше каждый показ картинки — getFile и повторная закачка из Telegram
+через поток веб-сервера, а profiles.html / chat_detail.html показывают
+десятки медиа за раз. Теперь:
+
+  - file_id → file_path запоминается на MEDIA_PATH_TTL (ссылка Telegram
+    живёт не меньше часа);
+  - файл скачивается один раз в MEDIA_CACHE_DIR/<ab>/<sha1>.<ext> и дальше
+    отдаётся с диска (send_file: sendfile, ETag, Range, 304);
+  - одновременные запросы одного файла — и потоки, и воркеры gunicorn —
+    ждут одну закачку (flock на <sha1>.lock). Файлы локов без данных
+    удаляет вытеснение — только свободные, под тем же flock;
+  - размер кеша ограничен MEDIA_CACHE_MAX_MB: сверх лимита удаляются файлы,
+    к которым дольше всего не обращались (mtime обновляется при отдаче).
+
+Списки в панели показывают превью (thumb): фото, гифки и стикеры
+уменьшаются Pillow до size×size и пишутся в тот же кеш как WebP
+(без поддержки WebP в Pillow — JPEG), у видео и кружков берётся кадр
+через ffmpeg — если его нет в системе, превью у видео нет. Превью
+строятся в пуле MEDIA_THUMB_WORKERS потоков: сколько бы картинок ни
+запросила страница, CPU под ресайз занимают не больше него. Поток
+веб-сервера ждёт превью не дольше MEDIA_THUMB_WAIT — дальше ThumbPending,
+браузер получает заглушку и повторяет запрос, а превью достраивается в пуле.
+
+Адрес Bot API — TELEGRAM_API_BASE: для проверки хватает локальной заглушки,
+отвечающей на /bot<token>/getFile и /file/bot<token>/<path>.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mimetypes
+import io
+import os
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import requests
+from PIL import Image, ImageOps, features
+
+from cache import TTLCache
+from config import (
+    BOT_TOKEN, TELEGRAM_API_BASE,
+    MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_MB, MEDIA_PATH_TTL, MEDIA_MAX_FILE_MB,
+    MEDIA_THUMB_WORKERS, MEDIA_THUMB_WAIT,
+)
+
+log = logging.getLogger(__name__)
+
+# Голосовые Telegram — .oga, mimetypes их не знает
+mimetypes.add_type("audio/ogg", ".oga")
+
+THUMB_FORMAT, THUMB_EXT = ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+FFMPEG = shutil.which("ffmpeg")
+
+class MediaError(Exception):
+    """Telegram недоступен или отдал ошибку — не «файла нет»."""
+
+class ThumbPending(Exception):
+    """Превью ещё строится в пуле — спросить позже."""
+
+@dataclass(frozen=True)
+class CachedFile:
+    path: str
+    content_type: str
+    etag: str
+    size: int
+
+class MediaCache:
+    def __init__(self, root: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_MB << 20,
+                 path_ttl: float = MEDIA_PATH_TTL, api_base: str = TELEGRAM_API_BASE,
+                 token: str = BOT_TOKEN, thumb_workers: int = MEDIA_THUMB_WORKERS):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._api = f"{api_base.rstrip('/')}/bot{token}"
+        self._files = f"{api_base.rstrip('/')}/file/bot{token}"
+        self._paths = TTLCache(maxsize=10000, ttl=path_ttl)
+        self._http = requests.Session()
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None   # до первого обхода каталога неизвестно
+        self._evicting = False
+        self._thumbs = ThreadPoolExecutor(thumb_workers, thread_name_prefix="thumb")
+        self._pending: Dict[str, Future] = {}       # превью в работе, ключ — имя файла
+        self._stats = {"hits": 0, "downloads": 0, "coalesced": 0, "not_found": 0,
+                       "errors": 0, "evicted": 0, "downloaded_bytes": 0,
+                       "thumb_hits": 0, "thumbs": 0, "thumb_errors": 0, "thumb_pending": 0}
+
+    # ── Отдача ────────────────────────────────────────────────────────────────
+
+    def get(self, file_id: str) -> Optional[CachedFile]:
+        """Файл на диске; None — Telegram такого file_id не знает."""
+        key = hashlib.sha1(file_id.encode()).hexdigest()
+        cached = self._find(key)
+        if cached:
+            self._count("hits")
+            return self._touch(cached)
+
+        with self._key_lock(key):
+            # Пока ждали лок, файл мог скачать соседний поток или воркер
+            cached = self._find(key)
+            if cached:
+                self._count("coalesced")
+                return self._touch(cached)
+            cached = self._download(file_id, key)
+        if cached:
+            self._maybe_evict(cached.size)
+        return cached
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self._root, key[:2])
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        """flock на <key>.lock. Вытеснение может удалить файл лока, пока мы
+        ждали: тогда лок взят на удалённом файле — берём заново."""
+        path = os.path.join(self._dir(key), key + ".lock")
+        while True:
+            os.makedirs(self._dir(key), exist_ok=True)
+            with open(path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    current = os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    yield
+                    return
+
+    def _find(self, key: str) -> Optional[CachedFile]:
+        try:
+            names = os.listdir(self._dir(key))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(key + ".") and not name.endswith((".lock", ".part")):
+                path = os.path.join(self._dir(key), name)
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    return None   # вытеснен между listdir и stat
+                ctype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                return CachedFile(path, ctype, key, size)
+        return None
+
+    @staticmethod
+    def _touch(cached: CachedFile) -> CachedFile:
+        try:
+            os.utime(cached.path)   # для вытеснения: давно не отдавали — первым
+        except OSError:
+            pass
+        return cached
+
+    # ── Превью ────────────────────────────────────────────────────────────────
+
+    def thumb(self, file_id: str, size: int, wait: float = MEDIA_THUMB_WAIT) -> Optional[CachedFile]:
+        """Превью не больше size×size; None — у файла превью нет (голосовое,
+        документ, видео без ffmpeg) или Telegram его не знает.
+        Не готово за wait секунд — ThumbPending."""
+        key = hashlib.sha1(f"{file_id}@{size}".encode()).hexdigest()
+        cached = self._find(key)
+        if cached:
+            self._count("thumb_hits")
+            return self._touch(cached)
+        with self._lock:
+            job = self._pending.get(key)
+            if job is None:
+                job = self._pending[key] = self._thumbs.submit(self._make_thumb, file_id, key, size)
+        try:
+            return job.result(timeout=wait)
+        except FutureTimeout:
+            self._count("thumb_pending")
+            raise ThumbPending(file_id) from None
+
+    def _make_thumb(self, file_id: str, key: str, size: int) -> Optional[CachedFile]:
+        try:
+            src = self.get(file_id)
+            kind = src.content_type.split("/")[0] if src else None
+            if kind not in ("image", "video") or (kind == "video" and not FFMPEG):
+                return None
+            with self._key_lock(key):
+                cached = self._find(key)   # построил другой воркер gunicorn
+                if cached:
+                    return cached
+                final = os.path.join(self._dir(key), key + THUMB_EXT)
+                tmp = final + ".part"
+                try:
+                    with Image.open(src.path) if kind == "image" else self._frame(src.path) as img:
+                        self._save_thumb(img, tmp, size)
+                    os.replace(tmp, final)
+                except (OSError, ValueError, Image.DecompressionBombError,
+                        subprocess.SubprocessError) as e:
+                    log.warning("Превью %s: %s", file_id, e)
+                    self._count("thumb_errors")
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+                    return None
+            cached = CachedFile(final, mimetypes.guess_type(final)[0], key, os.path.getsize(final))
+            self._count("thumbs")
+            self._maybe_evict(cached.size)
+            return cached
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    @staticmethod
+    def _frame(path: str) -> Image.Image:
+        """Кадр видео: с первой секунды, у совсем коротких — первый."""
+        for offset in ("1", "0"):
+            out = subprocess.run(
+                [FFMPEG, "-v", "error", "-ss", offset, "-i", path, "-frames:v", "1",
+                 "-f", "image2pipe", "-c:v", "png", "-"],
+                capture_output=True, timeout=20, check=True,
+            ).stdout
+            if out:
+                return Image.open(io.BytesIO(out))
+        raise ValueError("в видео нет кадров")
+
+    @staticmethod
+    def _save_thumb(img: Image.Image, path: str, size: int):
+        img = ImageOps.exif_transpose(img)   # фото с телефона повёрнуты через EXIF
+        img.thumbnail((size, size))
+        if THUMB_FORMAT == "JPEG" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if THUMB_FORMAT == "WEBP" and img.has_transparency_data else "RGB")
+        img.save(path, THUMB_FORMAT, quality=75)
+
+    # ── Закачка из Telegram ───────────────────────────────────────────────────
+
+    def _file_path(self, file_id: str) -> Optional[str]:
+        def load(fid):
+            try:
+                r = self._http.get(f"{self._api}/getFile", params={"file_id": fid}, timeout=10)
+                data = r.json()
+            except (requests.RequestException, ValueError) as e:
+                raise MediaError(f"getFile: {e}") from e
+            if not data.get("ok"):
+                if r.status_code in (400, 404):
+                    return None
+                raise MediaError(f"getFile: {data.get('description')}")
+            return data["result"].get("file_path")
+        return self._paths.get(file_id, load)
+
+    def _download(self, file_id: str, key: str) -> Optional[CachedFile]:
+        for attempt in (1, 2):
+            file_path = self._file_path(file_id)
+            if not file_path:
+                self._count("not_found")
+                return None
+            ext = os.path.splitext(file_path)[1] or ".bin"
+            final = os.path.join(self._dir(key), key + ext)
+            tmp = final + ".part"
+            try:
+                with self._http.get(f"{self._files}/{file_path}", timeout=30, stream=True) as r:
+                    if r.status_code == 404:
+                        # Ссылка устарела раньше TTL — спросить file_path заново;
+                        # и свежая не находится — файла нет, а не сбой Telegram
+                        self._paths.pop(file_id)
+                        if attempt == 1:
+                            continue
+                        break
+                    r.raise_for_status()
+                    size = 0
+                    with open(tmp, "wb") as f:
+                        for chunk in r.iter_content(chunk_size=64 * 1024):
+                            size += len(chunk)
+                            if size > MEDIA_MAX_FILE_MB << 20:
+                                raise MediaError(f"файл больше {MEDIA_MAX_FILE_MB} МБ")
+                            f.write(chunk)
+                os.replace(tmp, final)
+            except (requests.RequestException, OSError, MediaError) as e:
+                self._count("errors")
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                if isinstance(e, MediaError):
+                    raise
+                raise MediaError(f"download: {e}") from e
+            with self._lock:
+                self._stats["downloads"] += 1
+                self._stats["downloaded_bytes"] += size
+            ctype = mimetypes.guess_type(final)[0] or "application/octet-stream"
+            return CachedFile(final, ctype, key, size)
+        self._count("not_found")
+        return None
+
+    # ── Вытеснение ────────────────────────────────────────────────────────────
+
+    def _maybe_evict(self, added: int):
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += added
+                if self._approx_bytes <= self._max_bytes:
+                    return
+            # Размер неизвестен или превышен — пересчитать по диску (его делят
+            # все воркеры, поэтому свой счётчик только приблизительный).
+            # Обход каталога — без self._lock, одним потоком за раз
+            if self._evicting:
+                return
+            self._evicting = True
+        total = None
+        try:
+            total = self._evict()
+        finally:
+            with self._lock:
+                if total is not None:
+                    self._approx_bytes = total
+                self._evicting = False
+
+    def _evict(self) -> int:
+        files, locks = [], []
+        for sub in os.scandir(self._root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".lock"):
+                    locks.append(e.name[:-5])
+                    continue
+                if e.name.endswith(".part"):
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, e.path))
+        total = sum(f[1] for f in files)
+        kept = {os.path.basename(f[2]).split(".")[0] for f in files}
+        if total > self._max_bytes:
+            # Удаляем до 90% лимита, чтобы не пересчитывать на каждой закачке
+            target = self._max_bytes * 9 // 10
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                kept.discard(os.path.basename(path).split(".")[0])
+                self._count("evicted")
+            log.info("Кеш медиа: вытеснено до %s МБ", total >> 20)
+        # Локи без данных: вытесненные файлы и file_id, которых нет в Telegram
+        for key in locks:
+            if key not in kept:
+                self._drop_lock(key)
+        return total
+
+    def _drop_lock(self, key: str):
+        """Удалить <key>.lock, если его никто не держит. Удаляем под своим
+        flock: кто ждал этот лок, увидит в _key_lock, что файл сменился."""
+        path = os.path.join(self._dir(key), key + ".lock")
+        try:
+            lock = open(path, "a")
+        except OSError:
+            return
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return   # идёт закачка или построение превью
+            if self._find(key) is None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+        s["thumb_queue"] = len(self._pending)
+        s["ffmpeg"] = bool(FFMPEG)
+        s["paths"] = self._paths.stats()
+        s["approx_mb"] = None if self._approx_bytes is None else round(self._approx_bytes / 2**20, 1)
+        s["max_mb"] = self._max_bytes >> 20
+        return s
+
+cache = MediaCache()
+
+get   = cache.get
+thumb = cache.thumb
+stats = cache.stats
@@ -0,0 +1,121 @@
+"""
+Проверка media_cache.py и /media/<file_id> на локальной заглушке Bot API.
+
+    python media_cache_check.py
+
+Заглушка отвечает на /bot<token>/getFile и /file/bot<token>/<path> и
+считает запросы; TELEGRAM_API_BASE и MEDIA_CACHE_DIR выставляются на неё и
+временный каталог до импорта config. Telegram и база не нужны.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+def _jpeg(w: int, h: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), "red").save(buf, "JPEG")
+    return buf.getvalue()
+
+# file_id → (file_path, содержимое); file_path без файла — ссылка «протухла»
+FILES = {
+    "photo": ("photos/file_1.jpg", _jpeg(1600, 1200)),
+    "voice": ("voice/file_2.oga", b"OggS" + b"\0" * 4000),
+    "gone":  ("photos/file_3.jpg", None),
+}
+calls = {"getFile": 0, "download": 0}
+
+class StubBotAPI(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code: int, body: bytes, ctype: str = "application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if "/getFile" in self.path:
+            calls["getFile"] += 1
+            file_id = self.path.split("file_id=", 1)[1]
+            if file_id not in FILES:
+                return self._reply(400, json.dumps({"ok": False, "description": "wrong file_id"}).encode())
+            return self._reply(200, json.dumps({"ok": True, "result": {"file_path": FILES[file_id][0]}}).encode())
+        calls["download"] += 1
+        time.sleep(0.3)   # чтобы одновременные запросы застали закачку
+        for path, data in FILES.values():
+            if self.path.endswith(path) and data is not None:
+                return self._reply(200, data, "application/octet-stream")
+        self._reply(404, b"")
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tmp = tempfile.mkdtemp(prefix="beem_media_check_")
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["MEDIA_CACHE_DIR"] = os.path.join(tmp, "cache")
+
+    import media_cache
+    import web
+
+    client = web.app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = True
+
+    # Восемь одновременных запросов — один getFile и одна закачка
+    with ThreadPoolExecutor(8) as pool:
+        items = list(pool.map(lambda _: media_cache.get("photo"), range(8)))
+    assert len({i.path for i in items}) == 1
+    assert calls == {"getFile": 1, "download": 1}, calls
+    print("coalescing: 8 запросов →", calls)
+
+    r = client.get("/media/photo")
+    assert r.status_code == 200 and "private" in r.headers["Cache-Control"]
+    etag = r.headers["ETag"]
+    assert client.get("/media/photo", headers={"If-None-Match": etag}).status_code == 304
+    r = client.get("/media/photo", headers={"Range": "bytes=0-99"})
+    assert r.status_code == 206 and len(r.data) == 100
+    assert calls["download"] == 1
+    print("proxy: 200, 304 по ETag, 206 по Range — из кеша")
+
+    assert client.get("/media/nope").status_code == 404
+    assert client.get("/media/gone").status_code == 404   # 404 и после нового getFile
+    assert client.get("/media/voice/thumb/160").status_code == 404
+    assert client.get("/media/photo/thumb/999").status_code == 404
+    print("404: неизвестный file_id, пропавший файл, превью голосового, чужой размер")
+
+    r = client.get("/media/photo/thumb/320")
+    if r.status_code == 202:   # не успели за MEDIA_THUMB_WAIT — заглушка
+        assert r.headers["Retry-After"] and r.mimetype == "image/svg+xml"
+        time.sleep(1)
+        r = client.get("/media/photo/thumb/320")
+    assert r.status_code == 200 and r.mimetype.startswith("image/")
+    assert max(Image.open(io.BytesIO(r.data)).size) == 320
+    print(f"превью: {len(r.data)} байт вместо {len(FILES['photo'][1])}")
+
+    # Вытеснение: старые файлы и свободные локи уходят, лок под flock — остаётся
+    small = media_cache.MediaCache(root=os.path.join(tmp, "small"), max_bytes=3000,
+                                   api_base=os.environ["TELEGRAM_API_BASE"], token="T")
+    assert small.get("voice") is not None
+    assert small.get("nope") is None
+    key = "ab" * 20
+    with small._key_lock(key):
+        small._evict()
+        assert os.path.exists(os.path.join(small._dir(key), key + ".lock"))
+    left = [n for d in os.listdir(small._root) for n in os.listdir(os.path.join(small._root, d))]
+    assert left == [key + ".lock"], left
+    print("вытеснение: файл сверх лимита и свободные локи удалены, занятый лок на месте")
+    print("OK", media_cache.stats())
+
+if __name__ == "__main__":
+    sys.exit(main())
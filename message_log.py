@@ -0,0 +1,133 @@
+"""
+Журнал сообщений анонимных чатов с отложенной пакетной записью.
+
+relay не ждёт INSERT перед пересылкой: message_log.add() кладёт строку
+в очередь процесса и сразу возвращается. Фоновая задача собирает пачку —
+до MESSAGE_LOG_BATCH строк или MESSAGE_LOG_FLUSH_SEC с первой строки —
+и пишет её одним многострочным INSERT (database.add_messages).
+
+  - очередь ограничена MESSAGE_LOG_MAX_QUEUE: если БД не успевает,
+    add() начинает ждать, а не копит память бесконечно;
+  - неудачная пачка повторяется MESSAGE_LOG_RETRIES раз с паузой,
+    потом отбрасывается с ошибкой в логе (счётчик dropped);
+  - stop() при остановке бота дописывает всё, что осталось в очереди.
+
+История в БД отстаёт от пересылки не больше чем на MESSAGE_LOG_FLUSH_SEC.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import async_db as db
+from config import (
+    MESSAGE_LOG_BATCH, MESSAGE_LOG_FLUSH_SEC, MESSAGE_LOG_MAX_QUEUE, MESSAGE_LOG_RETRIES,
+)
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MessageLog:
+    def __init__(self, batch: int = MESSAGE_LOG_BATCH, flush_sec: float = MESSAGE_LOG_FLUSH_SEC,
+                 max_queue: int = MESSAGE_LOG_MAX_QUEUE):
+        self._batch = batch
+        self._flush_sec = flush_sec
+        self._max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0,
+            "last_flush_ms": None, "max_flush_ms": 0, "max_depth": 0,
+        }
+
+    # ── Жизненный цикл ────────────────────────────────────────────────────────
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописать очередь и остановить фоновую задачу."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    # ── Запись ────────────────────────────────────────────────────────────────
+
+    async def add(self, chat_id: int, sender_id: int, content: str,
+                  msg_type: str = "text", file_id: str = None):
+        row = (chat_id, sender_id, content, msg_type, file_id, int(time.time()))
+        if self._task is None:
+            # Журнал не запущен (скрипты, остановка) — пишем сразу
+            await db.add_messages([row])
+            return
+        self._stats["enqueued"] += 1
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            await self._queue.put(row)
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch: List[tuple] = [first]
+            deadline = loop.time() + self._flush_sec
+            while len(batch) < self._batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        started = time.monotonic()
+        for attempt in range(MESSAGE_LOG_RETRIES + 1):
+            try:
+                await db.add_messages(batch)
+                break
+            except Exception:
+                if attempt == MESSAGE_LOG_RETRIES:
+                    self._stats["dropped"] += len(batch)
+                    log.exception("Не удалось записать %s сообщений, пачка отброшена", len(batch))
+                    return
+                self._stats["retries"] += 1
+                log.warning("Запись пачки сообщений не удалась, повтор %s", attempt + 1)
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 10))
+        ms = int((time.monotonic() - started) * 1000)
+        self._stats["written"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["last_flush_ms"] = ms
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], ms)
+
+    def stats(self) -> Dict:
+        s = dict(self._stats)
+        s["depth"] = self._queue.qsize() if self._queue else 0
+        s["avg_batch"] = round(s["written"] / s["batches"], 1) if s["batches"] else None
+        return s
+
+message_log = MessageLog()
+
+start = message_log.start
+stop  = message_log.stop
+add   = message_log.add
+stats = message_log.stats
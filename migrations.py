@@ -0,0 +1,579 @@
+"""
+Версионные миграции схемы БД.
+
+Каждая миграция — номер, название и список шагов. Применённые номера
+хранятся в таблице schema_migrations, при запуске выполняются только новые,
+строго по возрастанию. Параллельный запуск из бота и веб-панели
+сериализуется advisory-локом.
+
+Шаги бывают двух видов:
+  - строка SQL — выполняется в общей транзакции миграции;
+  - Index(...) — CREATE INDEX CONCURRENTLY вне транзакции, таблицу не блокирует.
+    Недостроенный (INVALID) индекс от прерванного запуска пересоздаётся;
+  - DropIndex(...) — DROP INDEX CONCURRENTLY, тоже вне транзакции.
+
+Запуск вручную:
+    python migrations.py             — применить новые миграции
+    python migrations.py --status    — что применено, что нет
+    python migrations.py --dry-run   — план + EXPLAIN горячих запросов до/после
+"""
+
+import argparse
+import difflib
+import logging
+import time
+from typing import List, Optional, Union
+
+import database as db
+
+log = logging.getLogger(__name__)
+
+_LOCK_KEY = 0x6265656D  # "beem"
+
+class Index:
+    def __init__(self, name: str, table: str, columns: str, where: Optional[str] = None):
+        self.name    = name
+        self.table   = table
+        self.columns = columns
+        self.where   = where
+
+    def sql(self, concurrently: bool = True) -> str:
+        q = (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+             f"{self.name} ON {self.table} ({self.columns})")
+        if self.where:
+            q += f" WHERE {self.where}"
+        return q
+
+class DropIndex:
+    def __init__(self, name: str):
+        self.name = name
+
+    def sql(self, concurrently: bool = True) -> str:
+        return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {self.name}"
+
+class Migration:
+    def __init__(self, version: int, name: str, steps: List[Union[str, Index, DropIndex]]):
+        self.version = version
+        self.name    = name
+        self.steps   = steps
+
+    @property
+    def concurrent(self) -> bool:
+        return any(isinstance(s, (Index, DropIndex)) for s in self.steps)
+
+def _interests_backfill(keys) -> str:
+    """UPDATE, переводящий users.interests ('games,music') в битовую маску.
+    keys — порядок интересов на момент миграции (бит = позиция)."""
+    bits = " | ".join(
+        f"(CASE WHEN '{k}' = ANY(string_to_array(interests, ',')) THEN {1 << i} ELSE 0 END)"
+        for i, k in enumerate(keys)
+    )
+    return f"UPDATE users SET interests_mask = {bits} WHERE interests IS NOT NULL AND interests <> ''"
+
+# ── Миграции ──────────────────────────────────────────────────────────────────
+# Только добавлять в конец. Применённую миграцию не менять — написать новую.
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", [
+        """CREATE TABLE IF NOT EXISTS users (
+            user_id          BIGINT PRIMARY KEY,
+            username         TEXT,
+            name             TEXT,
+            age              INTEGER,
+            gender           TEXT,
+            interests        TEXT,
+            search_gender    TEXT DEFAULT 'any',
+            search_age_min   INTEGER DEFAULT 0,
+            search_age_max   INTEGER DEFAULT 99,
+            search_media_only INTEGER DEFAULT 0,
+            registered       INTEGER DEFAULT 0,
+            banned           INTEGER DEFAULT 0,
+            ban_until        BIGINT,
+            ban_reason       TEXT,
+            created_at       BIGINT DEFAULT 0,
+            premium          INTEGER DEFAULT 0,
+            premium_until    BIGINT
+        )""",
+        # Колонки, добавленные после первых деплоев
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS search_age_min INTEGER DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS search_age_max INTEGER DEFAULT 99",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS search_media_only INTEGER DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS premium INTEGER DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS premium_until BIGINT",
+        """CREATE TABLE IF NOT EXISTS profiles (
+            id          SERIAL PRIMARY KEY,
+            user_id     BIGINT,
+            description TEXT,
+            created_at  BIGINT,
+            active      INTEGER DEFAULT 1
+        )""",
+        """CREATE TABLE IF NOT EXISTS profile_media (
+            id          SERIAL PRIMARY KEY,
+            profile_id  INTEGER,
+            file_id     TEXT,
+            media_type  TEXT,
+            created_at  BIGINT
+        )""",
+        """CREATE TABLE IF NOT EXISTS chats (
+            id          SERIAL PRIMARY KEY,
+            profile_id  INTEGER,
+            sender_id   BIGINT,
+            target_id   BIGINT,
+            created_at  BIGINT,
+            closed      INTEGER DEFAULT 0
+        )""",
+        "ALTER TABLE chats ADD COLUMN IF NOT EXISTS closed INTEGER DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS messages (
+            id          SERIAL PRIMARY KEY,
+            chat_id     INTEGER,
+            sender_id   BIGINT,
+            content     TEXT,
+            msg_type    TEXT DEFAULT 'text',
+            file_id     TEXT,
+            created_at  BIGINT,
+            read        INTEGER DEFAULT 0
+        )""",
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS read INTEGER DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS reports (
+            id          SERIAL PRIMARY KEY,
+            chat_id     INTEGER,
+            reporter_id BIGINT,
+            reported_id BIGINT,
+            reason      TEXT,
+            status      TEXT DEFAULT 'new',
+            created_at  BIGINT
+        )""",
+        """CREATE TABLE IF NOT EXISTS blocks (
+            id          SERIAL PRIMARY KEY,
+            blocker_id  BIGINT,
+            blocked_id  BIGINT,
+            created_at  BIGINT,
+            UNIQUE(blocker_id, blocked_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS payments (
+            id          SERIAL PRIMARY KEY,
+            user_id     BIGINT,
+            plan        TEXT,
+            method      TEXT,
+            amount      TEXT,
+            created_at  BIGINT
+        )""",
+    ]),
+
+    Migration(2, "hot query indexes", [
+        # История чата и последнее сообщение (get_chat_messages, админка)
+        Index("idx_messages_chat_created", "messages", "chat_id, created_at"),
+        # Счётчик непрочитанных в get_user_chats
+        Index("idx_messages_unread", "messages", "chat_id, sender_id", where="read = 0"),
+        # Чаты пользователя (get_user_chats, исключения в подборе анкет)
+        Index("idx_chats_sender", "chats", "sender_id"),
+        Index("idx_chats_target", "chats", "target_id"),
+        # create_chat: есть ли уже чат по этой анкете
+        Index("idx_chats_profile_sender", "chats", "profile_id, sender_id"),
+        # Активная анкета пользователя и подбор анкет
+        Index("idx_profiles_user_active", "profiles", "user_id", where="active = 1"),
+        Index("idx_profiles_active_created", "profiles", "created_at DESC", where="active = 1"),
+        # Кулдаун: MAX(created_at) по пользователю
+        Index("idx_profiles_user_created", "profiles", "user_id, created_at"),
+        Index("idx_profile_media_profile", "profile_media", "profile_id, id"),
+        # (blocker_id, blocked_id) уже покрыт UNIQUE, нужен обратный
+        Index("idx_blocks_blocked", "blocks", "blocked_id, blocker_id"),
+        Index("idx_reports_status_created", "reports", "status, created_at DESC"),
+        Index("idx_users_registered_created", "users", "created_at DESC", where="registered = 1"),
+        Index("idx_payments_created", "payments", "created_at DESC"),
+    ]),
+
+    Migration(3, "interests bitmask", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS interests_mask INTEGER NOT NULL DEFAULT 0",
+        _interests_backfill(("games", "flirt", "adult", "anime", "talk",
+                             "music", "movies", "travel", "photo", "sport")),
+    ]),
+
+    Migration(4, "profiles.has_visual_media", [
+        # Есть ли у анкеты фото/видео — ставит add_profile_media в той же транзакции
+        "ALTER TABLE profiles ADD COLUMN IF NOT EXISTS has_visual_media INTEGER NOT NULL DEFAULT 0",
+        """UPDATE profiles p SET has_visual_media = 1
+           WHERE EXISTS (SELECT 1 FROM profile_media pm
+                         WHERE pm.profile_id = p.id AND pm.media_type IN ('photo','video'))""",
+    ]),
+
+    Migration(5, "expiry sweep indexes", [
+        # expire_bans_and_premium: только строки с выставленным сроком
+        Index("idx_users_ban_until", "users", "ban_until", where="banned = 1 AND ban_until IS NOT NULL"),
+        Index("idx_users_premium_until", "users", "premium_until",
+              where="premium = 1 AND premium_until IS NOT NULL"),
+    ]),
+
+    Migration(6, "chat unread counters", [
+        # Непрочитанные для каждого участника чата ведут add_message(s) / mark_messages_read
+        "ALTER TABLE chats ADD COLUMN IF NOT EXISTS sender_unread INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE chats ADD COLUMN IF NOT EXISTS target_unread INTEGER NOT NULL DEFAULT 0",
+        """UPDATE chats c SET
+               sender_unread = (SELECT COUNT(*) FROM messages m
+                                WHERE m.chat_id = c.id AND m.sender_id <> c.sender_id AND m.read = 0),
+               target_unread = (SELECT COUNT(*) FROM messages m
+                                WHERE m.chat_id = c.id AND m.sender_id <> c.target_id AND m.read = 0)""",
+    ]),
+
+    Migration(7, "broadcast jobs", [
+        # Задания рассылки: курсор по user_id и счётчики переживают рестарт бота
+        """CREATE TABLE IF NOT EXISTS broadcasts (
+            id            SERIAL PRIMARY KEY,
+            admin_id      BIGINT,
+            text          TEXT,
+            status        TEXT NOT NULL DEFAULT 'running',
+            cursor_id     BIGINT NOT NULL DEFAULT 0,
+            total         INTEGER NOT NULL DEFAULT 0,
+            sent          INTEGER NOT NULL DEFAULT 0,
+            failed        INTEGER NOT NULL DEFAULT 0,
+            blocked       INTEGER NOT NULL DEFAULT 0,
+            progress_chat BIGINT,
+            progress_msg  BIGINT,
+            created_at    BIGINT,
+            updated_at    BIGINT,
+            finished_at   BIGINT
+        )""",
+        # Заблокировал бота — рассылки его пропускают, пока он снова не напишет
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS bot_blocked INTEGER NOT NULL DEFAULT 0",
+    ]),
+
+    Migration(8, "deadlines", [
+        # Таймауты игр (deadlines.py): один срок на (вид, ключ), переживает рестарт
+        """CREATE TABLE IF NOT EXISTS deadlines (
+            kind    TEXT NOT NULL,
+            key     BIGINT NOT NULL,
+            due_at  DOUBLE PRECISION NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}',
+            PRIMARY KEY (kind, key)
+        )""",
+        Index("idx_deadlines_due", "deadlines", "due_at"),
+    ]),
+
+    Migration(9, "game tables", [
+        # Раньше создавались в create_kmn_game / create_rps_game на каждую игру
+        """CREATE TABLE IF NOT EXISTS kmn_games (
+            id              SERIAL PRIMARY KEY,
+            chat_id         INTEGER NOT NULL,
+            initiator_id    BIGINT NOT NULL,
+            opponent_id     BIGINT NOT NULL,
+            wins_needed     INTEGER DEFAULT 3,
+            initiator_wins  INTEGER DEFAULT 0,
+            opponent_wins   INTEGER DEFAULT 0,
+            status          TEXT DEFAULT 'waiting_stake_initiator',
+            initiator_stake_file_id   TEXT,
+            initiator_stake_type      TEXT,
+            opponent_stake_file_id    TEXT,
+            opponent_stake_type       TEXT,
+            current_round   INTEGER DEFAULT 1,
+            initiator_move  TEXT,
+            opponent_move   TEXT,
+            created_at      BIGINT,
+            updated_at      BIGINT
+        )""",
+        """CREATE TABLE IF NOT EXISTS rps_games (
+            id                   SERIAL PRIMARY KEY,
+            chat_id              INTEGER,
+            initiator_id         BIGINT,
+            opponent_id          BIGINT,
+            initiator_stake_type TEXT,
+            initiator_stake_fid  TEXT,
+            opponent_stake_type  TEXT,
+            opponent_stake_fid   TEXT,
+            wins_to              INTEGER DEFAULT 3,
+            initiator_wins       INTEGER DEFAULT 0,
+            opponent_wins        INTEGER DEFAULT 0,
+            status               TEXT DEFAULT 'waiting_stake',
+            initiator_move       TEXT,
+            opponent_move        TEXT,
+            created_at           BIGINT
+        )""",
+        # get_active_kmn_by_chat / get_active_rps_by_chat
+        Index("idx_kmn_games_chat_status", "kmn_games", "chat_id, status"),
+        Index("idx_rps_games_chat_status", "rps_games", "chat_id, status"),
+    ]),
+
+    Migration(10, "generic games", [
+        # Все мини-игры в одной таблице: kind — правила (game_rules.py),
+        # state — счёт, ходы и ставки
+        """CREATE TABLE IF NOT EXISTS games (
+            id            SERIAL PRIMARY KEY,
+            kind          TEXT NOT NULL,
+            chat_id       INTEGER NOT NULL,
+            initiator_id  BIGINT NOT NULL,
+            opponent_id   BIGINT NOT NULL,
+            status        TEXT NOT NULL,
+            current_round INTEGER NOT NULL DEFAULT 1,
+            state         JSONB NOT NULL DEFAULT '{}',
+            created_at    BIGINT,
+            updated_at    BIGINT
+        )""",
+        # Таблица новая и пока пустая — можно без CONCURRENTLY, в транзакции переноса
+        "CREATE INDEX IF NOT EXISTS idx_games_chat_status ON games (chat_id, status)",
+        # kmn_games переносятся с теми же id: на них ссылаются кнопки и сроки
+        """INSERT INTO games (id, kind, chat_id, initiator_id, opponent_id, status,
+                              current_round, state, created_at, updated_at)
+           SELECT id, 'kmn', chat_id, initiator_id, opponent_id, status, current_round,
+                  jsonb_build_object(
+                      'wins_needed', wins_needed,
+                      'wins',   jsonb_build_array(initiator_wins, opponent_wins),
+                      'moves',  jsonb_build_array(initiator_move, opponent_move),
+                      'stakes', jsonb_build_array(
+                          CASE WHEN initiator_stake_file_id IS NULL THEN NULL ELSE
+                               jsonb_build_object('type', initiator_stake_type,
+                                                  'file_id', initiator_stake_file_id) END,
+                          CASE WHEN opponent_stake_file_id IS NULL THEN NULL ELSE
+                               jsonb_build_object('type', opponent_stake_type,
+                                                  'file_id', opponent_stake_file_id) END)),
+                  created_at, updated_at
+           FROM kmn_games
+           ON CONFLICT (id) DO NOTHING""",
+        "SELECT setval(pg_get_serial_sequence('games', 'id'), GREATEST((SELECT MAX(id) FROM games), 1))",
+        # rps_games (роутер не был подключён) — история с новыми id
+        """INSERT INTO games (kind, chat_id, initiator_id, opponent_id, status,
+                              current_round, state, created_at, updated_at)
+           SELECT 'rps', COALESCE(chat_id, 0), initiator_id, opponent_id,
+                  CASE status
+                      WHEN 'waiting_stake' THEN 'waiting_stake_opponent'
+                      WHEN 'waiting_move' THEN
+                          CASE WHEN initiator_move IS NULL AND opponent_move IS NULL THEN 'waiting_move_both'
+                               WHEN initiator_move IS NULL THEN 'waiting_move_initiator'
+                               ELSE 'waiting_move_opponent' END
+                      ELSE status END,
+                  1,
+                  jsonb_build_object(
+                      'wins_needed', wins_to,
+                      'wins',   jsonb_build_array(initiator_wins, opponent_wins),
+                      'moves',  jsonb_build_array(initiator_move, opponent_move),
+                      'stakes', jsonb_build_array(
+                          CASE WHEN initiator_stake_fid IS NULL THEN NULL ELSE
+                               jsonb_build_object('type', initiator_stake_type,
+                                                  'file_id', initiator_stake_fid) END,
+                          CASE WHEN opponent_stake_fid IS NULL THEN NULL ELSE
+                               jsonb_build_object('type', opponent_stake_type,
+                                                  'file_id', opponent_stake_fid) END)),
+                  created_at, created_at
+           FROM rps_games""",
+        # Сроки КМН продолжают работать под общим видом "game"; у rps id сменились
+        "UPDATE deadlines SET kind='game' WHERE kind='kmn'",
+        "DELETE FROM deadlines WHERE kind='rps'",
+    ]),
+
+    Migration(11, "admin keyset pages", [
+        # Страницы админки: WHERE (created_at, id) < курсор ORDER BY created_at DESC, id DESC
+        Index("idx_users_registered_keyset", "users", "created_at DESC, user_id DESC",
+              where="registered = 1"),
+        Index("idx_profiles_active_keyset", "profiles", "created_at DESC, id DESC", where="active = 1"),
+        Index("idx_chats_created_keyset", "chats", "created_at DESC, id DESC"),
+        Index("idx_reports_status_keyset", "reports", "status, created_at DESC, id DESC"),
+        Index("idx_reports_created_keyset", "reports", "created_at DESC, id DESC"),
+        # Поиск по началу имени / @username
+        Index("idx_users_name_prefix", "users", "lower(name) text_pattern_ops", where="registered = 1"),
+        Index("idx_users_username_prefix", "users", "lower(username) text_pattern_ops",
+              where="registered = 1"),
+        # Покрыты новыми ключевыми индексами
+        DropIndex("idx_users_registered_created"),
+        DropIndex("idx_profiles_active_created"),
+        DropIndex("idx_reports_status_created"),
+    ]),
+
+    Migration(12, "drop messages unread index", [
+        # messages.read больше не пишется (миграция 6) — индекс по нему не нужен.
+        # Отдельно от 6: обычный DROP INDEX держал бы ACCESS EXCLUSIVE на messages
+        DropIndex("idx_messages_unread"),
+    ]),
+
+    Migration(13, "admin keyset pages: NULL created_at", [
+        # _keyset_page сортирует по COALESCE(created_at, 0): у старых строк
+        # created_at NULL. Индексы миграции 11 по голой колонке ему не подходят
+        Index("idx_users_registered_page", "users", "(COALESCE(created_at, 0)) DESC, user_id DESC",
+              where="registered = 1"),
+        Index("idx_profiles_active_page", "profiles", "(COALESCE(created_at, 0)) DESC, id DESC",
+              where="active = 1"),
+        Index("idx_chats_created_page", "chats", "(COALESCE(created_at, 0)) DESC, id DESC"),
+        Index("idx_reports_status_page", "reports", "status, (COALESCE(created_at, 0)) DESC, id DESC"),
+        Index("idx_reports_created_page", "reports", "(COALESCE(created_at, 0)) DESC, id DESC"),
+        DropIndex("idx_users_registered_keyset"),
+        DropIndex("idx_profiles_active_keyset"),
+        DropIndex("idx_chats_created_keyset"),
+        DropIndex("idx_reports_status_keyset"),
+        DropIndex("idx_reports_created_keyset"),
+    ]),
+]
+
+# Горячие запросы для --dry-run: EXPLAIN до и после индексов.
+# Параметры — произвольные, важен только план.
+HOT_QUERIES = [
+    ("get_chat_messages",
+     "SELECT * FROM (SELECT * FROM messages WHERE chat_id=1 ORDER BY created_at DESC LIMIT 100) sub "
+     "ORDER BY created_at ASC"),
+    ("get_user_chats",
+     "SELECT c.*, CASE WHEN c.sender_id=1 THEN c.sender_unread ELSE c.target_unread END "
+     "FROM chats c WHERE (c.sender_id=1 OR c.target_id=1) AND c.closed=0 ORDER BY c.id DESC"),
+    ("get_active_profile",
+     "SELECT * FROM profiles WHERE user_id=1 AND active=1"),
+    ("get_profile_media",
+     "SELECT * FROM profile_media WHERE profile_id=1 ORDER BY id"),
+    ("blocks by blocked_id",
+     "SELECT blocker_id FROM blocks WHERE blocked_id=1"),
+    ("page_reports(new)",
+     "SELECT * FROM reports r WHERE r.status='new' "
+     "AND (COALESCE(r.created_at, 0), r.id) < (2000000000, 1) "
+     "ORDER BY COALESCE(r.created_at, 0) DESC, r.id DESC LIMIT 51"),
+    ("page_users(search)",
+     "SELECT * FROM users WHERE registered=1 AND user_id IN (SELECT user_id FROM users "
+     "WHERE registered=1 AND (lower(name) LIKE 'ann%' OR lower(username) LIKE 'ann%')) "
+     "ORDER BY COALESCE(created_at, 0) DESC, user_id DESC LIMIT 51"),
+    ("get_active_game_by_chat",
+     "SELECT * FROM games WHERE chat_id=1 AND status NOT IN ('finished','cancelled') "
+     "ORDER BY id DESC LIMIT 1"),
+]
+
+# ── Раннер ────────────────────────────────────────────────────────────────────
+
+def _ensure_table(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+        version     INTEGER PRIMARY KEY,
+        name        TEXT,
+        applied_at  BIGINT
+    )""")
+
+def _applied(c) -> set:
+    c.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in c.fetchall()}
+
+def pending() -> List[Migration]:
+    with db.connection() as conn:
+        c = conn.cursor()
+        _ensure_table(c)
+        done = _applied(c)
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version not in done]
+
+def schema_version() -> int:
+    with db.connection() as conn:
+        c = conn.cursor()
+        _ensure_table(c)
+        c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        return c.fetchone()[0]
+
+def latest_version() -> int:
+    return max(m.version for m in MIGRATIONS)
+
+def _drop_invalid_index(c, name: str):
+    c.execute("""
+        SELECT i.indisvalid FROM pg_class cl JOIN pg_index i ON i.indexrelid = cl.oid
+        WHERE cl.relname = %s
+    """, (name,))
+    row = c.fetchone()
+    if row and not row[0]:
+        log.warning("Индекс %s недостроен (INVALID) — пересоздаю", name)
+        c.execute(DropIndex(name).sql())
+
+def _apply(conn, m: Migration):
+    c = conn.cursor()
+    started = time.monotonic()
+    if m.concurrent:
+        # CONCURRENTLY нельзя внутри транзакции
+        conn.autocommit = True
+        for step in m.steps:
+            if isinstance(step, Index):
+                _drop_invalid_index(c, step.name)
+                c.execute(step.sql(concurrently=True))
+            elif isinstance(step, DropIndex):
+                c.execute(step.sql(concurrently=True))
+            else:
+                c.execute(step)
+        c.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s,%s,%s)",
+                  (m.version, m.name, int(time.time())))
+        conn.autocommit = False
+    else:
+        for step in m.steps:
+            c.execute(step)
+        c.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s,%s,%s)",
+                  (m.version, m.name, int(time.time())))
+        conn.commit()
+    log.info("Миграция %s «%s» применена за %.2f с", m.version, m.name, time.monotonic() - started)
+
+def migrate() -> int:
+    """Применить все новые миграции. Возвращает текущую версию схемы."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+        conn.commit()
+        try:
+            _ensure_table(c)
+            conn.commit()
+            done = _applied(c)
+            conn.commit()
+            for m in sorted(MIGRATIONS, key=lambda m: m.version):
+                if m.version in done:
+                    continue
+                try:
+                    _apply(conn, m)
+                except Exception:
+                    conn.autocommit = False
+                    conn.rollback()
+                    log.exception("Миграция %s «%s» не применена", m.version, m.name)
+                    raise
+                done.add(m.version)
+        finally:
+            conn.autocommit = False
+            conn.rollback()
+            c.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    return max(done) if done else 0
+
+def _explain(c, sql: str) -> List[str]:
+    c.execute("EXPLAIN " + sql)
+    return [r[0] for r in c.fetchall()]
+
+def dry_run() -> str:
+    """План применения и EXPLAIN горячих запросов до/после — без изменений в БД."""
+    todo = pending()
+    out  = []
+    if not todo:
+        return "Схема актуальна, новых миграций нет."
+    for m in todo:
+        out.append(f"── {m.version}: {m.name}{' (CONCURRENTLY)' if m.concurrent else ''}")
+        for step in m.steps:
+            out.append("   " + (step.sql() if isinstance(step, (Index, DropIndex))
+                                 else " ".join(step.split())) + ";")
+
+    # Всё применяем в одной транзакции без CONCURRENTLY и откатываем, в том же
+    # порядке, что migrate(). На пустой базе «до» — после таблиц baseline
+    # (иначе нечего EXPLAIN-ить), но до её индексов и остальных миграций
+    steps = [s for m in todo for s in m.steps]
+    head = 0
+    if todo[0].version == MIGRATIONS[0].version:
+        base = todo[0].steps
+        while head < len(base) and isinstance(base[head], str):
+            head += 1
+    with db.connection() as conn:
+        c = conn.cursor()
+        for step in steps[:head]:
+            c.execute(step)
+        before = {name: _explain(c, sql) for name, sql in HOT_QUERIES}
+        for step in steps[head:]:
+            c.execute(step if isinstance(step, str) else step.sql(concurrently=False))
+        after = {name: _explain(c, sql) for name, sql in HOT_QUERIES}
+        conn.rollback()
+
+    for name, _ in HOT_QUERIES:
+        diff = list(difflib.unified_diff(before[name], after[name], "до", "после", lineterm=""))
+        out.append(f"\n── EXPLAIN {name}")
+        out.extend(diff[2:] if diff else ["   (план не изменился)"])
+    return "\n".join(out)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Миграции схемы Beem")
+    parser.add_argument("--dry-run", action="store_true", help="показать план и EXPLAIN, ничего не меняя")
+    parser.add_argument("--status",  action="store_true", help="показать применённые и ожидающие миграции")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        print(dry_run())
+    elif args.status:
+        todo = {m.version for m in pending()}
+        for m in sorted(MIGRATIONS, key=lambda m: m.version):
+            print(f"{'  ' if m.version in todo else '✅'} {m.version}: {m.name}")
+    else:
+        print(f"Версия схемы: {migrate()}")
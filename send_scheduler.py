@@ -0,0 +1,202 @@
+"""
+Планировщик исходящих сообщений бота.
+
+Telegram пускает ~30 сообщений в секунду на бота и ~1 в секунду в один
+чат; сверх этого отвечает 429 (RetryAfter), и при рассылке бот вставал
+целиком. Все запросы send*/copy/forward проходят через SendLimitMiddleware
+(подключается к bot.session в bot.py), поэтому хендлеры ничего не меняют:
+
+  - token bucket на чат: запросы в один чат ждут своей очереди, другие
+    чаты при этом не тормозят;
+  - общий token bucket раздаётся по приоритету: HIGH (пересылка в чатах)
+    раньше NORMAL (ответы хендлеров) раньше BULK (рассылки);
+  - на RetryAfter выдача приостанавливается на указанное время, запрос
+    повторяется (до SEND_MAX_RETRIES раз);
+  - ожидающих не больше SEND_MAX_QUEUE, дальше отправитель ждёт места.
+
+Приоритет задаётся контекстом вокруг отправок:
+
+    with send_scheduler.priority(send_scheduler.BULK):
+        await bot.send_message(...)
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Hashable, List, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import (
+    SEND_GLOBAL_RATE, SEND_PER_CHAT_RATE, SEND_PER_CHAT_BURST, SEND_MAX_QUEUE, SEND_MAX_RETRIES,
+)
+
+HIGH, NORMAL, BULK = 0, 1, 2
+_NAMES = {HIGH: "high", NORMAL: "normal", BULK: "bulk"}
+
+_priority: ContextVar[int] = ContextVar("send_priority", default=NORMAL)
+
+@contextmanager
+def priority(level: int):
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class SendScheduler:
+    def __init__(self, rate: float = SEND_GLOBAL_RATE, per_chat_rate: float = SEND_PER_CHAT_RATE,
+                 per_chat_burst: float = SEND_PER_CHAT_BURST, max_queue: int = SEND_MAX_QUEUE):
+        self._global = _Bucket(rate, rate)
+        self._per_chat_rate = per_chat_rate
+        self._per_chat_burst = per_chat_burst
+        self._max_queue = max_queue
+        self._chats: Dict[Hashable, _Bucket] = {}
+        self._chat_locks: Dict[Hashable, asyncio.Lock] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "granted": {n: 0 for n in _NAMES.values()},
+            "throttled": 0, "retry_after": 0, "last_retry_after": None,
+            "wait_ms_total": 0, "max_wait_ms": 0,
+        }
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._slots = asyncio.Semaphore(self._max_queue)
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    # ── Выдача ────────────────────────────────────────────────────────────────
+
+    async def acquire(self, chat_id: Optional[Hashable], level: int = NORMAL):
+        self._ensure_started()
+        started = time.monotonic()
+        async with self._slots:
+            if chat_id is not None:
+                await self._acquire_chat(chat_id)
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (level, next(self._seq), fut))
+            self._wakeup.set()
+            await fut
+        waited = int((time.monotonic() - started) * 1000)
+        self._stats["granted"][_NAMES.get(level, "normal")] += 1
+        self._stats["wait_ms_total"] += waited
+        self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited)
+        if waited >= 50:
+            self._stats["throttled"] += 1
+
+    async def _acquire_chat(self, chat_id: Hashable):
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            if len(self._chat_locks) > 10000:
+                self._prune_chats()
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+            self._chats[chat_id] = _Bucket(self._per_chat_rate, self._per_chat_burst)
+        async with lock:
+            bucket = self._chats[chat_id]
+            delay = bucket.wait_time(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                bucket.wait_time(time.monotonic())
+            bucket.take()
+
+    def _prune_chats(self):
+        # Чаты, где никто не ждёт и ведро уже полное, ничего не помнят
+        now = time.monotonic()
+        idle = [k for k, lock in self._chat_locks.items()
+                if not lock.locked() and self._chats[k].wait_time(now) == 0
+                and self._chats[k].tokens >= self._per_chat_burst]
+        for k in idle:
+            del self._chat_locks[k]
+            del self._chats[k]
+
+    async def _run(self):
+        while True:
+            while self._heap and self._heap[0][2].done():
+                heapq.heappop(self._heap)   # отправитель отменил ожидание
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._global.wait_time(now))
+            if delay <= 0:
+                _, _, fut = heapq.heappop(self._heap)
+                self._global.take()
+                fut.set_result(None)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def pause(self, seconds: float):
+        """Telegram ответил RetryAfter: не выдавать ничего seconds секунд."""
+        self._stats["retry_after"] += 1
+        self._stats["last_retry_after"] = seconds
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict:
+        s = dict(self._stats, granted=dict(self._stats["granted"]))
+        total = sum(s["granted"].values())
+        s["avg_wait_ms"] = round(s["wait_ms_total"] / total, 1) if total else None
+        s["queued"] = len(self._heap)
+        s["chats_tracked"] = len(self._chats)
+        s["paused_sec"] = max(0.0, round(self._paused_until - time.monotonic(), 1))
+        return s
+
+scheduler = SendScheduler()
+stats = scheduler.stats
+
+# ── Middleware для bot.session ────────────────────────────────────────────────
+
+_UNLIMITED = {"SendChatAction"}
+_EXTRA = {"CopyMessage", "CopyMessages", "ForwardMessage", "ForwardMessages"}
+
+def _is_send(method) -> bool:
+    name = type(method).__name__
+    return (name.startswith("Send") and name not in _UNLIMITED) or name in _EXTRA
+
+class SendLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, sched: SendScheduler = scheduler):
+        self._sched = sched
+
+    async def __call__(self, make_request, bot, method):
+        if not _is_send(method):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(SEND_MAX_RETRIES + 1):
+            await self._sched.acquire(chat_id, _priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == SEND_MAX_RETRIES:
+                    raise
+                self._sched.pause(e.retry_after)
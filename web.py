@@ -1,23 +1,26 @@
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify, abort, Response
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, abort, send_file
 import database as db
 import time
 import os
-import requests as req
-from config import ADMIN_PASSWORD, ADMIN_SECRET, INTERESTS_DISPLAY, BAN_DURATIONS, BOT_TOKEN
+import re
+import interests
+import media_cache
+from config import (ADMIN_PASSWORD, ADMIN_SECRET, ADMIN_PAGE_SIZE, BAN_DURATIONS, MEDIA_MAX_AGE,
+                    MEDIA_THUMB_SIZES, STATS_CACHE_TTL)
 
 app = Flask(__name__)
 app.secret_key = ADMIN_SECRET
 
 GENDER_MAP = {"male": "Парень", "female": "Девушка", "other": "Другое"}
 SGENDER_MAP = {"male": "Парней", "female": "Девушек", "any": "Всех"}
+BROADCAST_STATUS = {"running": "▶️ Идёт", "paused": "⏸ Пауза", "cancelled": "⏹ Отменена", "done": "✅ Готово"}
 
 def fmt_time(ts):
     if not ts: return "—"
     return time.strftime("%d.%m.%Y %H:%M", time.localtime(ts))
 
-def fmt_interests(s):
-    if not s: return "—"
-    return ", ".join(INTERESTS_DISPLAY.get(i, i) for i in s.split(",") if i)
+def fmt_interests(mask):
+    return interests.display(mask)
 
 def require_login(f):
     from functools import wraps
@@ -27,6 +30,22 @@ def require_login(f):
         return f(*a, **kw)
     return wrap
 
+# Списки листаются по курсору (database._keyset_page): ?after=<курсор>&q=&status=
+_CURSOR_RE = re.compile(r"^\d+_\d+$")
+
+def page_args():
+    after = request.args.get("after", "")
+    return (after if _CURSOR_RE.match(after) else None,
+            request.args.get("q", "").strip()[:64],
+            request.args.get("status", ""))
+
+def pager(cursor, q, status):
+    """Ссылки «в начало» / «дальше» с теми же фильтрами."""
+    filters = {k: v for k, v in (("q", q), ("status", status)) if v}
+    return dict(q=q, status=status,
+                first_url=url_for(request.endpoint, **filters) if request.args.get("after") else None,
+                next_url=url_for(request.endpoint, after=cursor, **filters) if cursor else None)
+
 # ── Auth ───────────────────────────────────────────────────────────────────────
 
 @app.route("/login", methods=["GET", "POST"])
@@ -49,49 +68,47 @@ def logout():
 @app.route("/")
 @require_login
 def dashboard():
-    users = db.get_all_users()
-    chats = db.get_all_chats_admin()
-    profiles = db.get_active_profiles_admin()
-    reports = db.get_reports("new")
-    conn = db.get_conn()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM messages")
-    msg_count = c.fetchone()[0]
-    conn.close()
+    counts = db.get_admin_counts()
     return render_template("dashboard.html",
-        users_count=len(users), chats_count=len(chats),
-        profiles_count=len(profiles), reports_count=len(reports),
-        messages_count=msg_count
+        users_count=counts["users"], chats_count=counts["chats"],
+        profiles_count=counts["profiles"], reports_count=counts["reports"],
+        messages_count=counts["messages"]
     )
 
 @app.route("/api/stats")
 @require_login
 def api_stats():
-    users = db.get_all_users()
-    chats = db.get_all_chats_admin()
-    profiles = db.get_active_profiles_admin()
-    reports = db.get_reports("new")
-    conn = db.get_conn()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM messages")
-    msg_count = c.fetchone()[0]
-    conn.close()
-    return jsonify(users=len(users), chats=len(chats),
-                   profiles=len(profiles), reports=len(reports), messages=msg_count)
+    # Счётчики кешируются в процессе (STATS_CACHE_TTL) — опрос из нескольких
+    # вкладок не умножает запросы к БД
+    resp = jsonify(db.get_admin_counts())
+    resp.headers["Cache-Control"] = f"private, max-age={int(STATS_CACHE_TTL)}"
+    return resp
+
+@app.route("/api/db_pool")
+@require_login
+def api_db_pool():
+    return jsonify(db.pool_stats())
+
+@app.route("/api/cache")
+@require_login
+def api_cache():
+    return jsonify(dict(db.cache_stats(), media=media_cache.stats()))
 
 # ── Users ──────────────────────────────────────────────────────────────────────
 
 @app.route("/users")
 @require_login
 def users():
-    all_users = db.get_all_users()
+    after, q, status = page_args()
+    all_users, cursor = db.page_users(after, ADMIN_PAGE_SIZE, q, status)
     for u in all_users:
         u["gender_display"] = GENDER_MAP.get(u.get("gender"), "—")
-        u["interests_display"] = fmt_interests(u.get("interests"))
+        u["interests_display"] = fmt_interests(u.get("interests_mask"))
         u["created_display"] = fmt_time(u.get("created_at"))
-        u["ban_display"] = "🔒 Забанен" if u.get("banned") else "✅ Активен"
+        u["ban_display"] = "🔒 Забанен" if db.ban_active(u) else "✅ Активен"
         u["ban_until_display"] = fmt_time(u.get("ban_until")) if u.get("ban_until") else "—"
-    return render_template("users.html", users=all_users)
+    return render_template("users.html", users=all_users, total=db.get_admin_counts()["users"],
+                           **pager(cursor, q, status))
 
 @app.route("/user/<int:user_id>")
 @require_login
@@ -99,7 +116,7 @@ def user_detail(user_id):
     u = db.get_user(user_id)
     if not u: abort(404)
     u["gender_display"] = GENDER_MAP.get(u.get("gender"), "—")
-    u["interests_display"] = fmt_interests(u.get("interests"))
+    u["interests_display"] = fmt_interests(u.get("interests_mask"))
     u["created_display"] = fmt_time(u.get("created_at"))
     u["ban_until_display"] = fmt_time(u.get("ban_until")) if u.get("ban_until") else "Навсегда"
     chats = db.get_user_chats(user_id)
@@ -127,23 +144,28 @@ def unban_user(user_id):
 @app.route("/profiles")
 @require_login
 def profiles():
-    all_profiles = db.get_active_profiles_admin()
+    after, q, status = page_args()
+    all_profiles, cursor = db.page_profiles_admin(after, ADMIN_PAGE_SIZE, q, premium=status == "premium")
+    media = db.get_profile_media_many([p["id"] for p in all_profiles])
     for p in all_profiles:
-        p["interests_display"] = fmt_interests(p.get("interests"))
+        p["interests_display"] = fmt_interests(p.get("interests_mask"))
         p["created_display"] = fmt_time(p.get("created_at"))
         p["gender_display"] = GENDER_MAP.get(p.get("gender"), "—")
-        p["media"] = db.get_profile_media(p["id"])
-    return render_template("profiles.html", profiles=all_profiles)
+        p["media"] = media[p["id"]]
+    return render_template("profiles.html", profiles=all_profiles,
+                           total=db.get_admin_counts()["profiles"], **pager(cursor, q, status))
 
 # ── Chats ──────────────────────────────────────────────────────────────────────
 
 @app.route("/chats")
 @require_login
 def chats():
-    all_chats = db.get_all_chats_admin()
+    after, q, status = page_args()
+    all_chats, cursor = db.page_chats_admin(after, ADMIN_PAGE_SIZE, q, status)
     for c in all_chats:
         c["created_display"] = fmt_time(c.get("created_at"))
-    return render_template("chats.html", chats=all_chats)
+    return render_template("chats.html", chats=all_chats, total=db.get_admin_counts()["chats"],
+                           **pager(cursor, q, status))
 
 @app.route("/chat/<int:chat_id>")
 @require_login
@@ -168,38 +190,98 @@ def chat_detail(chat_id):
 @app.route("/reports")
 @require_login
 def reports():
-    all_reports = db.get_reports()
+    after, q, status = page_args()
+    all_reports, cursor = db.page_reports(after, ADMIN_PAGE_SIZE, q, status)
     for r in all_reports:
         r["created_display"] = fmt_time(r.get("created_at"))
-    return render_template("reports.html", reports=all_reports)
+    return render_template("reports.html", reports=all_reports,
+                           new_count=db.get_admin_counts()["reports"], **pager(cursor, q, status))
 
 @app.route("/report/<int:report_id>/resolve", methods=["POST"])
 @require_login
 def resolve_report(report_id):
     db.resolve_report(report_id)
-    return redirect(url_for("reports"))
+    # Назад на ту же страницу списка, с фильтрами
+    return redirect(request.referrer or url_for("reports"))
+
+# ── Broadcasts ─────────────────────────────────────────────────────────────────
+# Рассылки исполняет бот (broadcast.py); панель показывает прогресс из БД
+# и меняет статус — бот узнаёт об этом по событию "broadcast".
+
+def _broadcast_view(b):
+    done = b["sent"] + b["failed"] + b["blocked"]
+    total = max(b["total"], done)
+    return dict(b, done=done, total=total,
+                percent=done * 100 // total if total else 100,
+                status_display=BROADCAST_STATUS.get(b["status"], b["status"]),
+                created_display=fmt_time(b.get("created_at")))
+
+@app.route("/broadcasts")
+@require_login
+def broadcasts():
+    return render_template("broadcasts.html",
+                           broadcasts=[_broadcast_view(b) for b in db.get_broadcasts(50)])
+
+@app.route("/api/broadcasts")
+@require_login
+def api_broadcasts():
+    return jsonify([_broadcast_view(b) for b in db.get_broadcasts(50)])
+
+_BROADCAST_ACTIONS = {"pause": "paused", "resume": "running", "cancel": "cancelled"}
+
+@app.route("/broadcast/<int:broadcast_id>/<action>", methods=["POST"])
+@require_login
+def broadcast_action(broadcast_id, action):
+    if action not in _BROADCAST_ACTIONS:
+        abort(404)
+    db.set_broadcast_status(broadcast_id, _BROADCAST_ACTIONS[action])
+    return redirect(url_for("broadcasts"))
 
 # ── Telegram Media Proxy ───────────────────────────────────────────────────────
 
 @app.route("/media/<file_id>")
 @require_login
 def media_proxy(file_id):
-    """Проксирует медиафайлы из Telegram"""
+    """Медиафайл из Telegram через дисковый кеш (media_cache.py)."""
     try:
-        # Получаем file_path через Bot API
-        r = req.get(f"https://api.telegram.org/bot{BOT_TOKEN}/getFile?file_id={file_id}", timeout=10)
-        data = r.json()
-        if not data.get("ok"):
-            return "File not found", 404
-        file_path = data["result"]["file_path"]
-        # Скачиваем файл
-        file_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-        file_r = req.get(file_url, timeout=30, stream=True)
-        content_type = file_r.headers.get("Content-Type", "application/octet-stream")
-        return Response(file_r.iter_content(chunk_size=8192), content_type=content_type)
-    except Exception as e:
-        return f"Error: {e}", 500
+        item = media_cache.get(file_id)
+    except media_cache.MediaError as e:
+        return f"Telegram недоступен: {e}", 502
+    if item is None:
+        return "File not found", 404
+    return _send_cached(item)
+
+@app.route("/media/<file_id>/thumb/<int:size>")
+@require_login
+def media_thumb(file_id, size):
+    """Превью для списков; полный файл открывается по клику через /media/<file_id>."""
+    if size not in MEDIA_THUMB_SIZES:
+        abort(404)
+    try:
+        item = media_cache.thumb(file_id, size)
+    except media_cache.ThumbPending:
+        # Заглушку 1×1 узнаёт thumbLoaded() в base.html и повторяет запрос
+        return _THUMB_PENDING, 202, {"Content-Type": "image/svg+xml", "Retry-After": "1",
+                                     "Cache-Control": "no-store"}
+    except media_cache.MediaError as e:
+        return f"Telegram недоступен: {e}", 502
+    if item is None:
+        return "No preview", 404
+    return _send_cached(item)
+
+_THUMB_PENDING = '<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"/>'
+
+def _send_cached(item):
+    # ETag, If-None-Match → 304 и Range → 206 обрабатывает send_file
+    resp = send_file(item.path, mimetype=item.content_type, conditional=True,
+                     etag=item.etag, max_age=MEDIA_MAX_AGE)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    return resp
 
 def run_web():
+    """Dev-сервер Flask — для локальной отладки. В проде панель обслуживает
+    gunicorn (gunicorn_conf.py), его запускает main.py."""
+    db.start_listener()
     port = int(os.getenv("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)